@@ -1,56 +1,339 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, Response, abort, render_template, request, redirect, url_for
+import configparser  # Імпортуємо модуль для роботи з конфігураційними файлами
+import csv
+import datetime
+import io
+import json
 import logging  # Імпортуємо модуль логування
-from typing import List, Optional  # Імпортуємо типи для анотацій
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple  # Імпортуємо типи для анотацій
+
+from bson import ObjectId
 
 from models import Contact  # Імпортуємо модель Contact
-import connect  # noqa: Цей імпорт нашого connect.py ініціалізує підключення до MongoDB Atlas
+from connect import connect_db  # Імпортуємо функцію для підключення до БД
+from contact_stats import get_contact_stats
+from local_cache import LocalLRUCache
+from pagination import decode_cursor, encode_cursor, keyset_filter, row_key
+from status_events import EventBroadcaster, format_sse
 
 # Налаштування логування для Flask-додатку
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Читаємо конфігурацію з config.ini (секція [WEB] необов'язкова)
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+PAGE_SIZE: int = config.getint('WEB', 'page_size', fallback=50)  # Контактів на сторінці за замовчуванням
+MAX_PAGE_SIZE: int = 500
+# Розмір пакета курсора MongoDB для експорту: один getMore на стільки документів
+EXPORT_BATCH_SIZE: int = config.getint('WEB', 'export_batch_size', fallback=2000)
+
+# Поля, які показує templates/index.html (created_at потрібен для курсора сторінки)
+LIST_FIELDS = ('full_name', 'email', 'phone_number', 'preferred_channel', 'is_sent', 'created_at')
+# Як довго (с) вважати знімок лічильників і версії колекції актуальним: частіше ніж раз на цей
+# інтервал MongoDB не опитується, навіть якщо дашборди оновлюються щосекунди
+VERSION_CHECK_INTERVAL: float = config.getfloat('WEB', 'version_check_interval', fallback=1.0)
+PAGE_CACHE_SIZE: int = config.getint('WEB', 'page_cache_size', fallback=256)  # Відрендерених сторінок у пам'яті
+PAGE_CACHE_TTL: float = config.getfloat('WEB', 'page_cache_ttl', fallback=60.0)
+# Колонки експорту (/export)
+EXPORT_FIELDS = ('id', 'full_name', 'email', 'phone_number', 'preferred_channel', 'is_sent', 'created_at')
+# Типи полів ключа сортування для розбору курсора з URL
+CURSOR_TYPES = {'is_sent': bool, 'created_at': datetime.datetime, '_id': ObjectId}
+
 app = Flask(__name__)
 
-# Підключення до MongoDB Atlas вже ініціалізовано при імпорті connect.py.
-# Ми можемо додати лог-повідомлення, щоб підтвердити, що підключення відбулося.
+# Кеш у пам'яті процесу: знімок лічильників (з версією колекції) і відрендерені сторінки.
+# Ключ сторінки містить версію, тож після будь-якої зміни контактів старі записи просто не читаються
+# і витісняються LRU. Redis не потрібен.
+_stats_cache = LocalLRUCache(maxsize=1, ttl=VERSION_CHECK_INTERVAL)
+_page_cache = LocalLRUCache(maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+# Одна підписка Redis pub/sub на процес, яка розсилає події всім SSE-клієнтам (/events)
+broadcaster = EventBroadcaster()
+SSE_RETRY_MS: int = 3000  # Через скільки браузер перепідключається після розриву
+
+connect_db()
+# Складений індекс (is_sent, created_at, _id) обслуговує і загальний список, і фільтр за is_sent
+Contact.ensure_indexes()
 logging.info("Flask-додаток ініціалізовано. Підключення до MongoDB Atlas встановлено через connect.py.")
 
 
+def sort_fields(sent: Optional[bool]) -> Tuple[str, ...]:
+    """
+    Поля сортування сторінки. Для фільтра за is_sent поле фіксоване рівністю,
+    тож ключ - (created_at, _id); для загального списку - (is_sent, created_at, _id).
+    """
+    return ('created_at', '_id') if sent is not None else ('is_sent', 'created_at', '_id')
+
+
+def fetch_contacts_page(sent: Optional[bool], after: Optional[str], before: Optional[str],
+                        limit: int) -> Optional[Dict[str, Any]]:
+    """
+    Повертає сторінку контактів за keyset-курсором: {'contacts', 'next_cursor', 'prev_cursor'}.
+    after - сторінка після рядка з цим курсором, before - перед ним (посилання "назад"),
+    без курсорів - перша сторінка. None, якщо курсор некоректний.
+    """
+    fields = sort_fields(sent)
+    query: Dict[str, Any] = {} if sent is None else {'is_sent': sent}
+    forward = before is None
+    cursor = after if forward else before
+    if cursor:
+        values = decode_cursor(cursor, [CURSOR_TYPES[field] for field in fields])
+        if values is None:
+            return None
+        query = {'$and': [query, keyset_filter(fields, values, forward)]} if query else keyset_filter(fields, values, forward)
+
+    # "Назад" читається у зворотному порядку від курсора, а потім розвертається
+    order = [('+' if forward else '-') + ('id' if field == '_id' else field) for field in fields]
+    # Один зайвий рядок показує, чи є ще сторінка в напрямку читання
+    rows: List[Dict[str, Any]] = list(
+        Contact.objects(__raw__=query).only(*LIST_FIELDS).order_by(*order).limit(limit + 1).as_pymongo()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # Вперед: наступна сторінка є, якщо знайшли зайвий рядок; назад - ми прийшли з неї
+        if has_more or not forward:
+            next_cursor = encode_cursor(row_key(rows[-1], fields))
+        # Вперед: попередня є, якщо ми прийшли за курсором; назад - якщо знайшли зайвий рядок
+        if (forward and after) or (not forward and has_more):
+            prev_cursor = encode_cursor(row_key(rows[0], fields))
+    return {'contacts': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+
+def parse_sent_filter(sent_param: Optional[str]) -> Tuple[bool, Optional[bool]]:
+    """Розбирає параметр 'sent': (коректний, значення); None - усі контакти."""
+    if sent_param is None:
+        return True, None
+    if sent_param in ('true', 'false'):
+        return True, sent_param == 'true'
+    return False, None
+
+
+def export_rows(sent: Optional[bool]) -> Iterator[Dict[str, Any]]:
+    """
+    Потоково читає контакти сирим курсором pymongo (без документів MongoEngine) у порядку
+    індексу (is_sent, created_at, _id). У пам'яті одночасно лише один пакет курсора.
+    """
+    query: Dict[str, Any] = {} if sent is None else {'is_sent': sent}
+    cursor = Contact._get_collection().find(
+        query,
+        {field: 1 for field in LIST_FIELDS},
+        sort=[('is_sent', 1), ('created_at', 1), ('_id', 1)],
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    try:
+        for doc in cursor:
+            created_at = doc.get('created_at')
+            yield {
+                'id': str(doc['_id']),
+                'full_name': doc.get('full_name'),
+                'email': doc.get('email'),
+                'phone_number': doc.get('phone_number'),
+                'preferred_channel': doc.get('preferred_channel'),
+                'is_sent': bool(doc.get('is_sent')),
+                'created_at': created_at.isoformat() if created_at else None,
+            }
+    finally:
+        cursor.close()  # Також при обриві з'єднання клієнтом (GeneratorExit)
+
+
+def iter_ndjson(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    chunk: List[str] = []
+    for row in rows:
+        chunk.append(json.dumps(row, ensure_ascii=False))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def iter_csv(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            # Віддаємо накопичений шматок і очищаємо буфер, щоб пам'ять не росла
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def current_stats() -> Dict[str, Any]:
+    """Лічильники та версія колекції contacts; з MongoDB читаються не частіше ніж раз на VERSION_CHECK_INTERVAL."""
+    found, stats = _stats_cache.get('stats')
+    if not found:
+        stats = get_contact_stats()
+        _stats_cache.set('stats', stats)
+    return stats
+
+
+def is_not_modified(etag: str, last_modified: Optional[datetime.datetime]) -> bool:
+    """Чи має клієнт актуальну копію (If-None-Match має пріоритет над If-Modified-Since)."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional_response(key: Tuple[Hashable, ...], render: Callable[[Dict[str, Any]], Optional[str]],
+                         mimetype: str = 'text/html') -> Optional[Response]:
+    """
+    Відповідь з ETag / Last-Modified з версії колекції contacts (contact_stats.py):
+    - клієнт уже має цю версію -> 304 без запитів до contacts і без рендерингу;
+    - сторінка цієї версії вже відрендерена -> тіло з кешу;
+    - інакше render(stats) і збереження в кеш. None, якщо render повернув None.
+    Версія збільшується після запису контактів, тож сторінка, відрендерена між записом і $inc,
+    може бути застарілою до наступної зміни або PAGE_CACHE_TTL.
+    """
+    stats = current_stats()
+    etag = f"contacts-v{stats['version']}"
+    if is_not_modified(etag, stats['updated_at']):
+        response = Response(status=304)
+    else:
+        cache_key = key + (stats['version'],)
+        found, body = _page_cache.get(cache_key)
+        if not found:
+            body = render(stats)
+            if body is None:
+                return None
+            _page_cache.set(cache_key, body)
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    if stats['updated_at'] is not None:
+        response.last_modified = stats['updated_at']
+    # Браузер зберігає сторінку, але щоразу перевіряє її (умовним запитом, що зазвичай дає 304)
+    response.cache_control.no_cache = True
+    return response
+
+
+def render_contacts(sent: Optional[bool]):
+    """Спільний рендеринг сторінки списку для '/' та '/filter'."""
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    link_args: Dict[str, Any] = {} if sent is None else {'sent': str(sent).lower()}
+    after, before = request.args.get('after'), request.args.get('before')
+    endpoint = request.endpoint
+
+    def render(stats: Dict[str, Any]) -> Optional[str]:
+        page = fetch_contacts_page(sent, after, before, limit)
+        if page is None:
+            return None
+        page_args = dict(link_args, limit=limit) if limit != PAGE_SIZE else link_args
+        next_url = url_for(endpoint, after=page['next_cursor'], **page_args) if page['next_cursor'] else None
+        prev_url = url_for(endpoint, before=page['prev_cursor'], **page_args) if page['prev_cursor'] else None
+        return render_template('index.html', contacts=page['contacts'], next_url=next_url, prev_url=prev_url,
+                               stats=stats)
+
+    response = conditional_response((endpoint, sent, after, before, limit), render)
+    if response is None:
+        logging.warning(f"Некоректний курсор сторінки: {request.args}. Перенаправлення на першу сторінку.")
+        return redirect(url_for(endpoint, **link_args))
+    return response
+
+
 @app.route('/')
 def index() -> str:
     """
-    Головна сторінка веб-додатку, що відображає всі контакти, відсортовані за статусом is_sent.
+    Головна сторінка веб-додатку, що відображає контакти, відсортовані за статусом is_sent
+    (False спочатку, потім True), далі за датою створення. Посторінково, за keyset-курсором.
     """
     logging.info("Запит до головної сторінки '/'")
-    # Отримати всі контакти, сортування за is_sent (False спочатку, потім True)
-    contacts: List[Contact] = Contact.objects().order_by('is_sent')
-    return render_template('index.html', contacts=contacts)
+    return render_contacts(None)
 
 
 @app.route('/filter', methods=['GET'])
 def filter_contacts() -> str:
     """
     Сторінка для фільтрації контактів за статусом is_sent.
-    Приймає параметр 'sent' ('true' або 'false').
+    Приймає параметр 'sent' ('true' або 'false') та курсори сторінки 'after' / 'before'.
     """
     logging.info(f"Запит до сторінки фільтрації '/filter' з параметрами: {request.args}")
     sent_param: Optional[str] = request.args.get('sent')
 
-    contacts: List[Contact]
     if sent_param == 'true':
-        contacts = Contact.objects(is_sent=True)
         logging.info("Фільтрація контактів: відображено лише відправлені.")
+        return render_contacts(True)
     elif sent_param == 'false':
-        contacts = Contact.objects(is_sent=False)
         logging.info("Фільтрація контактів: відображено лише невідправлені.")
+        return render_contacts(False)
     else:
         # Якщо параметр некоректний або відсутній, перенаправляємо на головну сторінку
         logging.warning(f"Некоректний параметр фільтрації 'sent': {sent_param}. Перенаправлення на головну сторінку.")
         return redirect(url_for('index'))
 
-    return render_template('index.html', contacts=contacts)
+
+@app.route('/stats', methods=['GET'])
+def contact_stats() -> Response:
+    """JSON-зведення total/sent/pending за каналами (з документів-лічильників, не з підрахунку contacts)."""
+    def render(stats: Dict[str, Any]) -> str:
+        updated_at = stats['updated_at'].isoformat() if stats['updated_at'] else None
+        return json.dumps({**stats, 'updated_at': updated_at})
+
+    return conditional_response(('stats',), render, mimetype='application/json')
+
+
+@app.route('/events', methods=['GET'])
+def contact_events() -> Response:
+    """
+    Server-sent events зі змінами статусу контактів (публікують consumer'и, див. status_events.py).
+    Кожне з'єднання читає власну чергу; з Redis процес тримає лише одну підписку.
+    """
+    subscription = broadcaster.subscribe()
+    logging.info(f"SSE-клієнт підключився, всього {broadcaster.client_count}")
+
+    def stream() -> Iterator[str]:
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            for event in broadcaster.events(subscription):
+                # None - подій немає: коментар-"пінг" тримає з'єднання відкритим
+                yield ": ping\n\n" if event is None else format_sse(event)
+        finally:
+            # Також при закритті вкладки (GeneratorExit під час запису)
+            broadcaster.unsubscribe(subscription)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Вимикає буферизацію відповіді в nginx
+    return response
+
+
+@app.route('/export', methods=['GET'])
+def export_contacts() -> Response:
+    """
+    Потоковий експорт контактів: /export?format=ndjson|csv[&sent=true|false].
+    Відповідь формується генератором, тож пам'ять не залежить від кількості контактів.
+    """
+    logging.info(f"Запит до експорту '/export' з параметрами: {request.args}")
+    export_format = request.args.get('format', 'ndjson')
+    valid, sent = parse_sent_filter(request.args.get('sent'))
+    if export_format not in EXPORT_FORMATS or not valid:
+        logging.warning(f"Некоректні параметри експорту: {request.args}")
+        abort(400)
+
+    serialize, mimetype = EXPORT_FORMATS[export_format]
+    scope = 'all' if sent is None else ('sent' if sent else 'pending')
+    filename = f"contacts-{scope}-{datetime.datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    return Response(
+        serialize(export_rows(sent)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
 
 
 if __name__ == '__main__':
     logging.info("Запуск Flask-додатку...")
     app.run(debug=True)
-
@@ -1,13 +1,56 @@
 import redis
 import json
 import sys
+import math
+import random
+import threading
+import time
+import uuid
+import zlib
+import configparser # Імпортуємо модуль для роботи з конфігураційними файлами
 import logging # Імпортуємо модуль logging
-from typing import Any, Optional # Імпортуємо типи для анотацій
+from typing import Any, Callable, Dict, Optional, Tuple # Імпортуємо типи для анотацій
+
+from local_cache import LocalLRUCache
+
+# Необов'язкові залежності для компактної серіалізації та стиснення:
+# poetry install --extras fast-cache (msgpack, zstandard, lz4). Без них працюють json + zlib.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
 
 # Налаштування логування для цього модуля
 # Це дозволить виводити повідомлення в консоль з різними рівнями важливості
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Читаємо конфігурацію з config.ini (секція [CACHE] необов'язкова - є значення за замовчуванням)
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Розмір і TTL in-process LRU-рівня, що стоїть перед Redis
+LOCAL_CACHE_MAXSIZE: int = config.getint('CACHE', 'local_maxsize', fallback=1024)
+LOCAL_CACHE_TTL: float = config.getfloat('CACHE', 'local_ttl', fallback=30.0)
+# Час життя блокування на перерахунок ключа та скільки інші викликачі чекають на результат
+LOCK_TIMEOUT: float = config.getfloat('CACHE', 'lock_timeout', fallback=10.0)
+LOCK_WAIT_TIMEOUT: float = config.getfloat('CACHE', 'lock_wait_timeout', fallback=5.0)
+LOCK_POLL_INTERVAL: float = 0.05
+# Формат значень у Redis: серіалізатор (msgpack | json), стиснення (zstd | lz4 | zlib | none)
+# та мінімальний розмір у байтах, починаючи з якого значення стискається
+CACHE_SERIALIZER: str = config.get('CACHE', 'serializer', fallback='msgpack')
+CACHE_COMPRESSION: str = config.get('CACHE', 'compression', fallback='zstd')
+COMPRESS_MIN_SIZE: int = config.getint('CACHE', 'compress_min_size', fallback=512)
+# Як часто (у секундах) процес перечитує лічильник покоління простору імен з Redis
+GENERATION_CHECK_INTERVAL: float = config.getfloat('CACHE', 'generation_check_interval', fallback=1.0)
+
 # Ініціалізація Redis клієнта
 # host: адреса Redis сервера (для локального Redis це 'localhost')
 # port: порт Redis сервера (стандартний порт 6379)
@@ -15,6 +58,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # decode_responses=True: автоматично декодує відповіді Redis у рядки Python (UTF-8)
 try:
     r: redis.Redis = redis.StrictRedis(host='localhost', port=6379, db=0, decode_responses=True)
+    # Окремий клієнт без декодування для бінарних (серіалізованих і стиснених) значень кешу
+    r_bin: redis.Redis = redis.StrictRedis(host='localhost', port=6379, db=0, decode_responses=False)
     # Спробуємо зробити просту операцію, щоб перевірити з'єднання
     r.ping()
     logging.info("✅ Успішно підключено до Redis!") # Використовуємо logging.info
@@ -26,29 +71,338 @@ except Exception as e:
     logging.error(f"Невідома помилка при ініціалізації Redis: {e}") # Використовуємо logging.error
     sys.exit(1)
 
+# Службові значення кешу
+CACHE_ENVELOPE_KEY: str = "__cache__" # Маркер JSON-конверта першої версії {"__cache__": 1, "v": ..., "d": ..., "e": ...}
+LOCK_PREFIX: str = "lock:"
+GENERATION_PREFIX: str = "cachegen:"
+# Простір імен для всіх результатів, похідних від колекцій authors/quotes (author:*, tag:*)
+QUOTES_CACHE_NAMESPACE: str = "quotes"
+_MISSING = object()
+
+# Перший рівень: in-process LRU (спільний для всіх потоків процесу)
+local_cache = LocalLRUCache(maxsize=LOCAL_CACHE_MAXSIZE, ttl=LOCAL_CACHE_TTL)
+
+# Лічильники для кожного рівня кешу, щоб можна було підібрати розміри та TTL
+_stats: Dict[str, int] = {
+    "local_hits": 0,
+    "local_misses": 0,
+    "redis_hits": 0,
+    "redis_misses": 0,
+    "computes": 0, # Скільки разів значення обчислювалося (звернення до MongoDB)
+    "refreshes": 0, # Скільки з них були ранніми ймовірнісними оновленнями
+    "lock_waits": 0, # Скільки разів викликач чекав на результат іншого (single-flight)
+    "bytes_json": 0, # Скільки байтів зайняли б записані значення у старому JSON-форматі (лише з DEBUG)
+    "bytes_stored": 0, # Скільки байтів реально записано в Redis (для тих самих записів)
+}
+_stats_lock = threading.Lock()
+
+# Смугасті (striped) блокування для single-flight всередині процесу: фіксована кількість,
+# тому пам'ять не росте з кількістю ключів
+_key_locks = [threading.Lock() for _ in range(64)]
+
+# Закешовані в процесі покоління просторів імен: простір -> (покоління, коли перевірено)
+_generations: Dict[str, Tuple[int, float]] = {}
+_generations_lock = threading.Lock()
+
+# Атомарне зняття Redis-блокування лише його власником
+_release_lock_script = r.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+# --- Кодек значень кешу ---
+# Бінарний конверт другої версії: MAGIC (2 байти) + версія + ID серіалізатора + ID стиснення + payload.
+# Payload - серіалізований список [значення, час обчислення, момент закінчення].
+# Значення, що не починаються з MAGIC, розбираються як старі JSON-рядки.
+CODEC_MAGIC: bytes = b"QC"
+CODEC_VERSION: int = 2
+
+# Реєстри серіалізаторів і компресорів: назва -> (ID у конверті, функція кодування, функція декодування).
+# Нові формати додаються через register_serializer() / register_compressor().
+SERIALIZERS: Dict[str, Tuple[int, Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (1,
+             lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+             lambda data: json.loads(data.decode('utf-8'))),
+}
+COMPRESSORS: Dict[str, Tuple[int, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (0, lambda data: data, lambda data: data),
+    "zlib": (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+
+
+def register_serializer(name: str, codec_id: int, dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any]) -> None:
+    """Реєструє додатковий серіалізатор значень кешу."""
+    SERIALIZERS[name] = (codec_id, dumps, loads)
+
+
+def register_compressor(name: str, codec_id: int, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]) -> None:
+    """Реєструє додатковий алгоритм стиснення значень кешу."""
+    COMPRESSORS[name] = (codec_id, compress, decompress)
+
+
+if msgpack is not None:
+    register_serializer("msgpack", 2,
+                        lambda obj: msgpack.packb(obj, use_bin_type=True),
+                        lambda data: msgpack.unpackb(data, raw=False))
+if zstandard is not None:
+    register_compressor("zstd", 2,
+                        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                        lambda data: zstandard.ZstdDecompressor().decompress(data))
+if lz4_frame is not None:
+    register_compressor("lz4", 3, lz4_frame.compress, lz4_frame.decompress)
+
+if CACHE_SERIALIZER not in SERIALIZERS:
+    logging.warning(f"Серіалізатор кешу '{CACHE_SERIALIZER}' недоступний, використовується json.")
+    CACHE_SERIALIZER = "json"
+if CACHE_COMPRESSION not in COMPRESSORS:
+    logging.warning(f"Стиснення кешу '{CACHE_COMPRESSION}' недоступне, використовується zlib.")
+    CACHE_COMPRESSION = "zlib"
+
+
+def encode_entry(value: Any, delta: float, expires_at: float) -> bytes:
+    """Кодує запис кешу в бінарний конверт поточним серіалізатором (і стисненням для великих значень)."""
+    serializer_id, dumps, _ = SERIALIZERS[CACHE_SERIALIZER]
+    payload = dumps([value, delta, expires_at])
+
+    compressor_id = COMPRESSORS["none"][0]
+    if len(payload) >= COMPRESS_MIN_SIZE:
+        candidate_id, compress, _ = COMPRESSORS[CACHE_COMPRESSION]
+        compressed = compress(payload)
+        if len(compressed) < len(payload): # Стиснення не завжди вигідне на малих/випадкових даних
+            compressor_id, payload = candidate_id, compressed
+
+    return CODEC_MAGIC + bytes((CODEC_VERSION, serializer_id, compressor_id)) + payload
+
+
+def decode_entry(raw: bytes) -> Tuple[Any, float, Optional[float]]:
+    """
+    Розбирає значення з Redis у кортеж (значення, час обчислення, момент закінчення).
+    Підтримує бінарний конверт, JSON-конверт першої версії та просто JSON без конверта.
+    """
+    if not raw.startswith(CODEC_MAGIC):
+        data = json.loads(raw.decode('utf-8'))
+        if isinstance(data, dict) and data.get(CACHE_ENVELOPE_KEY) == 1:
+            return data["v"], data.get("d", 0.0), data.get("e")
+        return data, 0.0, None
+
+    version, serializer_id, compressor_id = raw[2], raw[3], raw[4]
+    if version != CODEC_VERSION:
+        raise ValueError(f"Невідома версія конверта кешу: {version}")
+    loads = next((codec[2] for codec in SERIALIZERS.values() if codec[0] == serializer_id), None)
+    decompress = next((codec[2] for codec in COMPRESSORS.values() if codec[0] == compressor_id), None)
+    if loads is None or decompress is None:
+        raise ValueError(f"Кодек кешу недоступний (серіалізатор {serializer_id}, стиснення {compressor_id})")
+
+    value, delta, expires_at = loads(decompress(raw[5:]))
+    return value, delta, expires_at
+
+
+def _incr(stat: str) -> None:
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """Повертає копію лічильників влучань/промахів/оновлень для кожного рівня кешу."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["local_size"] = len(local_cache)
+    stats["bytes_saved"] = stats["bytes_json"] - stats["bytes_stored"]
+    return stats
+
+
+def reset_cache_stats() -> None:
+    """Обнуляє лічильники кешу."""
+    with _stats_lock:
+        for stat in _stats:
+            _stats[stat] = 0
+
+
+def _lookup(key: str, count: bool = True) -> Optional[Tuple[Any, float, Optional[float]]]:
+    """
+    Шукає запис спочатку в локальному LRU, потім у Redis (з прогрівом локального рівня).
+    count=False - повторні перевірки того самого запиту, що не враховуються в статистиці влучань/промахів.
+    """
+    record = _incr if count else lambda stat: None
+    found, entry = local_cache.get(key)
+    if found:
+        record("local_hits")
+        return entry
+    record("local_misses")
+
+    cached_data: Optional[bytes] = r_bin.get(key)
+    if cached_data is None:
+        record("redis_misses")
+        return None
+    try:
+        entry = decode_entry(cached_data)
+    except Exception as e:
+        logging.error(f"Помилка декодування значення для ключа '{key}' з Redis: {e}") # Використовуємо logging.error
+        record("redis_misses")
+        return None
+
+    record("redis_hits")
+    expires_at = entry[2]
+    local_cache.set(key, entry, LOCAL_CACHE_TTL if expires_at is None else expires_at - time.time())
+    return entry
+
+
+def get_generation(namespace: str) -> int:
+    """
+    Повертає поточне покоління простору імен кешу (лічильник у Redis).
+    Значення кешується в процесі на GENERATION_CHECK_INTERVAL секунд, щоб не додавати
+    round trip до кожного читання.
+    """
+    now = time.monotonic()
+    with _generations_lock:
+        cached = _generations.get(namespace)
+    if cached is not None and now - cached[1] < GENERATION_CHECK_INTERVAL:
+        return cached[0]
+
+    generation = int(r.get(f"{GENERATION_PREFIX}{namespace}") or 0)
+    with _generations_lock:
+        _generations[namespace] = (generation, now)
+    return generation
+
+
+def bump_generation(namespace: str) -> int:
+    """
+    Інвалідовує ВСІ записи простору імен за O(1): збільшує лічильник покоління.
+    Старі ключі просто стають недосяжними і зникають після свого TTL - без KEYS/SCAN і DEL.
+    Викликається шляхами запису (load_data.py, pipeline Scrapy тощо).
+    """
+    generation = r.incr(f"{GENERATION_PREFIX}{namespace}")
+    with _generations_lock:
+        _generations[namespace] = (generation, time.monotonic())
+    logging.info(f"Кеш '{namespace}': нове покоління {generation}, старі записи інвалідовано.")
+    return generation
+
+
+def versioned_key(namespace: str, key: str) -> str:
+    """Будує ключ кешу з вбудованим поколінням, наприклад 'quotes:g3:tag:life'."""
+    return f"{namespace}:g{get_generation(namespace)}:{key}"
+
+
 def get_cache(key: str) -> Optional[Any]:
     """
-    Отримує дані з кешу Redis за ключем.
+    Отримує дані з кешу за ключем: спочатку з in-process LRU, потім з Redis.
     Повертає розпарсений JSON-об'єкт або None, якщо ключ не знайдено.
     """
-    cached_data: Optional[str] = r.get(key)
-    if cached_data:
-        try:
-            return json.loads(cached_data)
-        except json.JSONDecodeError:
-            logging.error(f"Помилка декодування JSON для ключа '{key}' з Redis.") # Використовуємо logging.error
-            return None
-    return None
+    entry = _lookup(key)
+    return entry[0] if entry is not None else None
+
 
-def set_cache(key: str, value: Any, ttl: int = 300) -> None:
+def set_cache(key: str, value: Any, ttl: int = 300, delta: float = 0.0) -> None:
     """
-    Зберігає дані у кеш Redis за ключем.
-    Дані конвертуються у JSON-рядок.
+    Зберігає дані у кеш Redis (та локальний LRU) за ключем.
+    Дані кодуються у компактний бінарний конверт (див. encode_entry).
     ttl (time to live): час життя кешу в секундах (за замовчуванням 300 секунд = 5 хвилин).
+    delta: скільки секунд зайняло обчислення значення (потрібно для раннього оновлення).
     """
+    expires_at = time.time() + ttl
     try:
-        # json.dumps перетворює Python-об'єкт на JSON-рядок
-        # ensure_ascii=False дозволяє зберігати не-ASCII символи (наприклад, кирилицю) без екранування
-        r.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+        encoded = encode_entry(value, delta, expires_at)
+        r_bin.set(key, encoded, ex=ttl)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # Розмір у старому JSON-форматі - зайва серіалізація значення, тож лише для налагодження
+            json_size = len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+            with _stats_lock:
+                _stats["bytes_json"] += json_size
+                _stats["bytes_stored"] += len(encoded)
+            logging.debug(f"Кеш '{key}': {json_size} -> {len(encoded)} байт (зекономлено {json_size - len(encoded)})")
     except Exception as e:
         logging.error(f"Помилка запису даних у Redis для ключа '{key}': {e}") # Використовуємо logging.error
+    local_cache.set(key, (value, delta, expires_at), ttl)
+
+
+def _should_refresh_early(delta: float, expires_at: Optional[float], beta: float) -> bool:
+    """
+    Ймовірнісне раннє оновлення (алгоритм XFetch): чим ближче кінець TTL і чим довше
+    обчислюється значення, тим вища ймовірність оновити його заздалегідь.
+    """
+    if expires_at is None or beta <= 0 or delta <= 0:
+        return False
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def _acquire_lock(key: str) -> Optional[str]:
+    """Пробує взяти міжпроцесне блокування на перерахунок ключа. Повертає токен або None."""
+    token = uuid.uuid4().hex
+    if r.set(f"{LOCK_PREFIX}{key}", token, nx=True, px=int(LOCK_TIMEOUT * 1000)):
+        return token
+    return None
+
+
+def _release_lock(key: str, token: str) -> None:
+    try:
+        _release_lock_script(keys=[f"{LOCK_PREFIX}{key}"], args=[token])
+    except Exception as e:
+        logging.error(f"Помилка зняття блокування для ключа '{key}': {e}")
+
+
+def _wait_for_value(key: str) -> Any:
+    """Чекає, поки власник блокування запише значення в Redis. Повертає _MISSING при тайм-ауті."""
+    deadline = time.monotonic() + LOCK_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = _lookup(key, count=False)
+        if entry is not None:
+            return entry[0]
+        if not r.exists(f"{LOCK_PREFIX}{key}"):
+            break # Власник завершив роботу, але нічого не закешував (наприклад, порожній результат)
+    return _MISSING
+
+
+def _compute_and_store(key: str, compute: Callable[[], Any], ttl: int) -> Any:
+    started = time.perf_counter()
+    value = compute()
+    _incr("computes")
+    if value is not None:
+        set_cache(key, value, ttl=ttl, delta=time.perf_counter() - started)
+    return value
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], ttl: int = 300, beta: float = 1.0) -> Any:
+    """
+    Повертає значення з кешу або обчислює його через compute() із захистом від "stampede":
+    - лише один викликач (у межах процесу й між процесами) перераховує відсутній ключ,
+      інші чекають на його результат;
+    - beta > 0 вмикає раннє ймовірнісне оновлення до закінчення TTL (beta=0 - вимкнено).
+    Якщо compute() повертає None, результат не кешується; під час раннього оновлення тоді повертається
+    поточне значення з кешу.
+    """
+    entry = _lookup(key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        if not _should_refresh_early(delta, expires_at, beta):
+            return value
+        # Раннє оновлення робить лише той, хто взяв блокування; решта віддає поточне значення
+        token = _acquire_lock(key)
+        if token is None:
+            return value
+        _incr("refreshes")
+        try:
+            refreshed = _compute_and_store(key, compute, ttl)
+        finally:
+            _release_lock(key, token)
+        # None від раннього оновлення (тимчасово порожній результат або "не кешувати") не замінює ще чинне значення
+        return value if refreshed is None else refreshed
+
+    with _key_locks[hash(key) % len(_key_locks)]:
+        # Поки ми чекали на блокування, інший потік або процес міг уже записати значення (у LRU чи Redis)
+        entry = _lookup(key, count=False)
+        if entry is not None:
+            return entry[0]
+
+        token = _acquire_lock(key)
+        if token is None:
+            _incr("lock_waits")
+            value = _wait_for_value(key)
+            if value is not _MISSING:
+                return value
+            # Не дочекалися - обчислюємо самі, щоб не блокувати викликача безкінечно
+        try:
+            return _compute_and_store(key, compute, ttl)
+        finally:
+            if token is not None:
+                _release_lock(key, token)
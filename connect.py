@@ -1,6 +1,10 @@
 import configparser
 import logging # Імпортуємо модуль logging
+import threading
+from typing import Dict
+from pymongo import monitoring, uri_parser
 from mongoengine import connect as mongo_connect
+from mongoengine.connection import DEFAULT_DATABASE_NAME
 
 # Налаштування базового логування
 # Це дозволить виводити повідомлення в консоль з різними рівнями важливості
@@ -10,6 +14,54 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+
+class QueryCounter(monitoring.CommandListener):
+    """
+    Слухач команд pymongo, який рахує звернення до MongoDB (find, getMore, aggregate тощо).
+    Дозволяє виміряти, скільки round trip'ів коштує одна операція застосунку.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.commands: Dict[str, int] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        with self._lock:
+            self.commands[event.command_name] = self.commands.get(event.command_name, 0) + 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+    def reset(self) -> None:
+        """Обнуляє лічильники перед новим вимірюванням."""
+        with self._lock:
+            self.commands = {}
+
+    @property
+    def total(self) -> int:
+        """Загальна кількість команд (round trip'ів) з моменту останнього reset()."""
+        with self._lock:
+            return sum(self.commands.values())
+
+
+# Глобальний лічильник реєструється до створення клієнта, тому бачить усі команди
+query_counter = QueryCounter()
+monitoring.register(query_counter)
+
+def database_name() -> str:
+    """
+    Ім'я бази даних так само, як його визначає mongoengine у connect_db(): з URI, інакше з опції
+    'db' секції MONGO_DB, інакше 'test'. Потрібне клієнтам поза mongoengine (motor у consumer_async.py),
+    щоб вони писали в ту саму базу.
+    """
+    mongo_uri: str = config.get('MONGO_DB', 'uri')
+    return (uri_parser.parse_uri(mongo_uri).get('database')
+            or config.get('MONGO_DB', 'db', fallback=None)
+            or DEFAULT_DATABASE_NAME)
+
 def connect_db() -> None: # Додано анотацію типу для функції (повертає None)
     """
     Функція для підключення до бази даних MongoDB Atlas.
@@ -20,7 +72,7 @@ def connect_db() -> None: # Додано анотацію типу для фун
         mongo_uri: str = config.get('MONGO_DB', 'uri') # Додано анотацію типу для змінної
 
         # Підключаємося до MongoDB Atlas
-        mongo_connect(host=mongo_uri)
+        mongo_connect(db=config.get('MONGO_DB', 'db', fallback=None), host=mongo_uri)
 
         logging.info("✅ Успішно підключено до MongoDB Atlas.") # Використовуємо logging.info
     except configparser.NoSectionError:
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging # Імпортуємо модуль логування
+import signal
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set # Імпортуємо типи для анотацій
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from connect import database_name
+from consumer_base import CLAIM_TIMEOUT, CONTACT_FIELDS, ContactChannel, config, rabbit_host
+from consumer_email import EmailChannel
+from consumer_sms import SmsChannel
+from contact_stats import inc_update
+from latency import CLAIM, END_TO_END, QUEUE_WAIT, SEND, LatencyRecorder, trace_id
+from models import Contact, ContactStats # Імпортуємо моделі
+from retry_topology import failure_route, retry_topology
+from status_events import publish_sent
+
+# Необов'язкові залежності асинхронного режиму: poetry install --extras async-consumers
+try:
+    import aio_pika
+except ImportError:
+    aio_pika = None
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Параметри асинхронного consumer'а (секція [ASYNC_CONSUMER] необов'язкова)
+CONCURRENCY: int = config.getint('ASYNC_CONSUMER', 'concurrency', fallback=100) # Надсилань "у польоті" на канал
+RATE_LIMIT: float = config.getfloat('ASYNC_CONSUMER', 'rate_limit', fallback=0.0) # Надсилань/с, 0 - без обмеження
+RATE_BURST: float = config.getfloat('ASYNC_CONSUMER', 'rate_burst', fallback=0.0) # Місткість відра, 0 - дорівнює rate_limit
+STATS_INTERVAL: float = 5.0
+EVENTS_FLUSH_INTERVAL: float = 0.5 # Як часто публікувати накопичені події статусу (одна подія на канал)
+
+CHANNELS = {"email": EmailChannel, "sms": SmsChannel}
+
+
+class InvalidMessage(Exception):
+    """Повідомлення неможливо розібрати - повторна спроба не допоможе, воно одразу йде в DLQ."""
+
+
+class TokenBucket:
+    """
+    Асинхронне обмеження частоти за алгоритмом "відро з токенами":
+    токени поповнюються зі швидкістю rate за секунду до місткості capacity,
+    кожне надсилання забирає один токен. rate <= 0 вимикає обмеження.
+    """
+
+    def __init__(self, rate: float, capacity: float = 0.0) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity > 0 else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock: # Очікувачі обслуговуються по черзі (FIFO)
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncConsumer:
+    """
+    Асинхронний consumer: aio-pika для RabbitMQ, motor для MongoDB.
+    Кожне повідомлення обробляється окремою задачею; кількість одночасних надсилань обмежена
+    семафором (concurrency), частота - відром токенів. Повідомлення підтверджується лише
+    після завершення свого надсилання, тож повільний шлюз не блокує інші повідомлення.
+    Невдалі повідомлення перепубліковуються в черги затримки або DLQ (retry_topology.py).
+    """
+
+    def __init__(self, channel: ContactChannel, concurrency: int = CONCURRENCY,
+                 rate_limit: float = RATE_LIMIT, rate_burst: float = RATE_BURST) -> None:
+        self.channel = channel
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate_limit, rate_burst)
+        self._tasks: Set[asyncio.Task] = set()
+        self._collection = None
+        self._stats_collection = None
+        self._amqp_channel = None
+        self.stats: Dict[str, int] = {"sent": 0, "failed": 0, "skipped": 0}
+        self.latency = LatencyRecorder(channel.name)
+        self._sent_contacts: List[Dict[str, Any]] = [] # Ще не опубліковані в status_events
+
+    async def run(self) -> None:
+        """Обробляє повідомлення до SIGTERM/SIGINT, після чого дочікується всіх надсилань "у польоті"."""
+        mongo_client = AsyncIOMotorClient(config.get('MONGO_DB', 'uri'))
+        # Та сама база, що й у mongoengine (producer, Flask, синхронні consumer'и), навіть якщо в URI її немає
+        database = mongo_client[database_name()]
+        self._collection = database[Contact._get_collection_name()]
+        self._stats_collection = database[ContactStats._get_collection_name()]
+
+        connection = await aio_pika.connect_robust(host=rabbit_host)
+        # publisher_confirms: перепублікація на повтор завершується лише після підтвердження брокером
+        amqp_channel = await connection.channel(publisher_confirms=True)
+        self._amqp_channel = amqp_channel
+        # Брокер не віддає більше повідомлень, ніж ми здатні обробляти одночасно
+        await amqp_channel.set_qos(prefetch_count=self.concurrency)
+        queue = await amqp_channel.declare_queue(self.channel.queue_name, durable=True)
+        for name, arguments in retry_topology(self.channel.queue_name):
+            await amqp_channel.declare_queue(name, durable=True, arguments=arguments or None)
+        logging.info(f"✅ Асинхронний {self.channel.name} consumer підключено до RabbitMQ на хості: {rabbit_host}")
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        consumer_tag = await queue.consume(self._on_message)
+        stats_task = asyncio.create_task(self._report_stats())
+        events_task = asyncio.create_task(self._flush_events_periodically())
+        logging.info(f"\n[*] Очікування {self.channel.name} повідомлень з черги '{self.channel.queue_name}' "
+                     f"(concurrency={self.concurrency}, rate_limit={self._bucket.rate or '∞'}/с). Для виходу натисніть CTRL+C")
+
+        await stop_event.wait()
+        logging.info(f"Зупинка: чекаємо завершення {len(self._tasks)} надсилань...")
+        await queue.cancel(consumer_tag)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        stats_task.cancel()
+        events_task.cancel()
+        await self._flush_events()
+        await self.channel.aclose()
+        await connection.close()
+        mongo_client.close()
+        self.latency.report()
+        logging.info(f"{self.channel.name} consumer зупинено. Підсумок: {self.stats}")
+
+    async def _on_message(self, message: "aio_pika.abc.AbstractIncomingMessage") -> None:
+        self.latency.record_published(QUEUE_WAIT, message.headers)
+        # Не чекаємо на обробку: кожне повідомлення - окрема задача
+        task = asyncio.create_task(self._handle(message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, message: "aio_pika.abc.AbstractIncomingMessage") -> None:
+        async with self._semaphore:
+            try:
+                try:
+                    await self._process(message)
+                except InvalidMessage as e:
+                    logging.warning(f"Попередження: Некоректне повідомлення відправлено в DLQ: {message.body.decode('utf-8', 'replace')}")
+                    self.stats["skipped"] += 1
+                    await self._route_failure(message, str(e), final=True)
+                except Exception as e:
+                    logging.error(f"❌ Помилка при обробці повідомлення {message.body.decode('utf-8', 'replace')}: {e}")
+                    self.stats["failed"] += 1
+                    await self._route_failure(message, str(e))
+            except Exception as e:
+                # Повтор або DLQ не опубліковано: повертаємо повідомлення в чергу, інакше воно лишилося б
+                # непідтвердженим і тримало б місце prefetch до закриття каналу
+                logging.error(f"❌ Не вдалося перенаправити повідомлення {self.channel.name}, повертаємо в чергу: {e}")
+                await message.nack(requeue=True)
+                return
+            # Підтверджуємо лише після завершення надсилання (або перепублікації на повтор)
+            await message.ack()
+
+    async def _route_failure(self, message: "aio_pika.abc.AbstractIncomingMessage", error: str,
+                             final: bool = False) -> None:
+        """Перепубліковує повідомлення в чергу затримки наступного ступеня або в DLQ."""
+        routing_key, headers = failure_route(self.channel.queue_name, message.headers, error, final)
+        await self._amqp_channel.default_exchange.publish(
+            aio_pika.Message(body=message.body, headers=headers, content_type=message.content_type,
+                             delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+            routing_key=routing_key,
+        )
+        logging.info(f"   ↪️ {self.channel.name}: повідомлення (trace {trace_id(message.headers)}) "
+                     f"перенаправлено в '{routing_key}' ({error})")
+
+    async def _process(self, message: "aio_pika.abc.AbstractIncomingMessage") -> None:
+        try:
+            contact_id = ObjectId(json.loads(message.body).get("contact_id"))
+        except (json.JSONDecodeError, InvalidId, TypeError, AttributeError) as e:
+            raise InvalidMessage("некоректне повідомлення") from e
+
+        # Атомарне захоплення контакту (той самий протокол, що й у пакетному consumer'і)
+        token = uuid.uuid4().hex
+        now = datetime.datetime.now()
+        claim_started = time.perf_counter()
+        contact: Optional[Dict[str, Any]] = await self._collection.find_one_and_update(
+            {'_id': contact_id, 'is_sent': False,
+             '$or': [{'claimed_by': None},
+                     {'claimed_at': {'$lt': now - datetime.timedelta(seconds=CLAIM_TIMEOUT)}}]},
+            {'$set': {'claimed_by': token, 'claimed_at': now}},
+            projection=CONTACT_FIELDS,
+            return_document=ReturnDocument.AFTER,
+        )
+        self.latency.record(CLAIM, time.perf_counter() - claim_started)
+        if contact is None:
+            current = await self._collection.find_one({'_id': contact_id}, {'is_sent': 1})
+            if current is not None and not current.get('is_sent'):
+                # Захоплений іншим consumer'ом (або тим, що впав): не підтверджуємо як пропущений, а повторюємо -
+                # до наступного ступеня затримки захоплення звільниться або застаріє
+                raise RuntimeError("контакт захоплено іншим consumer'ом")
+            self.stats["skipped"] += 1 # Уже надісланий або не існує
+            return
+
+        await self._bucket.acquire()
+        try:
+            send_started = time.perf_counter()
+            await self.channel.send_async(contact)
+            self.latency.record(SEND, time.perf_counter() - send_started)
+        except Exception as e:
+            logging.error(f"❌ Помилка надсилання {self.channel.name} для {contact.get('full_name')}: {e}")
+            # Знімаємо захоплення, щоб контакт можна було обробити повторно, і передаємо помилку на повтор
+            await self._release_claim(contact_id, token)
+            raise
+
+        try:
+            await self._collection.update_one({'_id': contact_id, 'claimed_by': token},
+                                              {'$set': {'is_sent': True}, '$unset': {'claimed_by': '', 'claimed_at': ''}})
+        except Exception:
+            # Статус не записано: без зняття захоплення повтор (ступені коротші за CLAIM_TIMEOUT) застав би
+            # контакт захопленим. Повтор може надіслати повідомлення вдруге - доставка "щонайменше раз"
+            await self._release_claim(contact_id, token)
+            raise
+        self.latency.record_published(END_TO_END, message.headers)
+        self._sent_contacts.append(contact)
+        # Лічильник панелі статистики (contact_stats.py)
+        await self._stats_collection.update_one({'_id': contact.get('preferred_channel') or 'email'},
+                                                inc_update('sent', 1), upsert=True)
+        self.stats["sent"] += 1
+
+    async def _release_claim(self, contact_id: ObjectId, token: str) -> None:
+        try:
+            await self._collection.update_one({'_id': contact_id, 'claimed_by': token},
+                                              {'$unset': {'claimed_by': '', 'claimed_at': ''}})
+        except Exception as e:
+            logging.error(f"❌ Не вдалося зняти захоплення контакту {contact_id}: {e}")
+
+    async def _flush_events(self) -> None:
+        contacts, self._sent_contacts = self._sent_contacts, []
+        if contacts:
+            # Синхронний redis-клієнт - в окремому потоці, щоб не блокувати цикл подій
+            await asyncio.to_thread(publish_sent, contacts)
+
+    async def _flush_events_periodically(self) -> None:
+        """Групує події "надіслано" за EVENTS_FLUSH_INTERVAL, щоб не публікувати кожен контакт окремо."""
+        while True:
+            await asyncio.sleep(EVENTS_FLUSH_INTERVAL)
+            await self._flush_events()
+
+    async def _report_stats(self) -> None:
+        """Періодично логує пропускну здатність (надсилань/с) для бенчмарків."""
+        previous = 0
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            sent = self.stats["sent"]
+            logging.info(f"[stats] {self.channel.name}: {(sent - previous) / STATS_INTERVAL:.0f} надсилань/с, "
+                         f"у польоті {len(self._tasks)}, всього {self.stats}")
+            previous = sent
+            self.latency.maybe_report()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Асинхронний consumer з паралельним неблокуючим надсиланням.")
+    parser.add_argument("channel", choices=sorted(CHANNELS), help="Канал надсилання")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Максимум надсилань у польоті")
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT, help="Надсилань за секунду (0 - без обмеження)")
+    parser.add_argument("--rate-burst", type=float, default=RATE_BURST, help="Місткість відра токенів")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    if aio_pika is None or AsyncIOMotorClient is None:
+        logging.error("❌ Для асинхронного режиму потрібні aio-pika та motor: poetry install --extras async-consumers")
+        sys.exit(1)
+    args = parse_args()
+    consumer = AsyncConsumer(CHANNELS[args.channel](), args.concurrency, args.rate_limit, args.rate_burst)
+    asyncio.run(consumer.run())
@@ -0,0 +1,285 @@
+import pika
+import json
+import asyncio
+import datetime
+import logging # Імпортуємо модуль логування
+import signal
+import sys
+import time
+import uuid
+import configparser # Імпортуємо модуль для роботи з конфігураційними файлами
+from typing import Any, Dict, List, Optional, Tuple # Імпортуємо типи для анотацій
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+from models import Contact # Імпортуємо модель Contact
+from connect import connect_db # Імпортуємо функцію для підключення до БД
+from contact_stats import count_by_channel, increment
+from status_events import publish_sent
+from latency import CLAIM, END_TO_END, QUEUE_WAIT, SEND, LatencyRecorder, trace_id
+from retry_topology import declare_retry_topology, publish_failure
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Читаємо конфігурацію з config.ini
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Отримуємо параметри RabbitMQ з config.ini
+rabbit_host: str = config.get('RABBITMQ', 'host')
+
+# Параметри consumer'а (секція [CONSUMER] необов'язкова - є значення за замовчуванням)
+PREFETCH_COUNT: int = config.getint('CONSUMER', 'prefetch_count', fallback=500)
+BATCH_SIZE: int = config.getint('CONSUMER', 'batch_size', fallback=200)
+BATCH_INTERVAL: float = config.getfloat('CONSUMER', 'batch_interval', fallback=0.5)
+# Через скільки секунд захоплений, але не позначений контакт знову доступний іншим consumer'ам
+CLAIM_TIMEOUT: float = config.getfloat('CONSUMER', 'claim_timeout', fallback=300.0)
+
+# Поля контакту, потрібні каналам для надсилання
+CONTACT_FIELDS = {'full_name': 1, 'email': 1, 'phone_number': 1, 'preferred_channel': 1}
+
+# Отримане повідомлення: (delivery_tag, properties, тіло)
+Delivery = Tuple[int, pika.spec.BasicProperties, bytes]
+
+
+class ContactChannel:
+    """
+    Базовий клас каналу надсилання (плагін для BatchingConsumer).
+    Підклас задає назву каналу, ключ черги в секції [RABBITMQ] config.ini та метод send().
+    """
+    name: str = "" # Назва каналу для логів, наприклад 'EMAIL'
+    queue_option: str = "" # Ключ назви черги в config.ini, наприклад 'email_queue'
+
+    @property
+    def queue_name(self) -> str:
+        return config.get('RABBITMQ', self.queue_option)
+
+    def send(self, contact: Dict[str, Any]) -> None:
+        """Надсилає повідомлення контакту. Виняток означає, що надсилання не вдалося."""
+        raise NotImplementedError
+
+    async def send_async(self, contact: Dict[str, Any]) -> None:
+        """
+        Неблокуюче надсилання для асинхронного режиму (consumer_async.py).
+        За замовчуванням виконує send() в окремому потоці, щоб не блокувати цикл подій.
+        """
+        await asyncio.to_thread(self.send, contact)
+
+    async def aclose(self) -> None:
+        """Звільняє ресурси асинхронного надсилання (з'єднання, сесії) під час зупинки."""
+
+
+class BatchingConsumer:
+    """
+    Спільне середовище виконання consumer'ів:
+    - basic_qos з налаштовуваним prefetch, щоб брокер не заливав і не "цідив" повідомлення;
+    - збирання доставок у мікропакети, обмежені розміром і часом;
+    - на пакет: одне атомарне захоплення контактів (update_many з токеном), одне читання захоплених,
+      надсилання через канал і ОДИН bulk_write зі статусами is_sent;
+    - невдалі повідомлення перепубліковуються в черги затримки (експоненційний backoff) або в DLQ
+      (retry_topology.py) з підтвердженням від брокера;
+    - підтвердження всього пакета одним basic_ack(multiple=True);
+    - гістограми затримок (очікування в черзі, захоплення, надсилання, від публікації до is_sent) - latency.py.
+    """
+
+    def __init__(self, channel: ContactChannel, prefetch_count: int = PREFETCH_COUNT,
+                 batch_size: int = BATCH_SIZE, batch_interval: float = BATCH_INTERVAL) -> None:
+        self.channel = channel
+        self.prefetch_count = prefetch_count
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._stopping = False
+        self._amqp_channel: Optional[pika.adapters.blocking_connection.BlockingChannel] = None
+        # Окремий канал у режимі confirm_delivery для перепублікації невдалих повідомлень:
+        # оригінал підтверджується лише після того, як брокер прийняв копію
+        self._retry_channel: Optional[pika.adapters.blocking_connection.BlockingChannel] = None
+        self.latency = LatencyRecorder(channel.name)
+
+    def stop(self, *_args) -> None:
+        """Просить consumer завершитися: поточний пакет буде доброблено й підтверджено."""
+        if not self._stopping:
+            logging.info(f"Отримано сигнал завершення, {self.channel.name} consumer допрацьовує поточний пакет...")
+        self._stopping = True
+
+    def run(self) -> None:
+        """Підключається до MongoDB і RabbitMQ та обробляє повідомлення, доки не буде викликано stop()."""
+        connect_db()
+        Contact.ensure_indexes()
+
+        # Підключення до RabbitMQ
+        try:
+            connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host))
+            self._amqp_channel = connection.channel()
+            self._retry_channel = connection.channel()
+            self._retry_channel.confirm_delivery()
+            logging.info(f"✅ Успішно підключено до RabbitMQ на хості: {rabbit_host}")
+        except pika.exceptions.AMQPConnectionError as e:
+            logging.error(f"❌ Помилка підключення до RabbitMQ: {e}")
+            logging.error("Будь ласка, переконайтеся, що RabbitMQ сервер запущений (наприклад, через Docker).")
+            sys.exit(1)
+
+        queue_name = self.channel.queue_name
+        # Оголошення черги (повинна бути такою ж, як і в producer)
+        self._amqp_channel.queue_declare(queue=queue_name, durable=True)
+        declare_retry_topology(self._amqp_channel, queue_name)
+        # Брокер тримає в дорозі не більше prefetch_count непідтверджених повідомлень
+        self._amqp_channel.basic_qos(prefetch_count=self.prefetch_count)
+
+        logging.info(f"\n[*] Очікування {self.channel.name} повідомлень з черги '{queue_name}' "
+                     f"(prefetch={self.prefetch_count}, пакет={self.batch_size}/{self.batch_interval} с). "
+                     f"Для виходу натисніть CTRL+C")
+
+        batch: List[Delivery] = []
+        batch_started = 0.0
+        # inactivity_timeout повертає (None, None, None), коли повідомлень немає,
+        # щоб неповний пакет не чекав безкінечно і щоб можна було перевірити прапорець зупинки
+        for method, properties, body in self._amqp_channel.consume(queue_name, auto_ack=False,
+                                                                   inactivity_timeout=self.batch_interval):
+            if method is not None:
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append((method.delivery_tag, properties, body))
+                self.latency.record_published(QUEUE_WAIT, properties.headers)
+
+            batch_is_due = batch and (len(batch) >= self.batch_size
+                                      or time.monotonic() - batch_started >= self.batch_interval)
+            if batch_is_due or (batch and (method is None or self._stopping)):
+                self.process_batch(batch)
+                batch = []
+            self.latency.maybe_report()
+            if self._stopping:
+                break
+
+        self._amqp_channel.cancel() # Повертає брокеру непідтверджені prefetch-повідомлення
+        connection.close()
+        self.latency.report()
+        logging.info(f"{self.channel.name} consumer зупинено.")
+
+    def process_batch(self, batch: List[Delivery]) -> None:
+        """Обробляє мікропакет доставок і підтверджує його одним basic_ack(multiple=True)."""
+        started = time.perf_counter()
+        deliveries_by_id: Dict[ObjectId, List[Delivery]] = {}
+        invalid = 0
+        for delivery in batch:
+            body = delivery[2]
+            try:
+                # Розпарсимо JSON-рядок з тіла повідомлення в Python-словник
+                contact_id: Optional[str] = json.loads(body).get("contact_id")
+                deliveries_by_id.setdefault(ObjectId(contact_id), []).append(delivery)
+            except (json.JSONDecodeError, InvalidId, TypeError, AttributeError):
+                logging.warning(f"Попередження: Некоректне повідомлення відправлено в DLQ: {body.decode('utf-8', 'replace')}")
+                # Повтор не допоможе - одразу в DLQ
+                self._route_failure(delivery, "некоректне повідомлення", final=True)
+                invalid += 1
+
+        sent: List[ObjectId] = []
+        failed: Dict[ObjectId, str] = {}
+        if deliveries_by_id:
+            token = uuid.uuid4().hex
+            try:
+                sent, failed = self._claim_send_and_mark(list(deliveries_by_id), token)
+            except Exception as e:
+                logging.error(f"❌ Невідома помилка при обробці пакета {self.channel.name}: {e}")
+                # Увесь пакет піде на повторну спробу. Захоплення знімаємо одразу: ступені затримки коротші
+                # за CLAIM_TIMEOUT, і повтор інакше застав би контакти ще захопленими
+                self._release_claims(token)
+                failed = {contact_id: str(e) for contact_id in deliveries_by_id}
+
+        marked_at = time.time()
+        for contact_id in sent:
+            for _tag, properties, _body in deliveries_by_id[contact_id]:
+                self.latency.record_published(END_TO_END, properties.headers, marked_at)
+
+        for contact_id, error in failed.items():
+            for delivery in deliveries_by_id[contact_id]:
+                self._route_failure(delivery, error)
+
+        # Підтверджуємо всі доставки пакета одним кадром (невдалі вже перепубліковані)
+        self._amqp_channel.basic_ack(delivery_tag=batch[-1][0], multiple=True)
+        skipped = len(deliveries_by_id) - len(sent) - len(failed)
+        logging.info(f"   ✅ {self.channel.name}: пакет {len(batch)} повідомлень - надіслано {len(sent)}, "
+                     f"на повтор/DLQ {len(failed) + invalid}, вже надіслані/не знайдені {skipped} "
+                     f"({(time.perf_counter() - started) * 1000:.0f} мс)")
+
+    def _route_failure(self, delivery: Delivery, error: str, final: bool = False) -> None:
+        """Перепубліковує доставку в чергу затримки наступного ступеня або в DLQ."""
+        _tag, properties, body = delivery
+        target = publish_failure(self._retry_channel, self.channel.queue_name, properties, body, error, final)
+        logging.info(f"   ↪️ {self.channel.name}: повідомлення (trace {trace_id(properties.headers)}) "
+                     f"перенаправлено в '{target}' ({error})")
+
+    def _release_claims(self, token: str) -> None:
+        """Знімає захоплення пакета (якщо MongoDB недоступна - воно застаріє за CLAIM_TIMEOUT)."""
+        try:
+            Contact._get_collection().update_many({'claimed_by': token},
+                                                  {'$unset': {'claimed_by': '', 'claimed_at': ''}})
+        except Exception as e:
+            logging.error(f"❌ Не вдалося зняти захоплення пакета {self.channel.name}: {e}")
+
+    def _claim_send_and_mark(self, ids: List[ObjectId], token: str) -> Tuple[List[ObjectId], Dict[ObjectId, str]]:
+        """
+        Захоплює контакти пакета токеном token, надсилає повідомлення і записує статуси.
+        Повертає (id надісланих контактів, {id контакту: текст помилки} для невдалих надсилань).
+        """
+        collection = Contact._get_collection()
+        now = datetime.datetime.now()
+
+        claim_started = time.perf_counter()
+        # 1. Атомарне захоплення: кожен документ оновлюється атомарно, тож паралельні consumer'и
+        # не можуть захопити той самий контакт. "Завислі" захоплення (після падіння) повертаються.
+        collection.update_many(
+            {'_id': {'$in': ids}, 'is_sent': False,
+             '$or': [{'claimed_by': None},
+                     {'claimed_at': {'$lt': now - datetime.timedelta(seconds=CLAIM_TIMEOUT)}}]},
+            {'$set': {'claimed_by': token, 'claimed_at': now}},
+        )
+        # 2. Читаємо лише захоплені цим пакетом контакти
+        contacts = list(collection.find({'claimed_by': token}, CONTACT_FIELDS))
+        self.latency.record(CLAIM, time.perf_counter() - claim_started)
+
+        # Контакти, які ще тримає інший токен (наприклад, consumer, що впав посеред пакета і чиї повідомлення
+        # брокер доставив повторно), не можна підтверджувати як пропущені - інакше їх ніхто не надішле.
+        # Вони йдуть на повтор: до наступного ступеня затримки захоплення звільниться або застаріє.
+        failed: Dict[ObjectId, str] = {
+            contact['_id']: "контакт захоплено іншим consumer'ом"
+            for contact in collection.find({'_id': {'$in': ids}, 'claimed_by': {'$ne': token}, 'is_sent': {'$ne': True}},
+                                           {'_id': 1})
+        }
+
+        # 3. Надсилання та 4. один bulk_write для всіх статусів пакета
+        operations: List[UpdateOne] = []
+        sent: List[ObjectId] = []
+        sent_contacts: List[Dict[str, Any]] = []
+        for contact in contacts:
+            try:
+                send_started = time.perf_counter()
+                self.channel.send(contact)
+                self.latency.record(SEND, time.perf_counter() - send_started)
+                operations.append(UpdateOne({'_id': contact['_id'], 'claimed_by': token},
+                                            {'$set': {'is_sent': True}, '$unset': {'claimed_by': '', 'claimed_at': ''}}))
+                sent.append(contact['_id'])
+                sent_contacts.append(contact)
+            except Exception as e:
+                logging.error(f"❌ Помилка надсилання {self.channel.name} для {contact.get('full_name')}: {e}")
+                # Знімаємо захоплення, щоб контакт можна було обробити повторно
+                operations.append(UpdateOne({'_id': contact['_id'], 'claimed_by': token},
+                                            {'$unset': {'claimed_by': '', 'claimed_at': ''}}))
+                failed[contact['_id']] = str(e)
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        # 5. Лічильники панелі статистики: один $inc на канал за пакет
+        increment('sent', count_by_channel(sent_contacts))
+        # 6. Подія для живого оновлення веб-сторінок (app.py /events)
+        publish_sent(sent_contacts)
+        return sent, failed
+
+
+def run_consumer(channel: ContactChannel) -> None:
+    """Запускає пакетний consumer для каналу; SIGTERM/SIGINT завершують його коректно."""
+    consumer = BatchingConsumer(channel)
+    signal.signal(signal.SIGTERM, consumer.stop)
+    signal.signal(signal.SIGINT, consumer.stop)
+    consumer.run()
@@ -0,0 +1,98 @@
+import datetime
+import logging # Імпортуємо модуль логування
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional # Імпортуємо типи для анотацій
+
+from pymongo import UpdateOne
+
+from models import Contact, ContactStats
+
+# Лічильники статусів контактів за каналом. Кожна зміна - атомарний $inc з upsert,
+# тож паралельні producer'и й consumer'и не втрачають оновлень і не потребують блокувань.
+# Оновлення лічильника не входить у транзакцію з самою зміною контакту: при падінні між ними
+# лічильник може відстати, це виправляє reconcile_contact_stats().
+# Кожне оновлення також збільшує маркер version і ставить updated_at - за ними app.py
+# визначає, чи змінилися контакти (ETag / Last-Modified, кеш відрендерених сторінок).
+
+CHANNELS = ('email', 'sms')
+
+
+def count_by_channel(contacts: Iterable[Mapping[str, Any]]) -> Counter:
+    """Кількість контактів за preferred_channel (для $inc після пакетної операції)."""
+    return Counter(contact.get('preferred_channel') or 'email' for contact in contacts)
+
+
+def inc_update(field: str, n: int) -> Dict[str, Any]:
+    """Документ оновлення: $inc лічильника разом з маркером версії."""
+    return {'$inc': {field: n, 'version': 1},
+            '$set': {'updated_at': datetime.datetime.now(datetime.timezone.utc)}}
+
+
+def inc_operations(field: str, counts: Mapping[str, int]) -> List[UpdateOne]:
+    """Операції $inc для bulk_write: по одній на канал."""
+    return [UpdateOne({'_id': channel}, inc_update(field, n), upsert=True)
+            for channel, n in counts.items() if n]
+
+
+def increment(field: str, counts: Mapping[str, int]) -> None:
+    """Збільшує лічильник 'total' або 'sent' для кожного каналу одним bulk_write."""
+    operations = inc_operations(field, counts)
+    if operations:
+        ContactStats._get_collection().bulk_write(operations, ordered=False)
+
+
+def get_contact_stats() -> Dict[str, Any]:
+    """
+    Зведення для панелі: {'channels': {канал: {total, sent, pending}}, 'total': {...},
+    'version': версія колекції contacts, 'updated_at': час останньої зміни (UTC) або None}.
+    Читає лише документи лічильників (по одному на канал), тож час не залежить від розміру contacts.
+    """
+    channels: Dict[str, Dict[str, int]] = {channel: {'total': 0, 'sent': 0, 'pending': 0} for channel in CHANNELS}
+    version = 0
+    updated_at: Optional[datetime.datetime] = None
+    for doc in ContactStats._get_collection().find({}):
+        total, sent = doc.get('total', 0), doc.get('sent', 0)
+        channels[doc['_id']] = {'total': total, 'sent': sent, 'pending': max(0, total - sent)}
+        version += doc.get('version', 0)
+        if doc.get('updated_at') and (updated_at is None or doc['updated_at'] > updated_at):
+            updated_at = doc['updated_at']
+    summary = {key: sum(row[key] for row in channels.values()) for key in ('total', 'sent', 'pending')}
+    if updated_at is not None:
+        updated_at = updated_at.replace(tzinfo=datetime.timezone.utc) # pymongo повертає наївний UTC
+    return {'channels': channels, 'total': summary, 'version': version, 'updated_at': updated_at}
+
+
+def reconcile_contact_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Перераховує лічильники з колекції contacts одним aggregation pipeline
+    і перезаписує лічильники ContactStats (версія лише зростає, щоб не повторити старий ETag).
+    Повертає нові значення за каналами.
+    Зміни, що відбуваються під час агрегації, можуть бути не враховані - запускайте у спокійний період.
+    """
+    pipeline = [
+        {'$group': {
+            '_id': {'$ifNull': ['$preferred_channel', 'email']},
+            'total': {'$sum': 1},
+            'sent': {'$sum': {'$cond': [{'$eq': ['$is_sent', True]}, 1, 0]}},
+        }},
+    ]
+    counts = {doc['_id']: {'total': doc['total'], 'sent': doc['sent']}
+              for doc in Contact._get_collection().aggregate(pipeline, allowDiskUse=True)}
+
+    collection = ContactStats._get_collection()
+    before = {doc['_id']: doc for doc in collection.find({})}
+    # Канали, контактів яких більше немає, обнуляються (а не видаляються - їхня версія входить у суму)
+    for channel in set(before) - set(counts):
+        counts[channel] = {'total': 0, 'sent': 0}
+    now = datetime.datetime.now(datetime.timezone.utc)
+    operations = [UpdateOne({'_id': channel},
+                            {'$set': {**values, 'updated_at': now}, '$inc': {'version': 1}}, upsert=True)
+                  for channel, values in counts.items()]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    for channel, values in sorted(counts.items()):
+        old = before.get(channel, {})
+        logging.info(f"   {channel}: total {old.get('total', 0)} -> {values['total']}, "
+                     f"sent {old.get('sent', 0)} -> {values['sent']}")
+    return counts
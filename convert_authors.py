@@ -0,0 +1,79 @@
+import argparse
+import json
+import logging # Імпортуємо модуль logging
+import os
+import sys
+from typing import Any, Dict, Iterator, Tuple # Імпортуємо типи для анотацій
+
+from scraper.scraper.dedupe import HashedSeen
+
+# Налаштування логування
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Перетворює data/authors.jsonl (потоковий режим ScraperPipeline, AUTHORS_OUTPUT_FORMAT = "jsonl")
+# у JSON-масив формату data/authors.json - так само відформатований, як його пише json.dump(indent=2).
+# Працює потоково: у пам'яті лише один запис і множина відбитків імен.
+# load_data.py читає JSON Lines напряму, тож конвертація потрібна лише інструментам, що чекають масив.
+
+DEFAULT_INPUT: str = os.path.join("data", "authors.jsonl")
+DEFAULT_OUTPUT: str = os.path.join("data", "authors.json")
+
+
+def iter_jsonl(path: str, stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """
+    Записи JSON Lines. Пошкоджений рядок пропускається з попередженням: після аварійної зупинки
+    павука останній рядок може бути записаний не повністю.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Попередження: Рядок {line_number} пошкоджено і пропущено: {e}")
+                stats["corrupt"] += 1
+
+
+def convert(input_path: str, output_path: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Записує унікальних (за fullname) авторів з input_path у output_path як JSON-масив.
+    Файл записується атомарно: спершу тимчасовий, потім os.replace.
+    Повертає (кількість записаних авторів, лічильники пропущених).
+    """
+    stats = {"corrupt": 0, "duplicates": 0}
+    seen = HashedSeen()
+    written = 0
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for author in iter_jsonl(input_path, stats):
+            fullname = author.get("fullname")
+            if fullname and not seen.add(fullname):
+                stats["duplicates"] += 1
+                continue
+            # Той самий вигляд, що й json.dump(authors, f, ensure_ascii=False, indent=2)
+            body = json.dumps(author, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            out.write(("," if written else "") + "\n  " + body)
+            written += 1
+        out.write("\n]" if written else "]")
+    os.replace(tmp_path, output_path)
+    return written, stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Перетворення authors.jsonl у JSON-масив формату authors.json.")
+    parser.add_argument("--input", default=DEFAULT_INPUT, help="Файл JSON Lines від ScraperPipeline")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Куди записати JSON-масив")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not os.path.exists(args.input):
+        logging.error(f"Помилка: Файл {args.input} не знайдено.")
+        sys.exit(1)
+
+    written, stats = convert(args.input, args.output)
+    logging.info(f"✅ Записано {written} авторів у {args.output} "
+                 f"(дублікатів пропущено: {stats['duplicates']}, пошкоджених рядків: {stats['corrupt']})")
@@ -0,0 +1,153 @@
+import argparse
+import json
+import logging # Імпортуємо модуль логування
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional # Імпортуємо типи для анотацій
+
+from fixture_site import start_server
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Бенчмарк швидкості обходу (сторінок/с) для кожного профілю з CRAWL_PROFILES на локальному fixture_site.py.
+# Кожен профіль запускається в окремому процесі: реактор Twisted не можна перезапустити в одному процесі.
+# Item'и нікуди не зберігаються - вимірюється лише обхід.
+# З --workers 1,2,4 вимірюється масштабування розподіленого обходу: N процесів зі спільним frontier у Redis
+# (окремий префікс ключів на кожен замір). Швидкість рахується від першого старту до останньої відповіді,
+# щоб не враховувати очікування воркерів на порожню чергу наприкінці.
+
+RESULT_PREFIX: str = "BENCHMARK_RESULT "
+
+
+def run_worker(profile: str, url: str, frontier: Optional[str] = None) -> None:
+    """Один обхід з профілем profile; результат - рядок RESULT_PREFIX + JSON у stdout."""
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+
+    from run_scraper import apply_crawl_profile, apply_distributed, project_settings
+    from scraper.scraper.spiders.quotes import QuotesSpider
+
+    settings = project_settings()
+    apply_crawl_profile(settings, profile)
+    if frontier:
+        apply_distributed(settings)
+        settings.set('REDIS_FRONTIER_PREFIX', frontier)
+    settings.set('ITEM_PIPELINES', {})
+    settings.set('FEEDS', {})
+    settings.set('TELNETCONSOLE_ENABLED', False)
+    settings.set('LOG_LEVEL', 'WARNING')
+    logging.disable(logging.INFO)  # Без логу павука на кожну сторінку
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(QuotesSpider)
+    last_response = {"time": 0.0}
+    crawler.signals.connect(lambda **kwargs: last_response.update(time=time.time()), signal=signals.response_received)
+    started = time.time()
+    process.crawl(crawler, start_url=url)
+    process.start()
+
+    stats = crawler.stats.get_stats()
+    result = {
+        "pages": stats.get("downloader/response_count", 0),
+        "items": stats.get("item_scraped_count", 0),
+        "started": started,
+        "finished": last_response["time"] or started,
+        "retries": stats.get("retry/count", 0),
+        "backoff": sum(value for key, value in stats.items() if key.startswith("backoff/")),
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def worker_command(profile: str, url: str, frontier: Optional[str] = None) -> List[str]:
+    command = [sys.executable, __file__, "--worker", profile, "--url", url]
+    return command + ["--frontier", frontier] if frontier else command
+
+
+def read_result(process: subprocess.Popen, label: str) -> Dict[str, Any]:
+    stdout, stderr = process.communicate()
+    for line in stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"{label}: обхід завершився без результату (код {process.returncode}):\n{stderr[-2000:]}")
+
+
+def combine(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Сумарні лічильники кількох воркерів; тривалість - від першого старту до останньої відповіді."""
+    combined = {key: sum(result[key] for result in results) for key in ("pages", "items", "retries", "backoff")}
+    combined["seconds"] = max(r["finished"] for r in results) - min(r["started"] for r in results)
+    return combined
+
+
+def benchmark_profile(profile: str, url: str, workers: int = 0) -> Dict[str, Any]:
+    """Обхід профілем profile: workers = 0 - один процес, інакше N процесів зі спільним frontier у Redis."""
+    if not workers:
+        process = subprocess.Popen(worker_command(profile, url), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True)
+        return combine([read_result(process, f"Профіль {profile}")])
+
+    from run_scraper import project_settings
+    from scraper.scraper.redis_frontier import reset_frontier
+    from scraper.scraper.spiders.quotes import QuotesSpider
+
+    frontier = f"bench-{uuid.uuid4().hex[:8]}"
+    processes = [subprocess.Popen(worker_command(profile, url, frontier), stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, text=True) for _ in range(workers)]
+    try:
+        return combine([read_result(process, f"Профіль {profile}, {workers} воркерів") for process in processes])
+    finally:
+        settings = project_settings()
+        settings.set('REDIS_FRONTIER_PREFIX', frontier)
+        reset_frontier(settings, QuotesSpider.name)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сторінок/с для профілів обходу на локальному fixture-сайті.")
+    parser.add_argument("--profiles", default="polite,adaptive,fast", help="Профілі з CRAWL_PROFILES через кому")
+    parser.add_argument("--url", help="Обходити вже запущений сайт замість вбудованого fixture_site")
+    parser.add_argument("--pages", type=int, default=30, help="Сторінок цитат на fixture-сайті")
+    parser.add_argument("--authors", type=int, default=30, help="Авторів на fixture-сайті")
+    parser.add_argument("--latency", type=float, default=0.05, help="Затримка відповіді fixture-сайту, с")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Випадкова добавка до затримки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Частка відповідей 503")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Ліміт запитів/с fixture-сайту (429 понад нього)")
+    parser.add_argument("--workers", help="Кількості воркерів розподіленого обходу через кому, наприклад 1,2,4 "
+                                          "(потрібен Redis); без параметра - один процес зі звичайним планувальником")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--frontier", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.worker:
+        run_worker(args.worker, args.url, args.frontier)
+        sys.exit(0)
+
+    server = None
+    url = args.url
+    if not url:
+        server, _ = start_server(port=0, pages=args.pages, authors=args.authors, latency=args.latency,
+                                 jitter=args.jitter, error_rate=args.error_rate, max_rps=args.max_rps)
+        url = f"http://localhost:{server.server_address[1]}/"
+
+    results: List[Dict[str, Any]] = []
+    try:
+        worker_counts = [int(count) for count in args.workers.split(",")] if args.workers else [0]
+        for profile in [name.strip() for name in args.profiles.split(",") if name.strip()]:
+            for workers in worker_counts:
+                logging.info(f"Профіль '{profile}'{f', воркерів: {workers}' if workers else ''}: обхід {url} ...")
+                result = benchmark_profile(profile, url, workers)
+                results.append({"profile": profile, "workers": workers or 1, **result})
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(f"{'profile':>10} {'workers':>8} {'pages':>7} {'items':>7} {'сек':>8} {'сторінок/с':>11} "
+          f"{'retry':>6} {'backoff':>8}")
+    for row in results:
+        rate = row["pages"] / row["seconds"] if row["seconds"] else 0.0
+        print(f"{row['profile']:>10} {row['workers']:>8} {row['pages']:>7} {row['items']:>7} {row['seconds']:>8.1f} "
+              f"{rate:>11.1f} {row['retries']:>6} {row['backoff']:>8}")
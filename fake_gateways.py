@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import logging # Імпортуємо модуль логування
+import sys
+import time
+
+# Необов'язкові залежності асинхронного режиму: poetry install --extras async-consumers
+try:
+    from aiohttp import web
+    from aiosmtpd.controller import Controller
+except ImportError:
+    web = None
+    Controller = None
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STATS_INTERVAL: float = 5.0
+
+
+class GatewayStats:
+    """Лічильники прийнятих шлюзами повідомлень."""
+
+    def __init__(self) -> None:
+        self.emails = 0
+        self.sms = 0
+
+
+class CountingSmtpHandler:
+    """Обробник aiosmtpd: приймає будь-який лист (з імітацією затримки) і лише рахує його."""
+
+    def __init__(self, stats: GatewayStats, latency: float) -> None:
+        self.stats = stats
+        self.latency = latency
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.stats.emails += 1
+        return '250 Message accepted for delivery'
+
+
+def build_sms_app(stats: GatewayStats, latency: float) -> "web.Application":
+    """HTTP-застосунок, що імітує SMS-шлюз: POST /sms -> 200 після затримки latency."""
+
+    async def send_sms(request: "web.Request") -> "web.Response":
+        await request.json()
+        if latency:
+            await asyncio.sleep(latency)
+        stats.sms += 1
+        return web.json_response({"status": "queued"})
+
+    app = web.Application()
+    app.router.add_post('/sms', send_sms)
+    return app
+
+
+async def serve(host: str, smtp_port: int, sms_port: int, latency: float) -> None:
+    stats = GatewayStats()
+
+    # SMTP-сервер aiosmtpd працює у власному потоці зі своїм циклом подій
+    controller = Controller(CountingSmtpHandler(stats, latency), hostname=host, port=smtp_port)
+    controller.start()
+
+    runner = web.AppRunner(build_sms_app(stats, latency))
+    await runner.setup()
+    await web.TCPSite(runner, host, sms_port).start()
+    logging.info(f"✅ Fake SMTP: {host}:{smtp_port}, fake SMS: http://{host}:{sms_port}/sms (затримка {latency * 1000:.0f} мс)")
+
+    try:
+        previous_emails, previous_sms, previous_time = 0, 0, time.monotonic()
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            now = time.monotonic()
+            elapsed = now - previous_time
+            logging.info(f"[stats] EMAIL {(stats.emails - previous_emails) / elapsed:.0f}/с (всього {stats.emails}), "
+                         f"SMS {(stats.sms - previous_sms) / elapsed:.0f}/с (всього {stats.sms})")
+            previous_emails, previous_sms, previous_time = stats.emails, stats.sms, now
+    finally:
+        controller.stop()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    if web is None or Controller is None:
+        logging.error("❌ Потрібні aiohttp та aiosmtpd: poetry install --extras async-consumers")
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description="Локальні fake SMTP та SMS шлюзи для бенчмарків consumer'ів.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--sms-port", type=int, default=8026)
+    parser.add_argument("--latency", type=float, default=0.05, help="Імітована затримка шлюзу в секундах")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.smtp_port, args.sms_port, args.latency))
+    except KeyboardInterrupt:
+        logging.info("Шлюзи зупинено.")
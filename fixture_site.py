@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import html
+import logging # Імпортуємо модуль логування
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple # Імпортуємо типи для анотацій
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Локальна копія структури quotes.toscrape.com для бенчмарків павука без мережі:
+# /, /page/N/ - по QUOTES_PER_PAGE цитат з посиланнями на авторів і пагінацією "Next",
+# /author/<slug>/ - сторінка автора з тими самими CSS-класами, що й на справжньому сайті.
+# Дані генеруються детерміновано з seed, тож повторні запуски бачать той самий сайт.
+# Сервер підтримує ETag / If-None-Match (304) і вміє імітувати затримку, 503 та 429 з Retry-After.
+
+QUOTES_PER_PAGE: int = 10
+STATS_INTERVAL: float = 5.0
+
+WORDS = ("life", "love", "truth", "world", "mind", "time", "people", "heart", "dream", "friend",
+         "change", "courage", "success", "simple", "nothing", "always", "learn", "future", "hope", "books")
+TAGS = ("inspirational", "life", "humor", "books", "love", "truth", "friendship", "wisdom", "change", "success")
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="UTF-8"><title>Quotes to Scrape</title></head>
+<body><div class="container">
+<div class="row header-box"><div class="col-md-8"><h1><a href="/">Quotes to Scrape</a></h1></div></div>
+<div class="row"><div class="col-md-8">
+{body}
+</div></div></div></body></html>
+"""
+
+QUOTE_TEMPLATE = """<div class="quote" itemscope itemtype="http://schema.org/CreativeWork">
+    <span class="text" itemprop="text">“{text}”</span>
+    <span>by <small class="author" itemprop="author">{author}</small>
+    <a href="/author/{slug}">(about)</a></span>
+    <div class="tags">Tags: {tags}</div>
+</div>"""
+
+AUTHOR_TEMPLATE = """<div class="author-details">
+    <h3 class="author-title">{fullname}
+    </h3>
+    <p><strong>Born:</strong> <span class="author-born-date">{born_date}</span>
+    <span class="author-born-location">in {born_location}</span></p>
+    <p><strong>Description:</strong></p>
+    <div class="author-description">
+        {description}
+    </div>
+</div>"""
+
+
+class FixtureSite:
+    """Згенерований сайт: сторінки цитат і авторів як готові HTML-рядки з ETag."""
+
+    def __init__(self, pages: int, authors: int, seed: int = 42) -> None:
+        rng = random.Random(seed)
+        self.seed = seed
+        self.pages = pages
+        self.authors: List[Dict[str, str]] = []
+        for i in range(authors):
+            fullname = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}son {i}"
+            self.authors.append({
+                "fullname": fullname,
+                "slug": re.sub(r'[^A-Za-z0-9]+', '-', fullname).strip('-'),
+                "born_date": f"{rng.choice(('January', 'March', 'July', 'October'))} {rng.randint(1, 28)}, "
+                             f"{rng.randint(1800, 1990)}",
+                "born_location": f"{rng.choice(WORDS).title()}ville, Testland",
+                "description": " ".join(rng.choice(WORDS) for _ in range(60)).capitalize() + ".",
+            })
+        self._by_slug = {author["slug"]: author for author in self.authors}
+
+    def quote_page(self, number: int) -> Optional[str]:
+        if not 1 <= number <= self.pages:
+            return None
+        rng = random.Random(f"{self.seed}-page-{number}")  # Сторінка не залежить від порядку запитів
+        blocks = []
+        for i in range(QUOTES_PER_PAGE):
+            author = self.authors[rng.randrange(len(self.authors))]
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + f" ({number}.{i})."
+            tags = "".join(f'\n        <a class="tag" href="/tag/{tag}/page/1/">{tag}</a>'
+                           for tag in rng.sample(TAGS, rng.randint(1, 4)))
+            blocks.append(QUOTE_TEMPLATE.format(text=html.escape(text), author=html.escape(author["fullname"]),
+                                                slug=author["slug"], tags=tags))
+        pager = []
+        if number > 1:
+            pager.append(f'<li class="previous"><a href="/page/{number - 1}/">← Previous</a></li>')
+        if number < self.pages:
+            pager.append(f'<li class="next"><a href="/page/{number + 1}/">Next →</a></li>')
+        body = "\n".join(blocks) + f'\n<nav><ul class="pager">{"".join(pager)}</ul></nav>'
+        return PAGE_TEMPLATE.format(body=body)
+
+    def author_page(self, slug: str) -> Optional[str]:
+        author = self._by_slug.get(slug)
+        if author is None:
+            return None
+        return PAGE_TEMPLATE.format(body=AUTHOR_TEMPLATE.format(**{key: html.escape(value)
+                                                                   for key, value in author.items()}))
+
+    def render(self, path: str) -> Optional[str]:
+        if path in ("/", "/page/1/"):
+            return self.quote_page(1)
+        match = re.fullmatch(r'/page/(\d+)/?', path)
+        if match:
+            return self.quote_page(int(match.group(1)))
+        match = re.fullmatch(r'/author/([^/]+)/?', path)
+        if match:
+            return self.author_page(match.group(1))
+        return None
+
+
+class RateLimiter:
+    """Token bucket на весь сервер: max_rps запитів за секунду, решта отримує 429."""
+
+    def __init__(self, max_rps: float) -> None:
+        self.max_rps = max_rps
+        self._tokens = max_rps
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.max_rps <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._updated) * self.max_rps)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class FixtureStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counts: Dict[int, int] = {}
+
+    def add(self, status: int) -> None:
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+
+def make_handler(site: FixtureSite, latency: float, jitter: float, error_rate: float,
+                 limiter: RateLimiter, stats: FixtureStats):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, як у справжнього сервера
+
+        def do_GET(self) -> None:
+            delay = latency + random.uniform(0, jitter)
+            if delay:
+                time.sleep(delay)
+            if not limiter.allow():
+                return self._send(429, "Too Many Requests", {"Retry-After": "1"})
+            if error_rate and random.random() < error_rate:
+                return self._send(503, "Service Unavailable")
+            if self.path == "/robots.txt":
+                return self._send(200, "User-agent: *\nDisallow:\n", content_type="text/plain")
+
+            page = site.render(self.path)
+            if page is None:
+                return self._send(404, "Not Found")
+            etag = '"' + hashlib.blake2b(page.encode("utf-8"), digest_size=8).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, "", {"ETag": etag})
+            self._send(200, page, {"ETag": etag})
+
+        def _send(self, status: int, body: str, headers: Optional[Dict[str, str]] = None,
+                  content_type: str = "text/html; charset=utf-8") -> None:
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(payload)
+            stats.add(status)
+
+        def log_message(self, format: str, *args) -> None:
+            pass  # Без логу на кожен запит - лише періодична статистика
+
+    return FixtureHandler
+
+
+def start_server(host: str = "localhost", port: int = 8030, pages: int = 100, authors: int = 50,
+                 latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0, max_rps: float = 0.0,
+                 seed: int = 42) -> Tuple[ThreadingHTTPServer, FixtureStats]:
+    """Запускає сервер у фоновому потоці й повертає (server, stats); зупинка - server.shutdown()."""
+    site = FixtureSite(pages, authors, seed)
+    stats = FixtureStats()
+    handler = make_handler(site, latency, jitter, error_rate, RateLimiter(max_rps), stats)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fixture-site", daemon=True).start()
+    logging.info(f"✅ Fixture site: http://{host}:{server.server_address[1]}/ ({pages} сторінок, {authors} авторів, "
+                 f"затримка {latency * 1000:.0f}+{jitter * 1000:.0f} мс, 503 {error_rate:.0%}, "
+                 f"ліміт {max_rps or '∞'} запитів/с)")
+    return server, stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Локальна копія quotes.toscrape.com для бенчмарків павука.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8030)
+    parser.add_argument("--pages", type=int, default=100, help="Кількість сторінок цитат (по 10 цитат)")
+    parser.add_argument("--authors", type=int, default=50, help="Кількість авторів")
+    parser.add_argument("--latency", type=float, default=0.05, help="Затримка відповіді в секундах")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Додаткова випадкова затримка 0..jitter с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Частка відповідей 503")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Ліміт запитів/с, понад який - 429 (0 - без ліміту)")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    server, stats = start_server(args.host, args.port, args.pages, args.authors, args.latency, args.jitter,
+                                 args.error_rate, args.max_rps, args.seed)
+    try:
+        previous, previous_time = 0, time.monotonic()
+        while True:
+            time.sleep(STATS_INTERVAL)
+            now = time.monotonic()
+            with stats.lock:
+                counts = dict(stats.counts)
+            total = sum(counts.values())
+            logging.info(f"[stats] {(total - previous) / (now - previous_time):.0f} запитів/с (всього {total}), "
+                         f"за статусами: {dict(sorted(counts.items()))}")
+            previous, previous_time = total, now
+    except KeyboardInterrupt:
+        server.shutdown()
+        logging.info("Fixture site зупинено.")
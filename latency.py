@@ -0,0 +1,243 @@
+import argparse
+import configparser # Імпортуємо модуль для роботи з конфігураційними файлами
+import glob
+import heapq
+import json
+import logging # Імпортуємо модуль логування
+import math
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple # Імпортуємо типи для анотацій
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Читаємо конфігурацію з config.ini (секція [LATENCY] необов'язкова)
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+REPORT_INTERVAL: float = config.getfloat('LATENCY', 'report_interval', fallback=30.0) # Як часто логувати p50/p95/p99
+DUMP_DIR: str = config.get('LATENCY', 'dump_dir', fallback='latency') # Куди писати дампи гістограм
+
+# Заголовки, якими producer позначає повідомлення
+TRACE_ID_HEADER: str = 'x-trace-id'
+PUBLISHED_AT_HEADER: str = 'x-published-at' # Unix-час публікації (секунди, float)
+
+# Етапи, що вимірюються consumer'ами
+QUEUE_WAIT = 'queue_wait' # Від публікації до отримання consumer'ом
+CLAIM = 'claim' # Атомарне захоплення контактів у MongoDB
+SEND = 'send' # Надсилання одного повідомлення каналом
+END_TO_END = 'end_to_end' # Від публікації до запису is_sent = True
+METRICS: Tuple[str, ...] = (QUEUE_WAIT, CLAIM, SEND, END_TO_END)
+
+PERCENTILES: Tuple[float, ...] = (50.0, 95.0, 99.0)
+SLOWEST_TRACES: int = 10 # Скільки найповільніших trace ID зберігати в дампі
+
+
+def trace_headers() -> Dict[str, Any]:
+    """Заголовки для pika.BasicProperties: новий trace ID і час публікації."""
+    return {TRACE_ID_HEADER: uuid.uuid4().hex, PUBLISHED_AT_HEADER: time.time()}
+
+
+def published_at(headers: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Час публікації з заголовків повідомлення або None, якщо producer його не записав."""
+    value = (headers or {}).get(PUBLISHED_AT_HEADER)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def trace_id(headers: Optional[Dict[str, Any]]) -> Optional[str]:
+    value = (headers or {}).get(TRACE_ID_HEADER)
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class LatencyHistogram:
+    """
+    Гістограма тривалостей з фіксованими логарифмічними кошиками:
+    BUCKETS_PER_DECADE кошиків на порядок від MIN_VALUE до MIN_VALUE * 10**DECADES секунд
+    (відносна похибка перцентиля ~12%). Кошики однакові в усіх процесах, тож гістограми
+    різних worker'ів і запусків можна складати й порівнювати.
+    """
+
+    MIN_VALUE: float = 1e-5 # 10 мкс
+    DECADES: int = 8 # до 1000 с
+    BUCKETS_PER_DECADE: int = 20
+
+    def __init__(self) -> None:
+        # Кошик 0 - значення менші за MIN_VALUE, останній - більші за верхню межу
+        self.counts: List[int] = [0] * (self.DECADES * self.BUCKETS_PER_DECADE + 2)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value < self.MIN_VALUE:
+            return 0
+        index = int(math.log10(value / self.MIN_VALUE) * self.BUCKETS_PER_DECADE) + 1
+        return min(index, len(self.counts) - 1)
+
+    def _upper_bound(self, index: int) -> float:
+        if index == len(self.counts) - 1:
+            return self.max
+        return self.MIN_VALUE * 10 ** (index / self.BUCKETS_PER_DECADE)
+
+    def record(self, seconds: float) -> None:
+        seconds = max(0.0, seconds) # Від'ємні значення можливі через розбіжність годинників
+        self.counts[self._index(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Верхня межа кошика, в який потрапляє q-й перцентиль (у секундах)."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q / 100 * self.count))
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "percentiles": {f"p{q:g}": self.percentile(q) for q in PERCENTILES},
+            # Розріджений запис: лише непорожні кошики
+            "buckets": {str(index): n for index, n in enumerate(self.counts) if n},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        for index, n in data.get("buckets", {}).items():
+            histogram.counts[int(index)] += n
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("sum", 0.0)
+        histogram.max = data.get("max", 0.0)
+        return histogram
+
+    def describe(self) -> str:
+        if not self.count:
+            return "немає даних"
+        percentiles = ", ".join(f"p{q:g}={self.percentile(q) * 1000:.1f}" for q in PERCENTILES)
+        return f"n={self.count}, {percentiles}, max={self.max * 1000:.1f} мс"
+
+
+class LatencyRecorder:
+    """
+    Набір гістограм етапів обробки для одного consumer'а.
+    Раз на REPORT_INTERVAL логує p50/p95/p99 і перезаписує дамп
+    <DUMP_DIR>/<name>-<pid>.json, який можна порівняти між запусками: python latency.py compare ...
+    """
+
+    def __init__(self, name: str, report_interval: float = REPORT_INTERVAL, dump_dir: str = DUMP_DIR) -> None:
+        self.name = name
+        self.report_interval = report_interval
+        self.dump_path = os.path.join(dump_dir, f"{name.lower()}-{os.getpid()}.json")
+        self.histograms: Dict[str, LatencyHistogram] = {metric: LatencyHistogram() for metric in METRICS}
+        self._slowest: List[Tuple[float, str]] = [] # Мін-купа (end_to_end, trace ID)
+        self._started = time.time()
+        self._last_report = time.monotonic()
+
+    def record(self, metric: str, seconds: float) -> None:
+        self.histograms[metric].record(seconds)
+
+    def record_published(self, metric: str, headers: Optional[Dict[str, Any]], now: Optional[float] = None) -> None:
+        """Записує час від публікації (заголовок x-published-at) до now; для старих повідомлень без заголовка - нічого."""
+        published = published_at(headers)
+        if published is None:
+            return
+        seconds = (now or time.time()) - published
+        self.record(metric, seconds)
+        if metric == END_TO_END:
+            entry = (seconds, trace_id(headers) or "-")
+            if len(self._slowest) < SLOWEST_TRACES:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def maybe_report(self) -> None:
+        if time.monotonic() - self._last_report >= self.report_interval:
+            self.report()
+
+    def report(self) -> None:
+        """Логує перцентилі всіх етапів і перезаписує файл дампу."""
+        self._last_report = time.monotonic()
+        for metric in METRICS:
+            logging.info(f"[latency] {self.name} {metric}: {self.histograms[metric].describe()}")
+        try:
+            self.dump()
+        except OSError as e:
+            logging.error(f"❌ Не вдалося записати дамп затримок {self.dump_path}: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "pid": os.getpid(),
+            "started_at": self._started,
+            "dumped_at": time.time(),
+            "metrics": {metric: histogram.to_dict() for metric, histogram in self.histograms.items()},
+            "slowest": [{"trace_id": trace, "seconds": seconds}
+                        for seconds, trace in sorted(self._slowest, reverse=True)],
+        }
+
+    def dump(self) -> None:
+        os.makedirs(os.path.dirname(self.dump_path) or '.', exist_ok=True)
+        tmp_path = f"{self.dump_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.dump_path) # Атомарна заміна: читач не побачить напівзаписаний файл
+
+
+def load_histograms(paths: Iterable[str]) -> Dict[str, LatencyHistogram]:
+    """Зчитує дампи (наприклад, усіх worker'ів одного запуску) і складає їхні гістограми."""
+    merged = {metric: LatencyHistogram() for metric in METRICS}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        for metric, histogram in data.get("metrics", {}).items():
+            merged.setdefault(metric, LatencyHistogram()).merge(LatencyHistogram.from_dict(histogram))
+    return merged
+
+
+def expand(patterns: List[str]) -> List[str]:
+    return sorted({path for pattern in patterns for path in (glob.glob(pattern) or [pattern])})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Зведення та порівняння дампів затримок consumer'ів.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="Перцентилі одного запуску (дампи складаються)")
+    summary_parser.add_argument("dumps", nargs="+", help="Файли або шаблони, наприклад latency/email-*.json")
+    compare_parser = subparsers.add_parser("compare", help="Порівняння перцентилів двох запусків")
+    compare_parser.add_argument("--base", nargs="+", required=True, help="Дампи базового запуску")
+    compare_parser.add_argument("--new", nargs="+", required=True, help="Дампи нового запуску")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        for metric, histogram in load_histograms(expand(args.dumps)).items():
+            print(f"{metric:>12}: {histogram.describe()}")
+    else:
+        base = load_histograms(expand(args.base))
+        new = load_histograms(expand(args.new))
+        print(f"{'metric':>12} {'pct':>5} {'base, мс':>12} {'new, мс':>12} {'зміна':>8}")
+        for metric in METRICS:
+            for q in PERCENTILES:
+                before = base[metric].percentile(q) * 1000
+                after = new[metric].percentile(q) * 1000
+                change = f"{(after - before) / before * 100:+.0f}%" if before else "-"
+                print(f"{metric:>12} {f'p{q:g}':>5} {before:>12.1f} {after:>12.1f} {change:>8}")
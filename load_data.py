@@ -1,84 +1,294 @@
+import argparse
 import json
 import os
+import re
 import sys
+import time
 import logging # Імпортуємо модуль logging
-from typing import List, Dict, Any # Імпортуємо типи для анотацій
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional # Імпортуємо типи для анотацій
 
-from models import Author, Quote # Імпортуємо моделі
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+
+from models import Author, Quote, quote_content_hash # Імпортуємо моделі
 from connect import connect_db # Імпортуємо функцію для підключення до БД
+from tag_index import rebuild_tag_index # Інвертований індекс тегів у Redis
+from cache import QUOTES_CACHE_NAMESPACE, bump_generation # Інвалідація кешу результатів пошуку
 
 # Налаштування логування для цього модуля
 # Використовуємо той же базовий формат, що і в connect.py, але можна налаштувати окремо
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 1. Підключаємося до бази даних MongoDB Atlas
-# Це дуже важливо, щоб скрипт міг взаємодіяти з БД
-connect_db()
-
 # Шляхи до JSON файлів. Тепер вони вказують на папку 'data'.
 # Створюємо повний шлях до файлів, використовуючи os.path.join
 DATA_FOLDER: str = "data" # Анотація типу
 AUTHORS_FILE_PATH: str = os.path.join(DATA_FOLDER, "authors.json") # Анотація типу
 QUOTES_FILE_PATH: str = os.path.join(DATA_FOLDER, "quotes.json") # Анотація типу
 
+DEFAULT_BATCH_SIZE: int = 1000 # Кількість операцій в одному bulk_write
+READ_CHUNK_SIZE: int = 64 * 1024 # Розмір блоку читання файлу при потоковому розборі JSON-масиву
+DUPLICATE_KEY_ERROR: int = 11000 # Код помилки MongoDB при порушенні унікального індексу
+
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+def iter_json_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Потоково читає записи з файлу, не завантажуючи його в пам'ять повністю.
+    Підтримує два формати (визначається автоматично):
+    - JSON-масив '[{...}, {...}]' (як data/*.json, що їх генерує Scrapy);
+    - JSON Lines: один JSON-об'єкт у кожному рядку.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(READ_CHUNK_SIZE)
+        stripped = buffer.lstrip()
+
+        if not stripped.startswith('['):
+            # JSON Lines: дочитуємо перший блок до кінця рядка і далі йдемо рядок за рядком
+            for line in (buffer + f.readline()).splitlines():
+                if line.strip():
+                    yield json.loads(line)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        # JSON-масив: послідовно декодуємо елементи з буфера, дочитуючи файл блоками
+        pos = buffer.index('[') + 1
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield record
+            pos = end
+            if pos > READ_CHUNK_SIZE: # Відкидаємо вже розібрану частину буфера
+                buffer, pos = buffer[pos:], 0
+
+
+def iter_batches(records: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Розбиває потік записів на списки довжиною batch_size."""
+    iterator = iter(records)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def new_stats(updates: bool = True) -> Dict[str, int]:
+    """
+    Лічильники результатів завантаження однієї колекції.
+    updates=False - для колекцій, що лише вставляються (цитати): лічильника оновлень немає і в підсумку.
+    """
+    stats = {"inserted": 0, "updated": 0, "skipped": 0, "errors": 0, "records": 0}
+    if not updates:
+        del stats["updated"]
+    return stats
 
-# Перевірка наявності JSON файлів
-if not os.path.exists(AUTHORS_FILE_PATH):
-    logging.error(f"Помилка: Файл {AUTHORS_FILE_PATH} не знайдено.") # Використовуємо logging.error
-    sys.exit(1)
-
-if not os.path.exists(QUOTES_FILE_PATH):
-    logging.error(f"Помилка: Файл {QUOTES_FILE_PATH} не знайдено.") # Використовуємо logging.error
-    sys.exit(1)
-
-logging.info(f"Завантажуємо дані з {AUTHORS_FILE_PATH} та {QUOTES_FILE_PATH}...") # Використовуємо logging.info
-
-try:
-    # 2. Відкриваємо та читаємо authors.json
-    with open(AUTHORS_FILE_PATH, "r", encoding="utf-8") as f:
-        authors_data: List[Dict[str, Any]] = json.load(f) # Анотація типу
-
-    # 3. Для кожного автора з JSON: Створюємо об'єкт Author та зберігаємо його в БД
-    logging.info("Зберігаємо авторів...") # Використовуємо logging.info
-    for author_info in authors_data:
-        # Перевіряємо, чи автор вже існує, щоб уникнути дублікатів
-        if not Author.objects(fullname=author_info["fullname"]).first():
-            Author(**author_info).save()
-            logging.info(f"Збережено автора: {author_info['fullname']}") # Використовуємо logging.info
-        else:
-            logging.info(f"Автор вже існує (пропущено): {author_info['fullname']}") # Використовуємо logging.info (було закоментовано, але корисно для дебагу)
-    logging.info("Автори збережені.") # Використовуємо logging.info
-
-    # 4. Відкриваємо та читаємо quotes.json
-    with open(QUOTES_FILE_PATH, "r", encoding="utf-8") as f:
-        quotes_data: List[Dict[str, Any]] = json.load(f) # Анотація типу
-
-    # 5. Для кожної цитати з JSON:
-    logging.info("Зберігаємо цитати...") # Використовуємо logging.info
-    for quote_info in quotes_data:
-        # Знаходимо відповідного автора в БД за fullname
-        author = Author.objects(fullname=quote_info["author"]).first()
-        if author:
-            # Створюємо об'єкт Quote, використовуючи знайдений об'єкт автора
-            # Перевіряємо, чи цитата вже існує, щоб уникнути дублікатів
-            if not Quote.objects(quote=quote_info["quote"], author=author).first():
-                Quote(
-                    quote=quote_info["quote"],
-                    tags=quote_info["tags"],
-                    author=author
-                ).save()
-                logging.info(f"Збережено цитату: '{quote_info['quote']}' від {quote_info['author']}") # Використовуємо logging.info
+
+def apply_bulk(collection: Collection, operations: List[UpdateOne], stats: Dict[str, int]) -> None:
+    """
+    Виконує невпорядкований (ordered=False) bulk_write і оновлює лічильники.
+    Невпорядкований режим дозволяє серверу виконувати операції паралельно й не зупинятися на першій помилці.
+    """
+    if not operations:
+        return
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        upserted, matched, modified = result.upserted_count, result.matched_count, result.modified_count
+    except BulkWriteError as e:
+        details = e.details
+        upserted, matched, modified = details["nUpserted"], details["nMatched"], details["nModified"]
+        stats["errors"] += len(details["writeErrors"])
+        for error in details["writeErrors"][:5]:
+            logging.error(f"Помилка запису: {error.get('errmsg')}")
+
+    stats["inserted"] += upserted
+    stats["updated"] += modified
+    stats["skipped"] += matched - modified # Документ уже існував і не змінився
+
+
+def apply_inserts(collection: Collection, documents: List[Dict[str, Any]], stats: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    Вставляє документи невпорядкованим insert_many. Дублікати відсікає унікальний індекс:
+    помилки duplicate key рахуються як пропущені записи, а не як збої.
+    Повертає фактично вставлені документи (з _id).
+    """
+    if not documents:
+        return []
+    try:
+        stats["inserted"] += len(collection.insert_many(documents, ordered=False).inserted_ids)
+        return documents
+    except BulkWriteError as e:
+        details = e.details
+        stats["inserted"] += details["nInserted"]
+        for error in details["writeErrors"]:
+            if error["code"] == DUPLICATE_KEY_ERROR:
+                stats["skipped"] += 1
             else:
-                logging.info(f"Цитата вже існує (пропущено): '{quote_info['quote']}'") # Використовуємо logging.info (було закоментовано, але корисно для дебагу)
-        else:
-            logging.error(f"Помилка: Автор '{quote_info['author']}' для цитати '{quote_info['quote']}' не знайдений в БД. Цитата не буде збережена.") # Використовуємо logging.error
-    logging.info("Цитати збережені.") # Використовуємо logging.info
-
-    logging.info("Процес завантаження даних завершено успішно! 🎉") # Використовуємо logging.info
-
-except json.JSONDecodeError as e:
-    logging.error(f"Помилка читання JSON файлу: {e}. Перевірте формат JSON.") # Використовуємо logging.error
-    sys.exit(1)
-except Exception as e:
-    logging.error(f"Виникла невідома помилка під час завантаження даних: {e}") # Використовуємо logging.error
-    sys.exit(1)
+                stats["errors"] += 1
+                logging.error(f"Помилка запису: {error.get('errmsg')}")
+        failed = {error["index"] for error in details["writeErrors"]}
+        return [doc for index, doc in enumerate(documents) if index not in failed]
+
+
+def author_upsert(author_info: Dict[str, Any]) -> Optional[UpdateOne]:
+    """Операція upsert автора за fullname; None, якщо запис без імені."""
+    fullname = author_info.get("fullname")
+    if not fullname:
+        return None
+    fields = {
+        "fullname": fullname,
+        "fullname_lower": fullname.lower(),
+        "born_date": author_info.get("born_date"),
+        "born_location": author_info.get("born_location"),
+        "description": author_info.get("description"),
+    }
+    # Поля без значення не перезаписують уже збережені (неповний файл авторів не стирає дані)
+    fields = {name: value for name, value in fields.items() if value is not None}
+    return UpdateOne({"fullname": fullname}, {"$set": fields}, upsert=True)
+
+
+def quote_document(quote_info: Dict[str, Any], author_id: Any) -> Dict[str, Any]:
+    """Документ цитати для вставки, з полями пошуку та дедуплікації (content_hash, tags_lower)."""
+    tags = quote_info.get("tags") or []
+    return {
+        "quote": quote_info["quote"],
+        "content_hash": quote_content_hash(quote_info["quote"]),
+        "author": author_id,
+        "tags": tags,
+        "tags_lower": [tag.lower() for tag in tags],
+    }
+
+
+def load_authors(path: str, batch_size: int) -> Dict[str, int]:
+    """
+    Завантажує авторів пакетними upsert'ами за fullname (ідемпотентно: повторний запуск нічого не дублює).
+    """
+    Author.ensure_indexes()
+    collection = Author._get_collection()
+    stats = new_stats()
+
+    for batch in iter_batches(iter_json_records(path), batch_size):
+        operations = []
+        for author_info in batch:
+            stats["records"] += 1
+            operation = author_upsert(author_info)
+            if operation is None:
+                logging.warning(f"Запис автора без 'fullname' пропущено: {author_info}")
+                stats["skipped"] += 1
+                continue
+            operations.append(operation)
+        apply_bulk(collection, operations, stats)
+        logging.info(f"Автори: оброблено {stats['records']} записів...")
+    return stats
+
+
+def build_author_map() -> Dict[str, Any]:
+    """Будує відображення fullname -> ObjectId одним запитом (замість пошуку автора для кожної цитати)."""
+    return {
+        author["fullname"]: author["_id"]
+        for author in Author._get_collection().find({}, {"fullname": 1})
+    }
+
+
+def load_quotes(path: str, batch_size: int, author_ids: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Завантажує цитати пакетними вставками.
+    Автор визначається за картою author_ids без звернень до БД, а повтори відсікає
+    унікальний індекс (content_hash, author) - без запиту перед кожною вставкою,
+    тому час повторного імпорту не залежить від розміру колекції.
+    """
+    Quote.ensure_indexes()
+    collection = Quote._get_collection()
+    stats = new_stats(updates=False)
+
+    for batch in iter_batches(iter_json_records(path), batch_size):
+        documents = []
+        for quote_info in batch:
+            stats["records"] += 1
+            if not quote_info.get("quote"):
+                logging.warning(f"Попередження: Запис автора '{quote_info.get('author')}' без тексту цитати пропущено.")
+                stats["skipped"] += 1
+                continue
+            author_id = author_ids.get(quote_info.get("author"))
+            if author_id is None:
+                logging.error(f"Помилка: Автор '{quote_info.get('author')}' для цитати '{quote_info.get('quote')}' не знайдений в БД. Цитата не буде збережена.")
+                stats["skipped"] += 1
+                continue
+            documents.append(quote_document(quote_info, author_id))
+        apply_inserts(collection, documents, stats)
+        logging.info(f"Цитати: оброблено {stats['records']} записів...")
+    return stats
+
+
+def log_summary(name: str, stats: Dict[str, int], elapsed: float) -> None:
+    """Виводить підсумок завантаження колекції."""
+    rate = stats["records"] / elapsed if elapsed > 0 else 0.0
+    updated = f"оновлено {stats['updated']}, " if "updated" in stats else ""
+    logging.info(
+        f"{name}: вставлено {stats['inserted']}, {updated}пропущено {stats['skipped']}, "
+        f"помилок {stats['errors']} - {stats['records']} записів за {elapsed:.2f} с ({rate:.0f} записів/с)"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пакетне ідемпотентне завантаження авторів і цитат у MongoDB.")
+    parser.add_argument("--authors", default=AUTHORS_FILE_PATH, help="Файл авторів (JSON-масив або JSON Lines)")
+    parser.add_argument("--quotes", default=QUOTES_FILE_PATH, help="Файл цитат (JSON-масив або JSON Lines)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Розмір пакета bulk_write")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Перевірка наявності JSON файлів
+    for file_path in (args.authors, args.quotes):
+        if not os.path.exists(file_path):
+            logging.error(f"Помилка: Файл {file_path} не знайдено.") # Використовуємо logging.error
+            sys.exit(1)
+
+    # 1. Підключаємося до бази даних MongoDB Atlas
+    connect_db()
+    logging.info(f"Завантажуємо дані з {args.authors} та {args.quotes} (пакети по {args.batch_size})...")
+
+    try:
+        # 2. Автори: пакетні upsert'и за fullname
+        started = time.perf_counter()
+        authors_stats = load_authors(args.authors, args.batch_size)
+        authors_elapsed = time.perf_counter() - started
+
+        # 3. Карта fullname -> ObjectId будується один раз для всіх цитат
+        author_ids = build_author_map()
+
+        # 4. Цитати: пакетні вставки, дублікати відсікає унікальний індекс (content_hash, author)
+        started = time.perf_counter()
+        quotes_stats = load_quotes(args.quotes, args.batch_size, author_ids)
+        quotes_elapsed = time.perf_counter() - started
+
+        # 5. Перебудовуємо інвертований індекс тегів у Redis, щоб запити 'tags:' бачили нові цитати
+        rebuild_tag_index()
+
+        # 6. Інвалідовуємо всі закешовані результати пошуку (author:*, tag:*) за O(1)
+        bump_generation(QUOTES_CACHE_NAMESPACE)
+
+        log_summary("Автори", authors_stats, authors_elapsed)
+        log_summary("Цитати", quotes_stats, quotes_elapsed)
+        logging.info("Процес завантаження даних завершено успішно! 🎉") # Використовуємо logging.info
+
+    except json.JSONDecodeError as e:
+        logging.error(f"Помилка читання JSON файлу: {e}. Перевірте формат JSON.") # Використовуємо logging.error
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"Виникла невідома помилка під час завантаження даних: {e}") # Використовуємо logging.error
+        sys.exit(1)
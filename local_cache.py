@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple # Імпортуємо типи для анотацій
+
+
+class LocalLRUCache:
+    """
+    Потокобезпечний in-process LRU-кеш з обмеженням розміру та TTL для кожного запису.
+    Не залежить від Redis, тому його можна використовувати будь-де в проєкті.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        """
+        maxsize: максимальна кількість записів; найдавніше використаний запис витісняється першим.
+        ttl: час життя запису за замовчуванням у секундах.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Повертає пару (знайдено, значення).
+        Прострочені записи видаляються під час читання.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Зберігає значення; якщо ttl не вказано, використовується TTL кешу."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Видаляє запис, якщо він є."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очищає кеш повністю."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
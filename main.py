@@ -2,122 +2,157 @@ import logging
 import sys
 import json
 from concurrent.futures import ThreadPoolExecutor
-import re
+from typing import Any, Dict, List, Optional
 
+from bson import ObjectId
 
 from run_scraper import run_scrapy_spider
 
-from connect import connect_db
-from cache import r as redis_client, get_cache, set_cache
+from connect import connect_db, query_counter
+from cache import QUOTES_CACHE_NAMESPACE, get_cache_stats, get_or_compute, versioned_key
 from models import Author, Quote
-from mongoengine import Q
+from tag_index import search_tags
 
 # Налаштування логування для main.py
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Шляхи запису викликають bump_generation(QUOTES_CACHE_NAMESPACE), тому TTL може бути довгим
+QUOTES_CACHE_TTL = 7 * 24 * 3600 # 7 днів
+
+
+def build_quotes_data(quotes, authors_by_id: Optional[Dict[ObjectId, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Спільний шар побудови результатів пошуку.
+    Читає цитати як сирі документи (без розіменування Quote.author) і підтягує всіх
+    потрібних авторів ОДНИМ пакетним запитом замість окремого запиту на кожну цитату (N+1).
+    Якщо імена авторів уже відомі (наприклад, при пошуку за автором), передайте authors_by_id,
+    і додатковий запит не виконуватиметься взагалі.
+    """
+    raw_quotes: List[Dict[str, Any]] = list(quotes.only('quote', 'tags', 'author').as_pymongo())
+
+    if authors_by_id is None:
+        author_ids = list({q['author'] for q in raw_quotes if q.get('author')})
+        authors_by_id = {}
+        if author_ids:
+            for author in Author.objects(id__in=author_ids).only('fullname').as_pymongo():
+                authors_by_id[author['_id']] = author['fullname']
+
+    return [
+        {
+            "quote": q['quote'],
+            "author": authors_by_id.get(q.get('author'), "Невідомий автор"),
+            "tags": list(q.get('tags', [])),
+        }
+        for q in raw_quotes
+    ]
+
+
+def print_quotes(quotes_data: List[Dict[str, Any]]) -> None:
+    """Виводить список цитат у єдиному форматі."""
+    for quote_data in quotes_data:
+        logging.info(
+            f"- \"{quote_data['quote']}\" - {quote_data['author']} (Теги: {', '.join(quote_data['tags'])})")
+
+
+def log_query_count(search_label: str) -> None:
+    """Логує кількість звернень до MongoDB, виконаних під час останнього пошуку."""
+    logging.info(f"[stats] {search_label}: запитів до MongoDB - {query_counter.total} {query_counter.commands}")
+
 
 # Функція для пошуку цитат за ім'ям автора
 def search_quotes_by_author(author_name):
     """
     Шукає цитати за повним або частковим ім'ям автора.
-    Використовує Redis для кешування результатів.
+    Використовує дворівневий кеш (in-process LRU + Redis) із захистом від одночасного перерахунку.
     """
-    cache_key = f"author:{author_name.lower()}"
-    cached_result = get_cache(cache_key)
-
-    if cached_result:
-        logging.info(">>> From Redis:")
-        quotes_data = cached_result
-        for quote_data in quotes_data:
-            logging.info(
-                f"- \"{quote_data['quote']}\" - {quote_data['author']} (Теги: {', '.join(quote_data['tags'])})")
-        return
-
-    logging.info(">>> From MongoDB:")
-
-    # ВИПРАВЛЕНО: Спочатку знаходимо авторів за іменем
-    # Використовуємо iregex для пошуку за частковим ім'ям без урахування регістру
-    authors = Author.objects(fullname__iregex=f"^{re.escape(author_name)}").all()
-
-    if not authors:
-        logging.info("Автора з таким ім'ям не знайдено.")
-        return
-
-    # Збираємо ID знайдених авторів
-    author_ids = [author.id for author in authors]
-
-    # Тепер шукаємо цитати, які посилаються на цих авторів за їхніми ID
-    quotes = Quote.objects(author__in=author_ids).all()
-
-    if quotes:
-        quotes_data = []
-        for quote in quotes:
-            quotes_data.append({
-                "quote": quote.quote,
-                "author": quote.author.fullname,
-                "tags": [tag for tag in quote.tags]
-            })
-        set_cache(cache_key, quotes_data, ttl=3600)
-        for quote_data in quotes_data:
-            logging.info(
-                f"- \"{quote_data['quote']}\" - {quote_data['author']} (Теги: {', '.join(quote_data['tags'])})")
-    else:
-        logging.info("Цитат за цим автором не знайдено.")
+    from_db = False
+
+    def load_from_db():
+        nonlocal from_db
+        from_db = True
+        logging.info(">>> From MongoDB:")
+        query_counter.reset()
+
+        # Спочатку знаходимо авторів за іменем.
+        # Пошук за префіксом нормалізованого поля fullname_lower - це заякорений regex без
+        # IGNORECASE, який MongoDB виконує як діапазонне сканування індексу (IXSCAN).
+        authors = Author.objects(fullname_lower__startswith=author_name.lower()).only('fullname')
+        authors_by_id = {author['_id']: author['fullname'] for author in authors.as_pymongo()}
+
+        if not authors_by_id:
+            logging.info("Автора з таким ім'ям не знайдено.")
+            log_query_count(f"name: {author_name}")
+            return None
+
+        # Тепер шукаємо цитати, які посилаються на цих авторів за їхніми ID.
+        # Імена авторів уже відомі, тому повторно їх не запитуємо.
+        quotes_data = build_quotes_data(Quote.objects(author__in=list(authors_by_id)), authors_by_id)
+        if not quotes_data:
+            logging.info("Цитат за цим автором не знайдено.")
+        log_query_count(f"name: {author_name}")
+        return quotes_data or None # Порожні результати не кешуємо
+
+    quotes_data = get_or_compute(
+        versioned_key(QUOTES_CACHE_NAMESPACE, f"author:{author_name.lower()}"), load_from_db, ttl=QUOTES_CACHE_TTL)
+    if quotes_data:
+        if not from_db:
+            logging.info(">>> From cache:")
+        print_quotes(quotes_data)
 
 
 # Функція для пошуку цитат за тегом
 def search_quotes_by_tag(tag_name):
     """
     Шукає цитати за повним або частковим тегом.
-    Використовує Redis для кешування результатів.
+    Використовує дворівневий кеш (in-process LRU + Redis) із захистом від одночасного перерахунку.
     """
-    cache_key = f"tag:{tag_name.lower()}"
-    cached_result = get_cache(cache_key)
-
-    if cached_result:
-        logging.info(">>> From Redis:")
-        quotes_data = cached_result
-        for quote_data in quotes_data:
-            logging.info(
-                f"- \"{quote_data['quote']}\" - {quote_data['author']} (Теги: {', '.join(quote_data['tags'])})")
-        return
-
-    logging.info(">>> From MongoDB:")
-    quotes = Quote.objects(tags__iregex=f"^{re.escape(tag_name)}").all()
-    if quotes:
-        quotes_data = []
-        for quote in quotes:
-            quotes_data.append({
-                "quote": quote.quote,
-                "author": quote.author.fullname,
-                "tags": [tag for tag in quote.tags]
-            })
-        set_cache(cache_key, quotes_data, ttl=3600)
-        for quote_data in quotes_data:
-            logging.info(
-                f"- \"{quote_data['quote']}\" - {quote_data['author']} (Теги: {', '.join(quote_data['tags'])})")
-    else:
-        logging.info("Цитат за цим тегом не знайдено.")
+    from_db = False
+
+    def load_from_db():
+        nonlocal from_db
+        from_db = True
+        logging.info(">>> From MongoDB:")
+        query_counter.reset()
+        # Префіксний пошук по multikey-індексу tags_lower замість повного сканування з iregex
+        quotes_data = build_quotes_data(Quote.objects(tags_lower__startswith=tag_name.lower()))
+        if not quotes_data:
+            logging.info("Цитат за цим тегом не знайдено.")
+        log_query_count(f"tag: {tag_name}")
+        return quotes_data or None # Порожні результати не кешуємо
+
+    quotes_data = get_or_compute(
+        versioned_key(QUOTES_CACHE_NAMESPACE, f"tag:{tag_name.lower()}"), load_from_db, ttl=QUOTES_CACHE_TTL)
+    if quotes_data:
+        if not from_db:
+            logging.info(">>> From cache:")
+        print_quotes(quotes_data)
 
 
 # Функція для пошуку цитат за кількома тегами
-def search_quotes_by_tags(tag_names):
+def search_quotes_by_tags(tag_names, match_all=False):
     """
-    Шукає цитати за кількома тегами (логічне АБО).
-    Не кешується в Redis.
+    Шукає цитати за кількома тегами: логічне АБО (за замовчуванням) або логічне І (match_all=True).
+    Відповідь береться з інвертованого індексу тегів у Redis (SUNION / SINTER).
+    Якщо індекс ще не побудований, виконується запит до MongoDB.
     """
-    logging.info(">>> From MongoDB (множинні теги не кешуються):")
-    tags_query = [Q(tags__in=[tag.strip()]) for tag in tag_names]
-    combined_query = Q()
-    for q_obj in tags_query:
-        combined_query |= q_obj
+    tag_names = [tag.strip() for tag in tag_names if tag.strip()]
+    mode_label = "alltags" if match_all else "tags"
 
-    quotes = Quote.objects(combined_query).all()
+    quotes_data = search_tags(tag_names, match_all=match_all)
+    if quotes_data is not None:
+        logging.info(">>> From Redis (індекс тегів):")
+    else:
+        logging.info(">>> From MongoDB (індекс тегів у Redis ще не побудований):")
+        query_counter.reset()
+        if match_all:
+            quotes = Quote.objects(tags__all=tag_names)
+        else:
+            quotes = Quote.objects(tags__in=tag_names)
+        quotes_data = build_quotes_data(quotes)
+        log_query_count(f"{mode_label}: {','.join(tag_names)}")
 
-    if quotes:
-        for quote in quotes:
-            logging.info(
-                f"- \"{quote.quote}\" - {quote.author.fullname} (Теги: {', '.join(tag for tag in quote.tags)})")
+    if quotes_data:
+        print_quotes(quotes_data)
     else:
         logging.info("Цитат за вказаними тегами не знайдено.")
 
@@ -128,8 +163,9 @@ def run_cli_app():
     Запускає інтерактивний CLI-додаток для пошуку цитат.
     """
     logging.info(
-        "\nПідключено до бази даних. Введіть команду для пошуку (наприклад, 'name: Albert Einstein', 'tag: life', 'tags: humor,funny') або 'exit' для виходу.")
-    logging.info("Результати з кешу Redis будуть позначені '>>> From Redis:', з MongoDB - '>>> From MongoDB:'.")
+        "\nПідключено до бази даних. Введіть команду для пошуку (наприклад, 'name: Albert Einstein', 'tag: life', 'tags: humor,funny', 'alltags: life,love') або 'exit' для виходу.")
+    logging.info("Результати з кешу (in-process LRU або Redis) будуть позначені '>>> From cache:', з MongoDB - '>>> From MongoDB:'.")
+    logging.info("Команда 'stats' показує лічильники влучань/промахів кешу.")
     logging.info("Тепер також підтримується скорочений пошук, наприклад, 'name: al' або 'tag: li'.")
 
     while True:
@@ -137,6 +173,8 @@ def run_cli_app():
         if command.lower() == 'exit':
             logging.info("Вихід з програми.")
             break
+        elif command.lower() == 'stats':
+            logging.info(f"[stats] Кеш: {get_cache_stats()}")
         elif command.lower().startswith('name:'):
             author_name = command[len('name:'):].strip()
             search_quotes_by_author(author_name)
@@ -147,9 +185,13 @@ def run_cli_app():
             tag_names_str = command[len('tags:'):].strip()
             tag_names = [t.strip() for t in tag_names_str.split(',')]
             search_quotes_by_tags(tag_names)
+        elif command.lower().startswith('alltags:'):
+            tag_names_str = command[len('alltags:'):].strip()
+            tag_names = [t.strip() for t in tag_names_str.split(',')]
+            search_quotes_by_tags(tag_names, match_all=True)
         else:
             logging.info(
-                "Невідома команда. Будь ласка, використовуйте 'name: <автор>', 'tag: <тег>', 'tags: <тег1,тег2>' або 'exit'.")
+                "Невідома команда. Будь ласка, використовуйте 'name: <автор>', 'tag: <тег>', 'tags: <тег1,тег2>', 'alltags: <тег1,тег2>' або 'exit'.")
 
 
 # Головна точка входу в програму
@@ -0,0 +1,156 @@
+import argparse
+import logging # Імпортуємо модуль logging
+import sys
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from cache import QUOTES_CACHE_NAMESPACE, bump_generation # Інвалідація кешу результатів пошуку
+from connect import connect_db # Імпортуємо функцію для підключення до БД
+from contact_stats import reconcile_contact_stats
+from models import Author, Quote, quote_content_hash # Імпортуємо моделі
+from tag_index import remove_quotes # Видалені дублікати прибираються з індексу тегів
+
+BACKFILL_BATCH_SIZE: int = 1000
+DUPLICATE_KEY_ERROR: int = 11000
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def backfill_search_fields() -> None:
+    """
+    Заповнює нормалізовані поля пошуку (fullname_lower, tags_lower) для вже існуючих документів
+    і створює індекси з Author.meta / Quote.meta.
+    Оновлення виконуються на сервері через update-pipeline, тож це один запит на колекцію.
+    """
+    Author.ensure_indexes()
+    Quote.ensure_indexes()
+
+    authors_result = Author._get_collection().update_many(
+        {},
+        [{'$set': {'fullname_lower': {'$toLower': '$fullname'}}}],
+    )
+    logging.info(f"Автори: оновлено {authors_result.modified_count} з {authors_result.matched_count}.")
+
+    quotes_result = Quote._get_collection().update_many(
+        {},
+        [{'$set': {'tags_lower': {'$map': {
+            'input': {'$ifNull': ['$tags', []]},
+            'as': 'tag',
+            'in': {'$toLower': '$$tag'},
+        }}}}],
+    )
+    logging.info(f"Цитати: оновлено {quotes_result.modified_count} з {quotes_result.matched_count}.")
+
+
+def backfill_content_hash(delete_duplicates: bool = False) -> None:
+    """
+    Обчислює content_hash для цитат, у яких його ще немає, пакетними bulk_write.
+    Унікальний індекс (content_hash, author) створюється ДО заповнення, тому справжні дублікати
+    проявляються як помилки duplicate key: вони звітуються і, за бажання, видаляються.
+    """
+    Quote.ensure_indexes()
+    collection = Quote._get_collection()
+    cursor = collection.find({'content_hash': {'$exists': False}}, {'quote': 1}).batch_size(BACKFILL_BATCH_SIZE)
+
+    updated, duplicate_ids = 0, []
+    batch: List[UpdateOne] = []
+    batch_ids: List[Any] = []
+
+    def flush() -> None:
+        nonlocal updated
+        if not batch:
+            return
+        try:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+        except BulkWriteError as e:
+            updated += e.details['nModified']
+            for error in e.details['writeErrors']:
+                if error['code'] == DUPLICATE_KEY_ERROR:
+                    duplicate_ids.append(batch_ids[error['index']])
+                else:
+                    logging.error(f"Помилка оновлення цитати: {error.get('errmsg')}")
+        batch.clear()
+        batch_ids.clear()
+
+    for doc in cursor:
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {'content_hash': quote_content_hash(doc.get('quote') or '')}}))
+        batch_ids.append(doc['_id'])
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            flush()
+    flush()
+
+    logging.info(f"Цитати: content_hash заповнено для {updated} документів.")
+    if duplicate_ids:
+        logging.warning(f"Знайдено {len(duplicate_ids)} дублікатів цитат (той самий текст і автор).")
+        if delete_duplicates:
+            deleted = collection.delete_many({'_id': {'$in': duplicate_ids}}).deleted_count
+            logging.info(f"Видалено {deleted} дублікатів.")
+            # Інакше пошук за тегами й кеш і далі віддавали б видалені цитати
+            remove_quotes(duplicate_ids)
+            bump_generation(QUOTES_CACHE_NAMESPACE)
+        else:
+            logging.info("Щоб видалити їх, запустіть з --delete-duplicates.")
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Рекурсивно збирає назви стадій (IXSCAN, COLLSCAN, FETCH, ...) з плану запиту."""
+    stages = [plan.get('stage', '?')]
+    if 'inputStage' in plan:
+        stages += _plan_stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def explain_prefix_queries(prefix: str) -> bool:
+    """
+    Виконує explain() для префіксних запитів CLI і перевіряє, що MongoDB
+    використовує індекс (IXSCAN), а не повне сканування колекції (COLLSCAN).
+    Повертає True, якщо обидва запити йдуть через індекс.
+    """
+    queries = {
+        f"name: {prefix}": Author.objects(fullname_lower__startswith=prefix.lower()),
+        f"tag: {prefix}": Quote.objects(tags_lower__startswith=prefix.lower()),
+    }
+
+    all_indexed = True
+    for label, queryset in queries.items():
+        explain = queryset.explain()
+        winning_plan = explain['queryPlanner']['winningPlan']
+        # Починаючи з MongoDB 7.0 (SBE) класичний план вкладений у 'queryPlan'
+        stages = _plan_stages(winning_plan.get('queryPlan', winning_plan))
+        indexed = 'IXSCAN' in stages and 'COLLSCAN' not in stages
+        all_indexed = all_indexed and indexed
+        status = "✅" if indexed else "❌"
+        logging.info(f"{status} {label}: {' <- '.join(stages)}")
+    return all_indexed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Міграції та перевірки індексів для колекцій authors/quotes/contacts.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('backfill-search', help="Заповнити fullname_lower / tags_lower і створити індекси")
+    hash_parser = subparsers.add_parser('backfill-hash', help="Заповнити content_hash цитат і створити унікальний індекс")
+    hash_parser.add_argument('--delete-duplicates', action='store_true', help="Видалити знайдені дублікати")
+    explain_parser = subparsers.add_parser('explain', help="Показати плани префіксних запитів (IXSCAN vs COLLSCAN)")
+    explain_parser.add_argument('prefix', nargs='?', default='al', help="Префікс для перевірки (за замовчуванням 'al')")
+    subparsers.add_parser('reconcile-stats', help="Перерахувати лічильники контактів за каналами (aggregation)")
+
+    args = parser.parse_args()
+    connect_db()
+
+    if args.command == 'backfill-search':
+        backfill_search_fields()
+    elif args.command == 'backfill-hash':
+        backfill_content_hash(args.delete_duplicates)
+    elif args.command == 'explain':
+        if not explain_prefix_queries(args.prefix):
+            sys.exit(1)
+    elif args.command == 'reconcile-stats':
+        logging.info("Перерахунок лічильників контактів...")
+        reconcile_contact_stats()
+        logging.info("✅ Лічильники контактів узгоджено з колекцією contacts.")
@@ -1,21 +1,63 @@
 # models.py
-from mongoengine import Document, StringField, EmailField, BooleanField, ReferenceField, ListField, URLField, DateTimeField
+from mongoengine import Document, StringField, EmailField, BooleanField, ReferenceField, ListField, URLField, DateTimeField, IntField
 import datetime
+import hashlib
+
+
+def quote_content_hash(text: str) -> str:
+    """
+    Обчислює ключ дедуплікації цитати: SHA-1 від нормалізованого тексту
+    (без зовнішніх лапок, у нижньому регістрі, з одинарними пробілами).
+    """
+    normalized = " ".join(text.strip().strip('“”"').lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
 
 # Модель для автора
 class Author(Document):
     fullname = StringField(required=True, unique=True)
+    # Нормалізоване (lower-case) ім'я для пошуку за префіксом по індексу.
+    # Заповнюється автоматично в clean(), для старих документів - через `python migrate.py backfill-search`
+    fullname_lower = StringField()
     born_date = StringField()
     born_location = StringField()
     description = StringField()
-    meta = {'collection': 'authors'} # Вказуємо назву колекції в MongoDB
+    meta = {
+        'collection': 'authors', # Вказуємо назву колекції в MongoDB
+        'indexes': ['fullname_lower'],
+    }
+
+    def clean(self):
+        self.fullname_lower = self.fullname.lower() if self.fullname else None
 
 # Модель для цитати
 class Quote(Document):
     quote = StringField(required=True)
     tags = ListField(StringField())
+    # Нормалізовані (lower-case) теги для пошуку за префіксом по multikey-індексу
+    tags_lower = ListField(StringField())
     author = ReferenceField(Author) # Посилання на модель Author
-    meta = {'collection': 'quotes'} # Вказуємо назву колекції в MongoDB
+    # Хеш нормалізованого тексту (див. quote_content_hash). Разом з author утворює унікальний ключ,
+    # тож дублікати відсікає індекс, а не запит перед кожною вставкою.
+    # Для старих документів заповнюється через `python migrate.py backfill-hash`
+    content_hash = StringField()
+    meta = {
+        'collection': 'quotes', # Вказуємо назву колекції в MongoDB
+        'indexes': [
+            'tags_lower',
+            'author',
+            {
+                'fields': ['content_hash', 'author'],
+                'unique': True,
+                # Документи без хешу (ще не мігровані) не беруть участі в унікальності
+                'partialFilterExpression': {'content_hash': {'$type': 'string'}},
+            },
+        ],
+    }
+
+    def clean(self):
+        self.tags_lower = [tag.lower() for tag in self.tags]
+        self.content_hash = quote_content_hash(self.quote) if self.quote else None
 
 # НОВА МОДЕЛЬ: Contact
 class Contact(Document):
@@ -33,5 +75,35 @@ class Contact(Document):
     preferred_channel = StringField(choices=('email', 'sms'), default='email')
     # Додаткове поле для інформаційного навантаження, наприклад, дата створення контакту
     created_at = DateTimeField(default=datetime.datetime.now)
+    # Службові поля пакетного "захоплення" контактів consumer'ами (див. consumer_base.py):
+    # токен пакета, який зараз обробляє контакт, і час захоплення (для повернення "завислих" контактів)
+    claimed_by = StringField()
+    claimed_at = DateTimeField()
+
+    meta = {
+        'collection': 'contacts', # Вказуємо назву колекції в MongoDB
+        'indexes': [
+            {'fields': ['claimed_by'], 'sparse': True},
+            # Keyset-пагінація веб-списку (app.py): сортування (is_sent, created_at, _id);
+            # фільтр is_sent=... використовує той самий індекс як префікс рівності
+            ('is_sent', 'created_at', 'id'),
+        ],
+    }
+
+
+# Лічильники контактів за каналом (preferred_channel): один документ на канал, _id - назва каналу.
+# producer.py і consumer'и оновлюють їх атомарним $inc (див. contact_stats.py),
+# тож панель статистики читає 2 документи замість підрахунку всієї колекції contacts.
+# Якщо лічильники розійшлися з даними - `python migrate.py reconcile-stats`.
+class ContactStats(Document):
+    channel = StringField(primary_key=True)
+    total = IntField(default=0)
+    sent = IntField(default=0)
+    # Маркер версії: збільшується тим самим $inc при кожній зміні контактів каналу.
+    # Сума версій за каналами - версія колекції contacts для ETag / кешу сторінок app.py
+    version = IntField(default=0)
+    updated_at = DateTimeField() # UTC, для Last-Modified
 
-    meta = {'collection': 'contacts'} # Вказуємо назву колекції в MongoDB
+    meta = {
+        'collection': 'contact_stats',
+    }
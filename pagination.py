@@ -0,0 +1,73 @@
+import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple # Імпортуємо типи для анотацій
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Keyset (cursor) пагінація: замість skip(N), який змушує MongoDB пройти N документів,
+# наступна сторінка починається строго після ключа сортування останнього рядка попередньої.
+# З відповідним складеним індексом вартість сторінки не залежить від її "глибини".
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Ключ сортування одного рядка: значення полів у порядку сортування
+SortKey = Tuple[Any, ...]
+
+
+def encode_cursor(values: SortKey) -> str:
+    """
+    Кодує ключ сортування рядка в короткий рядок для URL: bool -> 0/1, datetime -> мс від епохи, ObjectId -> hex.
+    Наприклад (False, datetime, ObjectId) -> '0.1760769602849.6712...'.
+    """
+    parts = []
+    for value in values:
+        if isinstance(value, bool):
+            parts.append(str(int(value)))
+        elif isinstance(value, datetime.datetime):
+            # MongoDB зберігає дати з точністю до мілісекунди, тож перетворення без втрат
+            parts.append(str(round((value.replace(tzinfo=None) - EPOCH).total_seconds() * 1000)))
+        else:
+            parts.append(str(value))
+    return '.'.join(parts)
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Optional[SortKey]:
+    """Зворотне до encode_cursor; повертає None для некоректного курсора."""
+    parts = cursor.split('.')
+    if len(parts) != len(types):
+        return None
+    values: List[Any] = []
+    try:
+        for part, kind in zip(parts, types):
+            if kind is bool:
+                if part not in ('0', '1'):
+                    return None
+                values.append(part == '1')
+            elif kind is datetime.datetime:
+                values.append(EPOCH + datetime.timedelta(milliseconds=int(part)))
+            elif kind is ObjectId:
+                values.append(ObjectId(part))
+            else:
+                values.append(kind(part))
+    except (ValueError, InvalidId, OverflowError):
+        return None
+    return tuple(values)
+
+
+def keyset_filter(fields: Sequence[str], values: SortKey, forward: bool = True) -> Dict[str, Any]:
+    """
+    Умова "рядок строго після (forward) / перед ключем values" для сортування за fields за зростанням:
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+    Кожна гілка $or - це префікс рівностей плюс діапазон, тож кожна використовує складений індекс.
+    """
+    operator = '$gt' if forward else '$lt'
+    branches = []
+    for i, field in enumerate(fields):
+        branch = {fields[j]: values[j] for j in range(i)}
+        branch[field] = {operator: values[i]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {'$or': branches}
+
+
+def row_key(row: Dict[str, Any], fields: Sequence[str]) -> SortKey:
+    return tuple(row.get(field) for field in fields)
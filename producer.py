@@ -1,13 +1,20 @@
 import pika
 import json
+import argparse
+import datetime
+import time
 import logging # Імпортуємо модуль логування
 import sys # Імпортуємо модуль sys для sys.exit()
 from faker import Faker
+from pymongo.errors import BulkWriteError
 from models import Contact # Імпортуємо модель Contact
-import connect # noqa: Цей імпорт нашого connect.py ініціалізує підключення до MongoDB Atlas
+from connect import connect_db # Імпортуємо функцію для підключення до БД
+from contact_stats import count_by_channel, increment
+from latency import trace_headers
 import random
+import uuid
 import configparser # Імпортуємо модуль для роботи з конфігураційними файлами
-from typing import Dict, Any, Union # Імпортуємо типи для анотацій
+from typing import Dict, Any, Iterator, List, Optional, Tuple # Імпортуємо типи для анотацій
 
 # Ініціалізація Faker для генерації фейкових даних
 fake = Faker()
@@ -24,70 +31,251 @@ rabbit_host: str = config.get('RABBITMQ', 'host')
 email_queue_name: str = config.get('RABBITMQ', 'email_queue')
 sms_queue_name: str = config.get('RABBITMQ', 'sms_queue')
 
-# Підключення до RabbitMQ
-# Використовуємо BlockingConnection для синхронної роботи
-try:
-    connection: pika.BlockingConnection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host))
-    channel: pika.adapters.blocking_connection.BlockingChannel = connection.channel()
-    logging.info(f"✅ Успішно підключено до RabbitMQ на хості: {rabbit_host}")
-except pika.exceptions.AMQPConnectionError as e:
-    logging.error(f"❌ Помилка підключення до RabbitMQ: {e}")
-    logging.error("Будь ласка, переконайтеся, що RabbitMQ сервер запущений (наприклад, через Docker).")
-    sys.exit(1) # Виходимо, якщо не можемо підключитися
-
-# Оголошення черг
-# Якщо черги не існують, RabbitMQ їх створить.
-# durable=True означає, що черга переживе перезапуск RabbitMQ
-channel.queue_declare(queue=email_queue_name, durable=True)
-channel.queue_declare(queue=sms_queue_name, durable=True)
-logging.info(f"Оголошено черги: '{email_queue_name}' та '{sms_queue_name}'")
-
-# Генерація фейкових контактів та відправка повідомлень у черги
-num_contacts_to_generate: int = 10 # Кількість контактів для генерації
-
-logging.info(f"\nГенеруємо {num_contacts_to_generate} фейкових контактів...")
-for i in range(num_contacts_to_generate):
-    # Випадковим чином обираємо кращий канал зв'язку для контакту
-    preferred_channel: str = random.choice(["email", "sms"])
-
-    # Створюємо новий контакт з фейковими даними
-    # is_sent за замовчуванням False, phone_number та preferred_channel заповнюються
-    contact: Contact = Contact(
-        full_name=fake.name(),
-        email=fake.email(),
-        phone_number=fake.phone_number(), # Використовуємо phone_number як у моделі
-        preferred_channel=preferred_channel
-    )
-    # Зберігаємо контакт у MongoDB
+DEFAULT_CONTACTS: int = 10 # Кількість контактів для генерації за замовчуванням
+DEFAULT_BATCH_SIZE: int = 500 # Скільки контактів вставляється одним insert_many і підтверджується разом
+
+# Повідомлення для публікації: (назва черги, тіло повідомлення)
+Message = Tuple[str, bytes]
+
+
+def unique_email() -> str:
+    """
+    Email, унікальний за побудовою (Contact.email має унікальний індекс): до фейкового імені додається
+    короткий випадковий суфікс. На відміну від fake.unique, не зберігає всі видані значення в пам'яті.
+    """
+    return f"{fake.user_name()}.{uuid.uuid4().hex[:12]}@{fake.free_email_domain()}"
+
+
+def generate_contacts(count: int) -> List[Dict[str, Any]]:
+    """
+    Генерує документи контактів з фейковими даними.
+    is_sent = False, phone_number та preferred_channel заповнюються як у моделі Contact.
+    """
+    now = datetime.datetime.now()
+    return [
+        {
+            "full_name": fake.name(),
+            "email": unique_email(),
+            "phone_number": fake.phone_number(),
+            # Випадковим чином обираємо кращий канал зв'язку для контакту
+            "preferred_channel": random.choice(["email", "sms"]),
+            "is_sent": False,
+            "created_at": now,
+        }
+        for _ in range(count)
+    ]
+
+
+def insert_contacts(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Вставляє пакет контактів одним невпорядкованим insert_many.
+    Повертає лише успішно вставлені документи (наприклад, без дублікатів email).
+    """
     try:
-        contact.save()
-        logging.info(f"   Збережено контакт у MongoDB: {contact.full_name} ({contact.email})")
-    except Exception as e:
-        logging.error(f"   ❌ Помилка збереження контакту {contact.full_name} у MongoDB: {e}")
-        continue # Продовжуємо до наступного контакту, якщо виникла помилка збереження
-
-    # Формуємо дані для повідомлення (тільки ObjectID контакту)
-    contact_data: Dict[str, str] = {'contact_id': str(contact.id)} # Перетворюємо ObjectId на рядок
-
-    # Визначаємо, в яку чергу відправляти повідомлення
-    queue_to_send: str
-    if preferred_channel == "email":
-        queue_to_send = email_queue_name
-    else: # preferred_channel == "sms"
-        queue_to_send = sms_queue_name
-
-    # Відправляємо повідомлення в RabbitMQ
-    channel.basic_publish(
-        exchange='', # Використовуємо дефолтний exchange (пряма відправка в чергу)
-        routing_key=queue_to_send, # Назва черги, в яку відправляємо
-        body=json.dumps(contact_data).encode('utf-8'), # Перетворюємо словник на JSON-рядок і кодуємо в байти
-        properties=pika.BasicProperties(
-            delivery_mode=2, # Зробити повідомлення стійким (persistent)
+        Contact._get_collection().insert_many(documents, ordered=False)
+        return documents
+    except BulkWriteError as e:
+        failed = {error['index'] for error in e.details['writeErrors']}
+        for error in e.details['writeErrors'][:5]:
+            logging.error(f"   ❌ Помилка збереження контакту у MongoDB: {error.get('errmsg')}")
+        return [doc for index, doc in enumerate(documents) if index not in failed]
+
+
+def build_message(contact: Dict[str, Any]) -> Message:
+    """Формує повідомлення для контакту: черга за preferred_channel, тіло - лише ObjectID контакту."""
+    queue_to_send = email_queue_name if contact["preferred_channel"] == "email" else sms_queue_name
+    contact_data: Dict[str, str] = {'contact_id': str(contact["_id"])} # Перетворюємо ObjectId на рядок
+    return queue_to_send, json.dumps(contact_data).encode('utf-8')
+
+
+def generate_batches(total: int, batch_size: int, stats: Dict[str, Any]) -> Iterator[List[Message]]:
+    """Генерує й вставляє контакти пакетами, повертаючи повідомлення для кожного пакета."""
+    remaining = total
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        remaining -= size
+
+        started = time.perf_counter()
+        inserted = insert_contacts(generate_contacts(size))
+        increment('total', count_by_channel(inserted)) # Лічильники панелі статистики (contact_stats.py)
+        stats["insert_seconds"] += time.perf_counter() - started
+        stats["contacts"] += len(inserted)
+        logging.info(f"   Збережено {len(inserted)} з {size} контактів у MongoDB (insert_many)")
+
+        yield [build_message(contact) for contact in inserted]
+
+
+class BatchConfirmPublisher:
+    """
+    Публікує повідомлення в RabbitMQ з підтвердженнями видавця (publisher confirms).
+    Пакет публікується повністю, після чого видавець чекає на ack'и всього пакета
+    (брокер може підтверджувати кілька повідомлень одним кадром multiple=True),
+    а не на кожне повідомлення окремо. Повідомлення, на які прийшов nack, публікуються повторно.
+    Працює на асинхронному pika.SelectConnection, бо BlockingChannel у режимі confirm
+    чекає на підтвердження після кожного basic_publish.
+    """
+
+    MAX_REPUBLISH_ATTEMPTS: int = 3
+
+    def __init__(self, host: str, queues: List[str], batches: Iterator[List[Message]], stats: Dict[str, Any]) -> None:
+        self._parameters = pika.ConnectionParameters(host=host)
+        self._queues = queues
+        self._batches = batches
+        self._stats = stats
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._delivery_tag = 0
+        self._pending: Dict[int, Message] = {} # delivery_tag -> повідомлення, що чекає на підтвердження
+        self._nacked: List[Message] = []
+        self._attempt = 0
+        self._batch_started = 0.0
+        self._closing = False
+        self.error: Optional[Exception] = None
+
+    def run(self) -> None:
+        """Підключається до RabbitMQ і блокує виконання, доки всі пакети не буде опубліковано."""
+        self._connection = pika.SelectConnection(
+            self._parameters,
+            on_open_callback=self._on_connection_open,
+            on_open_error_callback=self._on_connection_error,
+            on_close_callback=self._on_connection_closed,
         )
-    )
+        self._connection.ioloop.start()
+        if self.error:
+            raise self.error
 
-    logging.info(f"[x] Відправлено '{preferred_channel.upper()}' завдання для контакту: {contact.full_name} (ID: {contact.id}) до черги '{queue_to_send}'")
+    def _on_connection_error(self, connection, error: Exception) -> None:
+        self.error = error
+        connection.ioloop.stop()
 
-# Закриття з'єднання з RabbitMQ
-connection.close()
-logging.info("\nЗавершено генерацію та відправку контактів. З'єднання з RabbitMQ закрито.")
+    def _on_connection_closed(self, connection, reason: Exception) -> None:
+        if not self._closing:
+            # З'єднання обірвалося посеред роботи: непідтверджені повідомлення вважаються втраченими
+            self._stats["lost"] += len(self._pending)
+            self.error = reason
+        connection.ioloop.stop()
+
+    def _on_connection_open(self, connection) -> None:
+        logging.info(f"✅ Успішно підключено до RabbitMQ на хості: {rabbit_host}")
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel) -> None:
+        self._channel = channel
+        self._declare_queues(list(self._queues))
+
+    def _declare_queues(self, queues: List[str], _frame=None) -> None:
+        # Оголошення черг по черзі (асинхронно): durable=True - черга переживе перезапуск RabbitMQ
+        if queues:
+            queue = queues.pop(0)
+            self._channel.queue_declare(queue=queue, durable=True,
+                                        callback=lambda frame: self._declare_queues(queues, frame))
+            return
+        logging.info(f"Оголошено черги: {', '.join(self._queues)}")
+        self._channel.confirm_delivery(ack_nack_callback=self._on_delivery_confirmation,
+                                       callback=lambda frame: self._publish_next_batch())
+
+    def _publish(self, messages: List[Message]) -> None:
+        for queue_to_send, body in messages:
+            self._channel.basic_publish(
+                exchange='', # Використовуємо дефолтний exchange (пряма відправка в чергу)
+                routing_key=queue_to_send, # Назва черги, в яку відправляємо
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2, # Зробити повідомлення стійким (persistent)
+                    headers=trace_headers(), # Trace ID і час публікації для вимірювання затримок consumer'ами
+                ),
+            )
+            self._delivery_tag += 1
+            self._pending[self._delivery_tag] = (queue_to_send, body)
+        self._stats["published"] += len(messages)
+
+    def _publish_next_batch(self) -> None:
+        messages = next(self._batches, None)
+        if messages is None:
+            logging.info("Усі пакети опубліковано та підтверджено брокером.")
+            self._closing = True
+            self._connection.close()
+            return
+        if not messages:
+            self._connection.ioloop.call_later(0, self._publish_next_batch)
+            return
+        self._attempt = 0
+        self._batch_started = time.perf_counter()
+        self._publish(messages)
+
+    def _on_delivery_confirmation(self, frame) -> None:
+        method = frame.method
+        if method.multiple:
+            confirmed = [tag for tag in self._pending if tag <= method.delivery_tag]
+        else:
+            confirmed = [method.delivery_tag]
+
+        is_ack = isinstance(method, pika.spec.Basic.Ack)
+        for tag in confirmed:
+            message = self._pending.pop(tag, None)
+            if message is None:
+                continue
+            if is_ack:
+                self._stats["confirmed"] += 1
+            else:
+                self._nacked.append(message)
+
+        if self._pending:
+            return # Чекаємо на решту підтверджень пакета
+
+        if self._nacked:
+            self._attempt += 1
+            nacked, self._nacked = self._nacked, []
+            if self._attempt > self.MAX_REPUBLISH_ATTEMPTS:
+                self._stats["lost"] += len(nacked)
+                logging.error(f"❌ {len(nacked)} повідомлень відхилено брокером після {self.MAX_REPUBLISH_ATTEMPTS} спроб.")
+            else:
+                logging.warning(f"Брокер відхилив {len(nacked)} повідомлень (nack), повторна публікація...")
+                self._publish(nacked)
+                return
+
+        self._stats["publish_seconds"] += time.perf_counter() - self._batch_started
+        logging.info(f"[x] Пакет підтверджено брокером: всього {self._stats['confirmed']} повідомлень")
+        self._publish_next_batch()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерує фейкові контакти та відправляє повідомлення у черги RabbitMQ.")
+    parser.add_argument("-n", "--count", type=int, default=DEFAULT_CONTACTS, help="Кількість контактів для генерації")
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Розмір пакета для insert_many та підтверджень видавця")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    connect_db()
+    Contact.ensure_indexes() # Унікальний індекс email потрібен до першого insert_many
+
+    stats: Dict[str, Any] = {"contacts": 0, "published": 0, "confirmed": 0, "lost": 0,
+                             "insert_seconds": 0.0, "publish_seconds": 0.0}
+
+    logging.info(f"\nГенеруємо {args.count} фейкових контактів пакетами по {args.batch_size}...")
+    started = time.perf_counter()
+    publisher = BatchConfirmPublisher(
+        rabbit_host,
+        [email_queue_name, sms_queue_name],
+        generate_batches(args.count, args.batch_size, stats),
+        stats,
+    )
+    try:
+        publisher.run()
+    except pika.exceptions.AMQPError as e:
+        logging.error(f"❌ Помилка з'єднання з RabbitMQ: {e}")
+        logging.error("Будь ласка, переконайтеся, що RabbitMQ сервер запущений (наприклад, через Docker).")
+        sys.exit(1) # Виходимо, якщо не можемо підключитися
+    elapsed = time.perf_counter() - started
+
+    logging.info(
+        f"\nЗавершено генерацію та відправку контактів за {elapsed:.2f} с: "
+        f"{stats['contacts']} контактів ({stats['contacts'] / elapsed:.0f}/с загалом, "
+        f"{stats['contacts'] / max(stats['insert_seconds'], 1e-9):.0f}/с вставка), "
+        f"{stats['confirmed']} підтверджених повідомлень ({stats['confirmed'] / elapsed:.0f}/с загалом, "
+        f"{stats['confirmed'] / max(stats['publish_seconds'], 1e-9):.0f}/с публікація), "
+        f"втрачено {stats['lost']}."
+    )
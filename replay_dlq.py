@@ -0,0 +1,78 @@
+import argparse
+import copy
+import datetime
+import logging # Імпортуємо модуль логування
+import sys
+from typing import Dict
+
+import pika
+
+from consumer_base import rabbit_host
+from consumer_email import EmailChannel
+from consumer_sms import SmsChannel
+from retry_topology import (FAILED_AT_HEADER, LAST_ERROR_HEADER, RETRY_COUNT_HEADER, dead_letter_queue_name,
+                            declare_retry_topology)
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CHANNELS: Dict[str, type] = {"email": EmailChannel, "sms": SmsChannel}
+
+
+def replay(channel: pika.adapters.blocking_connection.BlockingChannel, queue_name: str, limit: int = 0,
+           dry_run: bool = False) -> int:
+    """
+    Переносить повідомлення з DLQ назад в основну чергу з обнуленим лічильником спроб.
+    Кожне повідомлення видаляється з DLQ лише після підтвердження публікації брокером.
+    limit = 0 - усі повідомлення. Повертає кількість перенесених повідомлень.
+    """
+    dlq_name = dead_letter_queue_name(queue_name)
+    replayed = 0
+    while not limit or replayed < limit:
+        method, properties, body = channel.basic_get(queue=dlq_name, auto_ack=False)
+        if method is None:
+            break # DLQ порожня
+
+        headers = dict(properties.headers or {})
+        logging.info(f"   {body.decode('utf-8', 'replace')} - спроб {headers.get(RETRY_COUNT_HEADER, 0)}, "
+                     f"остання помилка: {headers.get(LAST_ERROR_HEADER, '-')}")
+        if dry_run:
+            # Не підтверджуємо: непідтверджені повідомлення повернуться в DLQ при закритті каналу
+            replayed += 1
+            continue
+
+        for header in (RETRY_COUNT_HEADER, LAST_ERROR_HEADER, FAILED_AT_HEADER, 'x-death'):
+            headers.pop(header, None)
+        headers['x-replayed-at'] = datetime.datetime.now().isoformat()
+        replay_properties = copy.copy(properties)
+        replay_properties.headers = headers
+        # confirm_delivery: basic_publish кидає виняток, якщо брокер не прийняв повідомлення
+        channel.basic_publish(exchange='', routing_key=queue_name, body=body, properties=replay_properties)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed += 1
+    return replayed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Повертає повідомлення з dead-letter черги в основну чергу.")
+    parser.add_argument("channel", choices=sorted(CHANNELS), help="Канал, DLQ якого потрібно обробити")
+    parser.add_argument("--limit", "-n", type=int, default=0, help="Максимум повідомлень (0 - усі)")
+    parser.add_argument("--dry-run", action="store_true", help="Лише показати повідомлення, не переносячи їх")
+    args = parser.parse_args()
+
+    queue_name = CHANNELS[args.channel]().queue_name
+    try:
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host))
+    except pika.exceptions.AMQPConnectionError as e:
+        logging.error(f"❌ Помилка підключення до RabbitMQ: {e}")
+        sys.exit(1)
+
+    amqp_channel = connection.channel()
+    amqp_channel.confirm_delivery()
+    amqp_channel.queue_declare(queue=queue_name, durable=True)
+    declare_retry_topology(amqp_channel, queue_name)
+
+    count = replay(amqp_channel, queue_name, args.limit, args.dry_run)
+    connection.close()
+    action = "Переглянуто" if args.dry_run else "Повернуто в чергу"
+    logging.info(f"{action} {count} повідомлень з '{dead_letter_queue_name(queue_name)}'.")
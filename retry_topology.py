@@ -0,0 +1,89 @@
+import copy
+import datetime
+import configparser # Імпортуємо модуль для роботи з конфігураційними файлами
+from typing import Any, Dict, List, Optional, Tuple # Імпортуємо типи для анотацій
+
+import pika
+
+# Читаємо конфігурацію з config.ini (секція [RETRY] необов'язкова)
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Ступені експоненційної затримки (секунди): кожен ступінь - окрема черга з власним TTL
+RETRY_DELAYS: List[int] = [int(delay) for delay in config.get('RETRY', 'delays', fallback='5,30,120,600').split(',')]
+# Загальна кількість спроб обробки, після якої повідомлення йде в DLQ
+MAX_ATTEMPTS: int = config.getint('RETRY', 'max_attempts', fallback=5)
+
+# Заголовки повідомлення, в яких переноситься стан повторних спроб
+RETRY_COUNT_HEADER: str = 'x-retry-count'
+LAST_ERROR_HEADER: str = 'x-last-error'
+FAILED_AT_HEADER: str = 'x-failed-at'
+
+# Схема для черги <q>:
+#   <q>.retry.<N>s - черга очікування з x-message-ttl = N с; прострочені повідомлення
+#                    через dead-letter-exchange '' (default) повертаються в <q>
+#   <q>.dlq        - фінальна черга "мертвих листів", звідки повідомлення повертає replay_dlq.py
+# TTL на рівні черги (а не окремого повідомлення) гарантує, що всі повідомлення в ній спливають по черзі,
+# тож "отруйне" повідомлення ніколи не крутиться в основній черзі й не блокує її.
+
+
+def retry_queue_name(queue: str, delay: int) -> str:
+    return f"{queue}.retry.{delay}s"
+
+
+def dead_letter_queue_name(queue: str) -> str:
+    return f"{queue}.dlq"
+
+
+def retry_topology(queue: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Повертає список (назва черги, аргументи) для черг повторних спроб і DLQ основної черги."""
+    queues = [
+        (retry_queue_name(queue, delay), {
+            'x-message-ttl': delay * 1000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': queue,
+        })
+        for delay in RETRY_DELAYS
+    ]
+    queues.append((dead_letter_queue_name(queue), {}))
+    return queues
+
+
+def declare_retry_topology(channel: pika.adapters.blocking_connection.BlockingChannel, queue: str) -> None:
+    """Оголошує черги повторних спроб і DLQ для основної черги (синхронний pika)."""
+    for name, arguments in retry_topology(queue):
+        channel.queue_declare(queue=name, durable=True, arguments=arguments or None)
+
+
+def failure_route(queue: str, headers: Optional[Dict[str, Any]], error: str,
+                  final: bool = False) -> Tuple[str, Dict[str, Any]]:
+    """
+    Визначає, куди перенаправити повідомлення після невдалої обробки.
+    Повертає (routing_key, нові заголовки): черга затримки наступного ступеня або DLQ,
+    якщо вичерпано MAX_ATTEMPTS спроб чи final=True (повідомлення некоректне і повтор не допоможе).
+    """
+    headers = dict(headers or {})
+    attempts = int(headers.get(RETRY_COUNT_HEADER, 0)) + 1
+    headers[RETRY_COUNT_HEADER] = attempts
+    headers[LAST_ERROR_HEADER] = error[:500]
+    headers[FAILED_AT_HEADER] = datetime.datetime.now().isoformat()
+
+    if final or attempts >= MAX_ATTEMPTS:
+        return dead_letter_queue_name(queue), headers
+    delay = RETRY_DELAYS[min(attempts - 1, len(RETRY_DELAYS) - 1)]
+    return retry_queue_name(queue, delay), headers
+
+
+def publish_failure(channel: pika.adapters.blocking_connection.BlockingChannel, queue: str,
+                    properties: pika.spec.BasicProperties, body: bytes, error: str, final: bool = False) -> str:
+    """
+    Публікує копію повідомлення в чергу повторної спроби або DLQ (синхронний pika).
+    Канал має бути в режимі confirm_delivery, тоді після повернення оригінал можна безпечно підтвердити.
+    Повертає назву черги призначення.
+    """
+    routing_key, headers = failure_route(queue, properties.headers, error, final)
+    retry_properties = copy.copy(properties)
+    retry_properties.headers = headers
+    retry_properties.delivery_mode = 2 # Повідомлення стійке (persistent)
+    channel.basic_publish(exchange='', routing_key=routing_key, body=body, properties=retry_properties)
+    return routing_key
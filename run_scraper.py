@@ -1,8 +1,14 @@
 import scrapy
 from scrapy.crawler import CrawlerProcess
+from scrapy.settings import Settings
 from scrapy.utils.project import get_project_settings
+import argparse
+import json
+import multiprocessing
 import os
+import time
 import logging
+from typing import Any, Callable, Dict, Optional
 
 # Налаштування логування для скрипта запуску
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,41 +17,204 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Шлях до павука: scraper/scraper/spiders/quotes.py
 from scraper.scraper.spiders.quotes import QuotesSpider, QuoteItem, AuthorItem
 
-def run_scrapy_spider():
+MONGO_ITEM_PIPELINES = {
+    "scraper.scraper.mongo_pipeline.MongoPipeline": 300,
+}
+
+def apply_crawl_profile(settings: Settings, name: str) -> None:
+    """Перекриває налаштування значеннями профілю CRAWL_PROFILES[name] з settings.py."""
+    profiles = settings.getdict('CRAWL_PROFILES')
+    if name not in profiles:
+        raise ValueError(f"Невідомий профіль обходу: {name!r} (доступні: {', '.join(profiles)})")
+    for key, value in profiles[name].items():
+        settings.set(key, value, priority='cmdline')
+    logging.info(f"Профіль обходу '{name}': {profiles[name]}")
+
+def project_settings() -> Settings:
+    """Налаштування проекту Scrapy (з scraper/scraper/settings.py)."""
+    os.environ['SCRAPY_SETTINGS_MODULE'] = 'scraper.scraper.settings'
+    return get_project_settings()
+
+def apply_distributed(settings: Settings) -> None:
+    """Спільний frontier у Redis: планувальник, dupefilter та підтвердження оброблених запитів."""
+    settings.set('SCHEDULER', 'scraper.scraper.redis_frontier.RedisScheduler', priority='cmdline')
+    spider_middlewares = settings.getdict('SPIDER_MIDDLEWARES')
+    spider_middlewares['scraper.scraper.redis_frontier.FrontierAckMiddleware'] = 10
+    settings.set('SPIDER_MIDDLEWARES', spider_middlewares, priority='cmdline')
+    settings.set('DISTRIBUTED_CRAWL', True, priority='cmdline')
+
+def output_path(path: str, suffix: str) -> str:
+    """
+    data/quotes.json -> data/quotes-20261018-101500-2.json: у розподіленому режимі кожен запуск і кожен
+    воркер пишуть власні файли, щоб продовження обходу не перезаписало результати попереднього запуску.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}-{suffix}{ext}"
+
+def merge_export(path: str, delta_path: str, key: Callable[[Dict[str, Any]], Any]) -> None:
+    """
+    Інкрементальний обхід у файли: дописує записи delta_path (нові або змінені) до попереднього експорту path.
+    Записи path з тим самим ключем, що й у delta_path, замінюються. Обидва файли читаються потоково,
+    у пам'яті лише ключі дельти; path перезаписується атомарно у своєму форматі (JSON-масив або JSON Lines).
+    """
+    from load_data import iter_json_records  # Потоковий читач JSON-масивів і JSON Lines
+
+    if not os.path.exists(delta_path):
+        return
+    if not os.path.exists(path):
+        os.replace(delta_path, path)
+        return
+
+    delta_keys = {key(record) for record in iter_json_records(delta_path)}
+    jsonl = path.endswith('.jsonl')
+    tmp_path = f"{path}.tmp"
+    written = 0
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        if not jsonl:
+            out.write("[")
+        for source in (path, delta_path):
+            for record in iter_json_records(source):
+                if source == path and key(record) in delta_keys:
+                    continue
+                if jsonl:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                else:
+                    out.write(("," if written else "") + "\n" + json.dumps(record, ensure_ascii=False))
+                written += 1
+        if not jsonl:
+            out.write("\n]" if written else "]")
+    os.replace(tmp_path, path)
+    os.remove(delta_path)
+    logging.info(f"Дельту {delta_path} ({len(delta_keys)} записів) об'єднано з {path}: усього {written} записів")
+
+def run_scrapy_spider(to_mongo: bool = False, incremental: bool = False, profile: Optional[str] = None,
+                      start_url: Optional[str] = None, distributed: bool = False,
+                      output_suffix: Optional[str] = None):
     """
     Запускає Scrapy павука для збору цитат та авторів.
     Дані будуть збережені у 'data/quotes.json' та 'data/authors.json'.
+    З to_mongo=True item'и пишуться одразу в MongoDB (MongoPipeline), без JSON-файлів і load_data.py.
+    З incremental=True віддаються лише нові або змінені цитати (стан між запусками - INCREMENTAL_STATE_PATH).
+    profile - назва профілю з CRAWL_PROFILES (затримки, паралельність, AutoThrottle);
+    start_url - стартова сторінка замість quotes.toscrape.com (наприклад, fixture_site.py).
+    З distributed=True черга запитів і відбитки спільні через Redis (redis_frontier.py): кілька процесів
+    ділять один обхід, а перерваний обхід продовжується. output_suffix - суфікс імен вихідних файлів.
+    Інкрементальний обхід у файли пише дельту в окремі файли (*-delta) і після завершення об'єднує її
+    з попереднім експортом, тож data/quotes.json та data/authors.json лишаються повними.
     """
     logging.info("=== Початок процесу скрапінгу ===") # Покращене логування
 
     # Отримуємо налаштування проекту Scrapy (з scraper/scraper/settings.py)
-    os.environ['SCRAPY_SETTINGS_MODULE'] = 'scraper.scraper.settings'
-    settings = get_project_settings()
+    settings = project_settings()
+    if profile:
+        apply_crawl_profile(settings, profile)
+    if to_mongo:
+        settings.set('ITEM_PIPELINES', MONGO_ITEM_PIPELINES)
+        settings.set('FEEDS', {})
+        logging.info("Режим прямого запису в MongoDB: JSON-файли не створюються")
+    if distributed:
+        apply_distributed(settings)
+    if output_suffix and not to_mongo:
+        settings.set('FEEDS', {output_path(path, output_suffix): options
+                               for path, options in settings.getdict('FEEDS').items()})
+        authors_file = 'authors.json' if settings.get('AUTHORS_OUTPUT_FORMAT', 'json') == 'json' else 'authors.jsonl'
+        settings.set('AUTHORS_FILE_PATH', output_path(os.path.join('data', authors_file), output_suffix))
+    merges = []  # (повний файл, файл дельти, ключ запису)
+    if incremental and not to_mongo and not output_suffix:
+        feeds = {}
+        for path, options in settings.getdict('FEEDS').items():
+            feeds[output_path(path, 'delta')] = options
+            merges.append((path, output_path(path, 'delta'), lambda quote: (quote.get('author'), quote.get('quote'))))
+        settings.set('FEEDS', feeds)
+        authors_file = 'authors.json' if settings.get('AUTHORS_OUTPUT_FORMAT', 'json') == 'json' else 'authors.jsonl'
+        authors_path = os.path.join('data', authors_file)
+        settings.set('AUTHORS_FILE_PATH', output_path(authors_path, 'delta'))
+        merges.append((authors_path, output_path(authors_path, 'delta'), lambda author: author.get('fullname')))
 
     # Ініціалізуємо CrawlerProcess з налаштуваннями
     process = CrawlerProcess(settings)
 
     # Додаємо наш павук до процесу
-    process.crawl(QuotesSpider)
+    process.crawl(QuotesSpider, incremental=incremental, start_url=start_url)
 
     # Запускаємо процес скрапінгу
     process.start() # Блокує виконання, доки скрапінг не завершиться
+    for path, delta_path, key in merges:
+        merge_export(path, delta_path, key)
     logging.info("=== Завершення процесу скрапінгу ===") # Покращене логування
 
+def run_workers(count: int, run_id: str, **options) -> None:
+    """
+    Запускає count процесів павука зі спільним frontier у Redis і чекає на їхнє завершення.
+    Ctrl-C зупиняє воркерів коректно: незавершені запити лишаються в черзі до наступного запуску.
+    """
+    # spawn: кожен воркер отримує власний реактор Twisted, а не копію батьківського процесу
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=run_scrapy_spider, name=f"crawler-{i}",
+                               kwargs={**options, 'distributed': True, 'output_suffix': f"{run_id}-{i}"})
+               for i in range(count)]
+    for process in workers:
+        process.start()
+    logging.info(f"Запущено {count} воркерів зі спільним frontier у Redis")
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        # SIGINT отримала вся група процесів - чекаємо, поки воркери збережуть стан і завершаться
+        logging.info("Зупинка воркерів... Черга лишається в Redis, обхід можна продовжити.")
+        for process in workers:
+            process.join()
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Збір цитат та авторів з quotes.toscrape.com")
+    parser.add_argument("--mongo", action="store_true",
+                        help="писати одразу в MongoDB замість data/quotes.json та data/authors.json")
+    parser.add_argument("--incremental", action="store_true",
+                        help="інкрементальний обхід: умовні запити, лише нові або змінені цитати")
+    parser.add_argument("--profile", help="профіль обходу з CRAWL_PROFILES (polite, adaptive, fast)")
+    parser.add_argument("--start-url", help="стартова сторінка, наприклад http://localhost:8030/ (fixture_site.py)")
+    parser.add_argument("--distributed", action="store_true",
+                        help="спільна черга запитів у Redis: запускайте на кількох машинах або продовжуйте обхід")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="кількість локальних процесів павука зі спільною чергою (вмикає --distributed)")
+    parser.add_argument("--reset-frontier", action="store_true",
+                        help="очистити спільну чергу та відбитки в Redis перед запуском (новий обхід з нуля)")
+    args = parser.parse_args()
+    if args.incremental and (args.distributed or args.workers > 1):
+        # Стан інкрементального обходу - локальний файл одного процесу
+        parser.error("--incremental не поєднується з --distributed / --workers")
+    options = dict(to_mongo=args.mongo, incremental=args.incremental, profile=args.profile, start_url=args.start_url)
+
+    if args.reset_frontier:
+        from scraper.scraper.redis_frontier import reset_frontier
+        reset_frontier(project_settings(), QuotesSpider.name)
+
+    run_id = time.strftime('%Y%m%d-%H%M%S')
+    if args.workers > 1:
+        run_workers(args.workers, run_id, **options)
+        raise SystemExit(0)
+
+    if args.distributed:
+        run_scrapy_spider(distributed=True, output_suffix=f"{run_id}-0", **options)
+        raise SystemExit(0)
+
+    if args.mongo:
+        run_scrapy_spider(**options)
+        raise SystemExit(0)
+
     # Перевіримо, чи існує папка 'data', якщо ні - створюємо її
     os.makedirs('data', exist_ok=True) # Покращення: створення папки data
 
     # Перед запуском скрапінгу, перевіримо, чи існують файли data/quotes.json та data/authors.json
     # і видалимо їх, щоб переконатися, що ми починаємо з чистого аркуша.
+    # Інкрементальний обхід їх не видаляє: дельта дописується до попереднього експорту
     quotes_path = os.path.join('data', 'quotes.json')
     authors_path = os.path.join('data', 'authors.json')
+    authors_jsonl_path = os.path.join('data', 'authors.jsonl') # AUTHORS_OUTPUT_FORMAT = "jsonl"
 
-    if os.path.exists(quotes_path):
-        os.remove(quotes_path)
-        logging.info(f"Видалено існуючий файл: {quotes_path}")
-    if os.path.exists(authors_path):
-        os.remove(authors_path)
-        logging.info(f"Видалено існуючий файл: {authors_path}")
+    for path in (quotes_path, authors_path, authors_jsonl_path):
+        if os.path.exists(path) and not args.incremental:
+            os.remove(path)
+            logging.info(f"Видалено існуючий файл: {path}")
 
-    run_scrapy_spider()
+    run_scrapy_spider(**options)
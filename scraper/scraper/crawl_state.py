@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from scraper.scraper.dedupe import fingerprint
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Стан інкрементального обходу, що зберігається між запусками (data/crawl_state.json):
+# - authors: URL сторінок авторів, які вже були зібрані;
+# - pages: для кожної сторінки зі списком цитат - ETag, Last-Modified, хеш вмісту
+#   та посилання на наступну сторінку (щоб продовжити пагінацію після відповіді 304 без тіла);
+# - quotes: відбитки (автор + текст) уже відданих цитат.
+STATE_VERSION: int = 1
+
+
+def body_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def quote_fingerprint(author: str, quote: str) -> str:
+    return fingerprint(f"{author}\n{quote}").hex()
+
+
+class CrawlState:
+    """Стан інкрементального обходу. Зміни накопичуються в пам'яті, save() записує файл атомарно."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.authors = set()
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.quotes = set()
+        self.new_quotes = 0
+        self.unchanged_pages = 0
+
+    @classmethod
+    def load(cls, path: str) -> 'CrawlState':
+        state = cls(path)
+        if not os.path.exists(path):
+            logging.info(f"Стан обходу {path} не знайдено - перший запуск буде повним.")
+            return state
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"❌ Не вдалося прочитати стан обходу {path}: {e}. Обхід буде повним.")
+            return state
+        if data.get('version') != STATE_VERSION:
+            logging.warning(f"Попередження: Стан обходу {path} має іншу версію, ігноруємо його.")
+            return state
+        state.authors = set(data.get('authors', []))
+        state.pages = data.get('pages', {})
+        state.quotes = set(data.get('quotes', []))
+        logging.info(f"Стан обходу завантажено: {len(state.pages)} сторінок, {len(state.authors)} авторів, "
+                     f"{len(state.quotes)} цитат")
+        return state
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': STATE_VERSION, 'authors': sorted(self.authors), 'pages': self.pages,
+                       'quotes': sorted(self.quotes)}, f)
+        os.replace(tmp_path, self.path)
+        logging.info(f"✅ Стан обходу збережено у {self.path}: нових цитат {self.new_quotes}, "
+                     f"незмінених сторінок {self.unchanged_pages}")
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since з валідаторів попередньої відповіді (якщо сервер їх надсилав)."""
+        page = self.pages.get(url, {})
+        headers = {}
+        if page.get('etag'):
+            headers['If-None-Match'] = page['etag']
+        if page.get('last_modified'):
+            headers['If-Modified-Since'] = page['last_modified']
+        return headers
+
+    def page_changed(self, url: str, etag: Optional[str], last_modified: Optional[str], digest: str,
+                     next_link: Optional[str]) -> bool:
+        """Запам'ятовує валідатори сторінки; True, якщо вміст відрізняється від попереднього запуску."""
+        previous = self.pages.get(url, {})
+        self.pages[url] = {'etag': etag, 'last_modified': last_modified, 'hash': digest, 'next': next_link}
+        return previous.get('hash') != digest
+
+    def next_link(self, url: str) -> Optional[str]:
+        return self.pages.get(url, {}).get('next')
+
+    def add_quote(self, author: str, quote: str) -> bool:
+        """True, якщо цитата нова (або її текст змінився) з часу попередніх запусків."""
+        key = quote_fingerprint(author, quote)
+        if key in self.quotes:
+            return False
+        self.quotes.add(key)
+        self.new_quotes += 1
+        return True
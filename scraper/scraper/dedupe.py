@@ -0,0 +1,84 @@
+import hashlib
+import math
+
+# Компактні множини "вже бачили" для дедуплікації item'ів під час довгого обходу.
+# Обидві реалізації мають однаковий інтерфейс: add(key) -> True, якщо ключ новий.
+
+DIGEST_SIZE: int = 8  # 64-бітний відбиток: імовірність колізії ~n^2 / 2^65, для мільйонів імен - нехтовно мала
+
+
+def fingerprint(key: str) -> bytes:
+    """Короткий відбиток рядка (blake2b) - зберігається замість самого рядка."""
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class HashedSeen:
+    """
+    Множина 8-байтних відбитків замість повних рядків: пам'ять не залежить від довжини ключів.
+    Точна (без хибних спрацьовувань) за винятком колізій blake2b.
+    """
+
+    def __init__(self) -> None:
+        self._seen = set()
+
+    def add(self, key: str) -> bool:
+        digest = fingerprint(key)
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        return fingerprint(key) in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class BloomFilter:
+    """
+    Фільтр Блума фіксованого розміру для дуже великих обходів: ~1.2 байта на ключ при error_rate=0.001.
+    Хибнопозитивні спрацьовування можливі (частка error_rate нових ключів вважатиметься дублікатами),
+    хибнонегативні - ні. Розмір розраховано на capacity ключів; при перевищенні частка помилок росте.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Оптимальні параметри: m = -n*ln(p) / ln(2)^2 біт, k = m/n * ln(2) хеш-функцій
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, key: str):
+        # Подвійне хешування (Kirsch-Mitzenmacher): k позицій з двох 64-бітних хешів одного blake2b
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> bool:
+        new = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                new = True
+        if new:
+            self._count += 1
+        return new
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(key))
+
+    def __len__(self) -> int:
+        return self._count  # Оцінка: ключі, помилково визнані дублікатами, не враховуються
+
+
+def make_seen_set(kind: str = 'hash', capacity: int = 1_000_000, error_rate: float = 0.001):
+    """'hash' - точна множина відбитків (за замовчуванням), 'bloom' - фільтр Блума фіксованого розміру."""
+    if kind == 'bloom':
+        return BloomFilter(capacity, error_rate)
+    if kind == 'hash':
+        return HashedSeen()
+    raise ValueError(f"Невідомий тип дедуплікації: {kind!r} (очікується 'hash' або 'bloom')")
@@ -3,6 +3,9 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
+from typing import Optional
+
 from scrapy import signals
 
 # useful for handling different item types with a single interface
@@ -98,3 +101,62 @@ class ScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class BackoffMiddleware:
+    """
+    Відступ на 429 / 5xx: збільшує затримку слота домену в BACKOFF_FACTOR разів
+    (не менше BACKOFF_START_DELAY і не більше BACKOFF_MAX_DELAY), враховуючи Retry-After.
+    Повтор самого запиту лишається за RetryMiddleware - цей middleware стоїть перед ним (560 > 550)
+    і лише сповільнює домен. З AutoThrottle затримка далі знижується за латентністю успішних відповідей
+    (AutoThrottle не зменшує її на помилках); без AutoThrottle - ділиться на BACKOFF_FACTOR
+    з кожною успішною відповіддю до DOWNLOAD_DELAY.
+    """
+
+    def __init__(self, crawler, codes, factor: float, start_delay: float, max_delay: float) -> None:
+        self.crawler = crawler
+        self.codes = {int(code) for code in codes}
+        self.factor = factor
+        self.start_delay = start_delay
+        self.max_delay = max_delay
+        self.base_delay = crawler.settings.getfloat('DOWNLOAD_DELAY')
+        self.autothrottle = crawler.settings.getbool('AUTOTHROTTLE_ENABLED')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler,
+            codes=settings.getlist('BACKOFF_HTTP_CODES', [429, 500, 502, 503, 504]),
+            factor=settings.getfloat('BACKOFF_FACTOR', 2.0),
+            start_delay=settings.getfloat('BACKOFF_START_DELAY', 1.0),
+            max_delay=settings.getfloat('BACKOFF_MAX_DELAY', 30.0),
+        )
+
+    def _slot(self, request):
+        return self.crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+
+    def process_response(self, request, response, spider):
+        slot = self._slot(request)
+        if slot is None:
+            return response
+        if response.status in self.codes:
+            delay = min(self.max_delay, max(self.start_delay, slot.delay * self.factor,
+                                            self._retry_after(response) or 0.0))
+            if delay > slot.delay:
+                logging.warning(f"Відповідь {response.status} від {request.url}: "
+                                f"затримка слота {slot.delay:.2f} -> {delay:.2f} с")
+                slot.delay = delay
+            self.crawler.stats.inc_value(f'backoff/{response.status}')
+        elif not self.autothrottle and slot.delay > self.base_delay:
+            slot.delay = max(self.base_delay, slot.delay / self.factor)
+        return response
+
+    @staticmethod
+    def _retry_after(response) -> Optional[float]:
+        # Підтримуємо лише форму в секундах (HTTP-дата трапляється рідко)
+        value = response.headers.get('Retry-After')
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
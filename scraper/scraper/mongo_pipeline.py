@@ -0,0 +1,171 @@
+import logging
+import time
+from typing import Any, Dict, List
+
+from itemadapter import ItemAdapter
+from pymongo import UpdateOne
+from scrapy import Spider
+from scrapy.item import Item
+from twisted.internet import reactor, task
+
+from cache import QUOTES_CACHE_NAMESPACE, bump_generation  # Інвалідація кешу результатів пошуку
+from connect import connect_db  # Імпортуємо функцію для підключення до БД
+from load_data import apply_bulk, apply_inserts, author_upsert, build_author_map, log_summary, new_stats, quote_document
+from models import Author, Quote  # Імпортуємо моделі
+from scraper.scraper.spiders.quotes import AuthorItem, QuoteItem
+from tag_index import index_quotes  # Інкрементальне оновлення індексу тегів у Redis
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class MongoPipeline:
+    """
+    Альтернатива ScraperPipeline + FEEDS + load_data.py: пише AuthorItem'и та QuoteItem'и
+    одразу в колекції authors / quotes, без проміжних JSON-файлів.
+
+    - Автори накопичуються як upsert'и за fullname, цитати - як вставки, дублікати яких
+      відсікає унікальний індекс (content_hash, author). Буфер скидається одним bulk_write /
+      insert_many, щойно набирається MONGO_PIPELINE_BATCH_SIZE елементів або минає
+      MONGO_PIPELINE_FLUSH_INTERVAL секунд.
+    - Павук віддає цитату раніше, ніж сторінку її автора, тож цитата з ще невідомим автором
+      чекає у "відкладених" і прив'язується під час першого скидання після запису автора.
+    - Після кожного скидання нові цитати потрапляють в індекс тегів, а кеш пошуку інвалідується,
+      тож зібрані дані доступні CLI майже одразу.
+    - У розподіленому обході (DISTRIBUTED_CRAWL) сторінку автора може зібрати інший воркер, тож
+      імена відкладених авторів щоразу шукаються в MongoDB, а перед завершенням воркер чекає
+      MONGO_PIPELINE_ORPHAN_WAIT секунд і перевіряє ще раз, перш ніж вважати цитати осиротілими.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2.0, shared_authors: bool = False,
+                 orphan_wait: float = 10.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.shared_authors = shared_authors  # Авторів пишуть і інші воркери
+        self.orphan_wait = orphan_wait
+        self.author_operations: List[UpdateOne] = []  # Upsert'и авторів, що чекають на скидання
+        self.author_names: List[str] = []  # fullname для кожної операції в author_operations
+        self.quotes: List[Dict[str, Any]] = []  # Готові документи цитат з відомим автором
+        self.pending_quotes: Dict[str, List[Dict[str, Any]]] = {}  # fullname -> цитати, що чекають на автора
+        self.author_ids: Dict[str, Any] = {}  # fullname -> ObjectId
+        self.author_stats = new_stats()
+        self.quote_stats = new_stats(updates=False)
+        self._flush_loop = None
+        self._started = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            batch_size=settings.getint('MONGO_PIPELINE_BATCH_SIZE', 500),
+            flush_interval=settings.getfloat('MONGO_PIPELINE_FLUSH_INTERVAL', 2.0),
+            shared_authors=settings.getbool('DISTRIBUTED_CRAWL'),
+            orphan_wait=settings.getfloat('MONGO_PIPELINE_ORPHAN_WAIT', 10.0),
+        )
+
+    def open_spider(self, spider: Spider) -> None:
+        connect_db()
+        Author.ensure_indexes()
+        Quote.ensure_indexes()
+        # Один запит на всіх уже відомих авторів замість пошуку автора для кожної цитати
+        self.author_ids = build_author_map()
+        self._started = time.perf_counter()
+        # Скидання за часом, навіть якщо нові item'и не надходять (LoopingCall працює в реакторі Twisted)
+        self._flush_loop = task.LoopingCall(self._flush_on_timer)
+        self._flush_loop.start(self.flush_interval, now=False)
+        logging.info(f"MongoPipeline ініціалізовано: відомо {len(self.author_ids)} авторів, "
+                     f"пакет {self.batch_size}, інтервал {self.flush_interval} с")
+
+    def process_item(self, item: Item, spider: Spider) -> Item:
+        adapter = ItemAdapter(item)
+        if isinstance(item, AuthorItem):
+            self.author_stats["records"] += 1
+            operation = author_upsert(adapter.asdict())
+            if operation is None:
+                logging.warning("AuthorItem не має 'fullname', пропускаємо.")
+                self.author_stats["skipped"] += 1
+            else:
+                self.author_operations.append(operation)
+                self.author_names.append(adapter["fullname"])
+        elif isinstance(item, QuoteItem):
+            self.quote_stats["records"] += 1
+            quote_info = adapter.asdict()
+            if not quote_info.get("quote") or not quote_info.get("author"):
+                logging.warning(f"QuoteItem без тексту або автора пропущено: {quote_info}")
+                self.quote_stats["skipped"] += 1
+            elif quote_info["author"] in self.author_ids:
+                self.quotes.append(quote_document(quote_info, self.author_ids[quote_info["author"]]))
+            else:
+                self.pending_quotes.setdefault(quote_info["author"], []).append(quote_info)
+
+        if len(self.author_operations) + len(self.quotes) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self) -> None:
+        """Записує накопичених авторів, прив'язує відкладені цитати та вставляє цитати."""
+        flushed_authors = len(self.author_operations)
+        if self.author_operations:
+            operations, self.author_operations = self.author_operations, []
+            fullnames, self.author_names = self.author_names, []
+            apply_bulk(Author._get_collection(), operations, self.author_stats)
+            self._refresh_author_ids(fullnames)
+        if self.shared_authors and self.pending_quotes:
+            # Автора могла записати сторінка, зібрана іншим воркером
+            self._refresh_author_ids([name for name in self.pending_quotes if name not in self.author_ids])
+
+        # Відкладене зв'язування: цитати, автор яких щойно з'явився в БД
+        for fullname in [name for name in self.pending_quotes if name in self.author_ids]:
+            for quote_info in self.pending_quotes.pop(fullname):
+                self.quotes.append(quote_document(quote_info, self.author_ids[fullname]))
+
+        inserted: List[Dict[str, Any]] = []
+        if self.quotes:
+            documents, self.quotes = self.quotes, []
+            inserted = apply_inserts(Quote._get_collection(), documents, self.quote_stats)
+            names_by_id = {author_id: name for name, author_id in self.author_ids.items()}
+            index_quotes({"id": doc["_id"], "quote": doc["quote"], "author": names_by_id.get(doc["author"]),
+                          "tags": doc["tags"]} for doc in inserted)
+
+        if flushed_authors or inserted:
+            bump_generation(QUOTES_CACHE_NAMESPACE)  # Результати пошуку в кеші більше не актуальні
+            logging.info(f"MongoPipeline: записано {flushed_authors} авторів, {len(inserted)} нових цитат, "
+                         f"очікують автора {sum(len(q) for q in self.pending_quotes.values())} цитат")
+
+    def _flush_on_timer(self) -> None:
+        # Виняток зупинив би LoopingCall назавжди. Пакет, на якому стався збій, втрачено -
+        # його можна дозібрати повторним запуском (записи ідемпотентні)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"❌ Помилка періодичного скидання в MongoDB: {e}")
+
+    def _refresh_author_ids(self, fullnames: List[str]) -> None:
+        """Оновлює карту fullname -> ObjectId для щойно записаних авторів одним запитом."""
+        for author in Author._get_collection().find({"fullname": {"$in": fullnames}}, {"fullname": 1}):
+            self.author_ids[author["fullname"]] = author["_id"]
+
+    def close_spider(self, spider: Spider):
+        if self._flush_loop is not None and self._flush_loop.running:
+            self._flush_loop.stop()
+        self.flush()
+        if self.shared_authors and self.pending_quotes and self.orphan_wait > 0:
+            # Інший воркер ще може записувати автора: ще одна перевірка після паузи (не блокуючи реактор)
+            logging.info(f"MongoPipeline: {len(self.pending_quotes)} авторів ще не знайдено, "
+                         f"повторна перевірка через {self.orphan_wait} с")
+            return task.deferLater(reactor, self.orphan_wait, self._finish)
+        self._finish()
+
+    def _finish(self) -> None:
+        if self.pending_quotes:
+            self.flush()
+
+        orphaned = sum(len(quotes) for quotes in self.pending_quotes.values())
+        if orphaned:
+            # Сторінку автора так і не вдалося зібрати - цитати без автора не зберігаються
+            logging.error(f"Помилка: {orphaned} цитат не збережено, автори не знайдені: "
+                          f"{', '.join(sorted(self.pending_quotes)[:10])}")
+            self.quote_stats["skipped"] += orphaned
+
+        elapsed = time.perf_counter() - self._started
+        log_summary("Автори", self.author_stats, elapsed)
+        log_summary("Цитати", self.quote_stats, elapsed)
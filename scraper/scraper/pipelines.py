@@ -5,8 +5,9 @@
 
 import json
 import os
+import time
 import logging
-from typing import Any
+from typing import Any, Dict, Optional, TextIO
 
 from scrapy import Spider
 from scrapy.item import Item
@@ -14,6 +15,7 @@ from itemadapter import ItemAdapter
 
 # Імпортуємо наші Item'и, які ми визначили у spiders/quotes.py
 from scraper.scraper.spiders.quotes import AuthorItem, QuoteItem
+from scraper.scraper.dedupe import make_seen_set
 
 # Налаштування логування для Pipeline
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,29 +26,69 @@ class ScraperPipeline:
     Scrapy Pipeline для обробки зібраних даних.
     Зберігає унікальних авторів у 'data/authors.json' та пропускає цитати
     для автоматичного збереження через налаштування FEEDS.
+
+    AUTHORS_OUTPUT_FORMAT = 'jsonl' вмикає потоковий режим: кожен новий автор одразу дописується
+    рядком у 'data/authors.jsonl' (fsync кожні AUTHORS_FSYNC_EVERY авторів або AUTHORS_FSYNC_INTERVAL с),
+    тож пам'ять не росте з обходом, а падіння не губить уже зібране.
+    Конвертація в формат authors.json: python convert_authors.py.
     """
 
-    def __init__(self):
+    def __init__(self, output_format: str = 'json', dedupe: str = 'hash', bloom_capacity: int = 1_000_000,
+                 bloom_error_rate: float = 0.001, fsync_every: int = 100, fsync_interval: float = 5.0,
+                 authors_file_path: Optional[str] = None):
         """
         Ініціалізує Pipeline.
-        Створює порожній список для авторів та set для відстеження вже збережених авторів
-        (за їхнім повним ім'ям), щоб уникнути дублікатів.
+        Створює порожній список для авторів (лише для формату json) та компактну множину
+        відбитків уже збережених авторів (за їхнім повним ім'ям), щоб уникнути дублікатів.
         """
-        self.authors_data = []  # Список для зберігання даних унікальних авторів
-        self.seen_authors = set()  # Set для відстеження унікальних авторів за fullname
-        self.authors_file_path = os.path.join('data', 'authors.json')  # Шлях до файлу authors.json
+        if output_format not in ('json', 'jsonl'):
+            raise ValueError(f"Невідомий AUTHORS_OUTPUT_FORMAT: {output_format!r} (очікується 'json' або 'jsonl')")
+        self.output_format = output_format
+        self.authors_data = []  # Список для зберігання даних унікальних авторів (формат json)
+        # Відбитки fullname (або фільтр Блума) замість set рядків
+        self.seen_authors = make_seen_set(dedupe, bloom_capacity, bloom_error_rate)
+        # AUTHORS_FILE_PATH задає окремий файл, наприклад для кожного воркера розподіленого обходу
+        self.authors_file_path = authors_file_path or os.path.join(
+            'data', 'authors.json' if output_format == 'json' else 'authors.jsonl')
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file: Optional[TextIO] = None
+        self._unsynced = 0  # Авторів, дописаних після останнього fsync
+        self._last_sync = time.monotonic()
 
         # Перевіряємо, чи існує папка 'data', якщо ні — створюємо її
-        os.makedirs('data', exist_ok=True)
+        os.makedirs(os.path.dirname(self.authors_file_path) or '.', exist_ok=True)
         logging.info(f"Pipeline ініціалізовано. Файл авторів: {self.authors_file_path}")
 
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            output_format=settings.get('AUTHORS_OUTPUT_FORMAT', 'json'),
+            dedupe=settings.get('AUTHORS_DEDUPE', 'hash'),
+            bloom_capacity=settings.getint('AUTHORS_BLOOM_CAPACITY', 1_000_000),
+            bloom_error_rate=settings.getfloat('AUTHORS_BLOOM_ERROR_RATE', 0.001),
+            fsync_every=settings.getint('AUTHORS_FSYNC_EVERY', 100),
+            fsync_interval=settings.getfloat('AUTHORS_FSYNC_INTERVAL', 5.0),
+            authors_file_path=settings.get('AUTHORS_FILE_PATH'),
+        )
+
+    def open_spider(self, spider: Spider) -> None:
+        if self.output_format == 'jsonl':
+            # Перезаписуємо файл, як і FEEDS з overwrite=True; буферизація по рядках
+            self._file = open(self.authors_file_path, 'w', encoding='utf-8', buffering=1)
+
     def process_item(self, item: Item, spider: Spider) -> Item:
         """
         Обробляє кожен зібраний Item.
-        Якщо Item є AuthorItem і автор ще не був збережений, додає його до списку.
+        Якщо Item є AuthorItem і автор ще не був збережений, додає його до списку (або дописує у файл).
         QuoteItem'и просто пропускаються, оскільки вони будуть збережені через FEEDS.
         """
         adapter = ItemAdapter(item)
+        if self._file is not None:
+            # Інтервал перевіряється на кожному item'і: інакше довга серія цитат без нових авторів
+            # лишала б уже дописаних авторів не скинутими на диск
+            self._maybe_sync()
 
         if isinstance(item, AuthorItem):
             fullname = adapter.get('fullname')
@@ -54,7 +96,7 @@ class ScraperPipeline:
                 logging.warning("AuthorItem не має 'fullname', пропускаємо.")
                 return item
 
-            if fullname not in self.seen_authors:
+            if self.seen_authors.add(fullname):
                 # Зберігаємо тільки потрібні поля автора
                 author_dict = {
                     "fullname": adapter.get("fullname"),
@@ -62,8 +104,10 @@ class ScraperPipeline:
                     "born_location": adapter.get("born_location"),
                     "description": adapter.get("description"),
                 }
-                self.authors_data.append(author_dict)
-                self.seen_authors.add(fullname)
+                if self._file is not None:
+                    self._append_author(author_dict)
+                else:
+                    self.authors_data.append(author_dict)
                 logging.info(f"Додано унікального автора: {fullname}")
             else:
                 logging.debug(f"Автор '{fullname}' вже був оброблений, пропускаємо.")
@@ -76,11 +120,37 @@ class ScraperPipeline:
 
         return item  # Повертаємо item для інших Pipeline, якщо вони є
 
+    def _append_author(self, author_dict: Dict[str, Any]) -> None:
+        """Дописує автора одним рядком JSON Lines; періодично скидає файл на диск (fsync)."""
+        self._file.write(json.dumps(author_dict, ensure_ascii=False) + '\n')
+        self._unsynced += 1
+        self._maybe_sync()
+
+    def _maybe_sync(self) -> None:
+        """fsync, якщо набралося fsync_every авторів або минуло fsync_interval секунд з останнього скидання."""
+        if self._unsynced and (self._unsynced >= self.fsync_every
+                               or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
     def close_spider(self, spider: Spider) -> None:
         """
         Викликається, коли павук завершує роботу.
-        Зберігає зібрані дані унікальних авторів у файл 'authors.json'.
+        Зберігає зібрані дані унікальних авторів у файл 'authors.json' (або закриває 'authors.jsonl').
         """
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+            logging.info(f"Павук '{spider.name}' завершив роботу. "
+                         f"Збережено {len(self.seen_authors)} авторів у {self.authors_file_path}")
+            return
+
         logging.info(f"Павук '{spider.name}' завершив роботу. Зберігаємо дані авторів у {self.authors_file_path}")
         try:
             with open(self.authors_file_path, 'w', encoding='utf-8') as f:
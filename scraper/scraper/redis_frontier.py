@@ -0,0 +1,273 @@
+import logging
+import pickle
+import time
+from typing import Dict, Optional
+
+import redis
+from scrapy import Request, Spider, signals
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.request import request_from_dict
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Спільна черга запитів (frontier) і множина вже бачених запитів у Redis: кілька процесів або машин
+# з RedisScheduler обходять один сайт, не дублюючи сторінок, а зупинений обхід продовжується з того самого місця.
+#
+# Ключі (prefix = REDIS_FRONTIER_PREFIX:<ім'я павука>):
+# - <prefix>:queue    - sorted set: score = -priority, member = 20-значний порядковий номер + pickle запиту
+#                       (у межах пріоритету - FIFO за номером);
+# - <prefix>:seq      - лічильник порядкових номерів;
+# - <prefix>:seen     - set відбитків запитів (dupefilter);
+# - <prefix>:inflight - hash member -> "час видачі:score": запити, видані воркерам, але ще не оброблені.
+#   Запис знімає FrontierAckMiddleware, коли всі запити з callback'а вже додані в чергу. Непідтверджені запити
+#   воркер повертає в чергу під час зупинки, а після аварійного завершення записи, старші за
+#   REDIS_FRONTIER_INFLIGHT_TIMEOUT, повертає в чергу наступний запуск.
+# - <prefix>:attempts - hash відбиток запиту -> скільки разів запит лишився непідтвердженим (не завантажився
+#                       або воркер впав). Після REDIS_FRONTIER_MAX_ATTEMPTS таких спроб запит не повертається
+#                       в чергу, а паркується в <prefix>:failed (відбиток -> member) - для огляду чи ручного повтору.
+# Запити серіалізуються pickle, тож Redis має бути доступний лише довіреним процесам.
+
+ACK_META_KEY: str = 'frontier_member'
+request_acked = object()  # Сигнал FrontierAckMiddleware -> RedisScheduler: запит (member) знято з inflight
+
+# Атомарно забирає запит з найвищим пріоритетом і записує його у inflight - без вікна, в якому
+# аварійне завершення воркера загубило б запит
+POP_SCRIPT = """
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if #popped == 0 then return nil end
+redis.call('HSET', KEYS[2], popped[1], ARGV[1] .. ':' .. popped[2])
+return popped
+"""
+
+
+def frontier_keys(settings, spider_name: str) -> Dict[str, str]:
+    prefix = f"{settings.get('REDIS_FRONTIER_PREFIX', 'frontier')}:{spider_name}"
+    return {name: f"{prefix}:{name}" for name in ('queue', 'seq', 'seen', 'inflight', 'attempts', 'failed')}
+
+
+def frontier_server(settings) -> redis.Redis:
+    return redis.Redis.from_url(settings.get('REDIS_FRONTIER_URL', 'redis://localhost:6379/0'))
+
+
+def reset_frontier(settings, spider_name: str) -> None:
+    """Видаляє чергу, відбитки, inflight і лічильники спроб - наступний запуск почне обхід з нуля."""
+    keys = frontier_keys(settings, spider_name)
+    frontier_server(settings).delete(*keys.values())
+    logging.info(f"Frontier '{keys['queue'].rsplit(':', 1)[0]}' очищено.")
+
+
+class RedisDupeFilter(BaseDupeFilter):
+    """Dupefilter на спільному Redis set: SADD атомарний, тож запит бачить лише один з воркерів."""
+
+    def __init__(self, server: redis.Redis, key: str, fingerprinter, stats=None, debug: bool = False) -> None:
+        self.server = server
+        self.key = key
+        self.fingerprinter = fingerprinter
+        self.stats = stats
+        self.debug = debug
+
+    def request_seen(self, request: Request) -> bool:
+        return self.server.sadd(self.key, self.fingerprinter.fingerprint(request).hex()) == 0
+
+    def log(self, request: Request, spider: Spider) -> None:
+        if self.debug:
+            logging.debug(f"Відфільтровано дублікат запиту: {request}")
+        if self.stats is not None:
+            self.stats.inc_value('dupefilter/filtered')
+
+    def clear(self) -> None:
+        self.server.delete(self.key)
+
+
+class RedisScheduler(BaseScheduler):
+    """
+    Планувальник Scrapy зі спільною чергою в Redis.
+    SCHEDULER_PERSIST = True (за замовчуванням) лишає чергу та відбитки після зупинки - повторний запуск
+    продовжує обхід; False - очищає їх після успішного завершення (лише для одного процесу).
+    Воркер не завершується, поки черга порожня, але інші воркери ще обробляють запити (вони можуть
+    додати нові), щонайдовше REDIS_FRONTIER_IDLE_TIMEOUT секунд.
+    """
+
+    def __init__(self, crawler, server: redis.Redis, persist: bool, idle_timeout: float,
+                 inflight_timeout: float, max_attempts: int = 3) -> None:
+        self.crawler = crawler
+        self.server = server
+        self.persist = persist
+        self.idle_timeout = idle_timeout
+        self.inflight_timeout = inflight_timeout
+        self.max_attempts = max_attempts
+        self.stats = crawler.stats
+        self.spider: Optional[Spider] = None
+        self.keys: Dict[str, str] = {}
+        self.df: Optional[RedisDupeFilter] = None
+        self._pop = server.register_script(POP_SCRIPT)
+        self._idle_since: Optional[float] = None
+        self._popped: Dict[bytes, float] = {}  # member -> score запитів, виданих цим воркером
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        scheduler = cls(
+            crawler,
+            server=frontier_server(settings),
+            persist=settings.getbool('SCHEDULER_PERSIST', True),
+            idle_timeout=settings.getfloat('REDIS_FRONTIER_IDLE_TIMEOUT', 30.0),
+            inflight_timeout=settings.getfloat('REDIS_FRONTIER_INFLIGHT_TIMEOUT', 300.0),
+            max_attempts=settings.getint('REDIS_FRONTIER_MAX_ATTEMPTS', 3),
+        )
+        crawler.signals.connect(scheduler.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(scheduler.request_acked, signal=request_acked)
+        return scheduler
+
+    def open(self, spider: Spider) -> None:
+        self.spider = spider
+        self.keys = frontier_keys(self.crawler.settings, spider.name)
+        self.df = RedisDupeFilter(self.server, self.keys['seen'], self.crawler.request_fingerprinter,
+                                  self.stats, self.crawler.settings.getbool('DUPEFILTER_DEBUG'))
+        recovered = self._recover_inflight()
+        logging.info(f"✅ Frontier {self.keys['queue']}: у черзі {len(self)} запитів, "
+                     f"відомо {self.server.scard(self.keys['seen'])} відбитків, повернуто {recovered} незавершених")
+
+    def close(self, reason: str) -> None:
+        # Після повного завершення обходу непідтверджені запити - ті, що остаточно не завантажилися;
+        # при зупинці (Ctrl-C) вони могли просто не встигнути обробитися, тож спробою не вважаються
+        requeued = self._requeue_unacked(failed=reason == 'finished')
+        if requeued:
+            logging.info(f"↪️ Повернуто в чергу {requeued} непідтверджених запитів цього воркера.")
+        if not self.persist and reason == 'finished':
+            self.server.delete(*self.keys.values())
+            logging.info(f"Frontier {self.keys['queue']} очищено (SCHEDULER_PERSIST = False).")
+        else:
+            logging.info(f"Frontier збережено: у черзі {len(self)} запитів ({reason}).")
+
+    def has_pending_requests(self) -> bool:
+        return len(self) > 0
+
+    def enqueue_request(self, request: Request) -> bool:
+        # Повтор (RetryMiddleware) чи редирект виданого раніше запиту: новий запис замінює старий у inflight
+        previous = request.meta.pop(ACK_META_KEY, None)
+        if not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            if previous is not None:
+                self.server.hdel(self.keys['inflight'], previous)
+                self._popped.pop(previous, None)
+            return False
+        sequence = self.server.incr(self.keys['seq'])
+        member = b'%020d:' % sequence + pickle.dumps(request.to_dict(spider=self.spider), protocol=4)
+        with self.server.pipeline() as pipe:
+            pipe.zadd(self.keys['queue'], {member: -request.priority})
+            if previous is not None:
+                pipe.hdel(self.keys['inflight'], previous)
+            pipe.execute()
+        if previous is not None:
+            self._popped.pop(previous, None)
+        self.stats.inc_value('scheduler/enqueued/redis')
+        return True
+
+    def next_request(self) -> Optional[Request]:
+        popped = self._pop(keys=[self.keys['queue'], self.keys['inflight']], args=[time.time()])
+        if not popped:
+            return None
+        member = popped[0]
+        self._popped[member] = float(popped[1])
+        request = request_from_dict(pickle.loads(member.split(b':', 1)[1]), spider=self.spider)
+        request.meta[ACK_META_KEY] = member
+        self._idle_since = None
+        self.stats.inc_value('scheduler/dequeued/redis')
+        return request
+
+    def __len__(self) -> int:
+        return self.server.zcard(self.keys['queue'])
+
+    def spider_idle(self, spider: Spider) -> None:
+        """Черга порожня, але інші воркери ще працюють - чекаємо на їхні нові запити."""
+        now = time.monotonic()
+        if self._idle_since is None:
+            self._idle_since = now
+        if self.server.hlen(self.keys['inflight']) and now - self._idle_since < self.idle_timeout:
+            raise DontCloseSpider
+
+    def request_acked(self, member: bytes) -> None:
+        self._popped.pop(member, None)
+
+    def _requeue_unacked(self, failed: bool) -> int:
+        """
+        Повертає в чергу видані цим воркером запити, які ще в inflight (не підтверджені FrontierAckMiddleware):
+        інакше після зупинки вони чекали б REDIS_FRONTIER_INFLIGHT_TIMEOUT. Підтверджені вже зняті з inflight.
+        failed=True - кожен такий запит рахується як невдала спроба.
+        """
+        requeued = 0
+        popped, self._popped = self._popped, {}
+        for member, score in popped.items():
+            if self.server.hdel(self.keys['inflight'], member) and self._requeue(member, score, failed):
+                requeued += 1
+        return requeued
+
+    def _requeue(self, member: bytes, score: float, failed: bool = True) -> bool:
+        """
+        Повертає запит у чергу. Невдалі спроби рахуються за відбитком запиту; після max_attempts запит
+        паркується в <prefix>:failed замість черги, щоб URL, який завжди падає, не повторювався вічно.
+        """
+        if failed:
+            request = request_from_dict(pickle.loads(member.split(b':', 1)[1]), spider=self.spider)
+            fingerprint = self.crawler.request_fingerprinter.fingerprint(request).hex()
+            attempts = self.server.hincrby(self.keys['attempts'], fingerprint, 1)
+            if attempts >= self.max_attempts:
+                self.server.hset(self.keys['failed'], fingerprint, member)
+                self.stats.inc_value('scheduler/parked/redis')
+                logging.warning(f"Попередження: Запит {request.url} не вдався {attempts} разів, "
+                                f"його відкладено в {self.keys['failed']} і більше не повторюється.")
+                return False
+        self.server.zadd(self.keys['queue'], {member: score})
+        return True
+
+    def _recover_inflight(self) -> int:
+        """Повертає в чергу запити, видані воркерам, що завершилися аварійно (старші за inflight_timeout)."""
+        recovered = 0
+        deadline = time.time() - self.inflight_timeout
+        for member, value in self.server.hgetall(self.keys['inflight']).items():
+            issued_at, score = value.decode().split(':', 1)
+            # HDEL повертає 1 лише одному з воркерів, що стартують одночасно - запит повертається один раз
+            if (float(issued_at) < deadline and self.server.hdel(self.keys['inflight'], member)
+                    and self._requeue(member, float(score))):
+                recovered += 1
+        return recovered
+
+
+class FrontierAckMiddleware:
+    """
+    Spider middleware для RedisScheduler: знімає запит з inflight, коли callback повністю оброблено
+    (усі його нові запити вже в черзі Redis). Запити, що остаточно не завантажилися, лишаються
+    в inflight і будуть повторені після REDIS_FRONTIER_INFLIGHT_TIMEOUT.
+    """
+
+    def __init__(self, server: redis.Redis, settings, crawler_signals=None) -> None:
+        self.server = server
+        self.settings = settings
+        self.signals = crawler_signals
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(frontier_server(crawler.settings), crawler.settings, crawler.signals)
+
+    def _ack(self, response, spider: Spider) -> None:
+        member = response.meta.get(ACK_META_KEY)
+        if member is not None:
+            self.server.hdel(frontier_keys(self.settings, spider.name)['inflight'], member)
+            if self.signals is not None:
+                self.signals.send_catch_log(request_acked, member=member)
+
+    def process_spider_output(self, response, result, spider):
+        yield from result
+        self._ack(response, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for item_or_request in result:
+            yield item_or_request
+        self._ack(response, spider)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._ack(response, spider)
+        return None
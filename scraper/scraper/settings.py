@@ -35,6 +35,80 @@ ITEM_PIPELINES = {
    "scraper.scraper.pipelines.ScraperPipeline": 300, # Повний шлях до Pipeline
 }
 
+# Формат файлу авторів ScraperPipeline: "json" - масив у data/authors.json, записується в кінці обходу;
+# "jsonl" - data/authors.jsonl, кожен автор дописується одразу (пам'ять не росте, падіння не губить дані).
+# Перетворити jsonl у формат authors.json: python convert_authors.py
+AUTHORS_OUTPUT_FORMAT = "json"
+AUTHORS_FSYNC_EVERY = 100  # fsync після стількох нових авторів...
+AUTHORS_FSYNC_INTERVAL = 5.0  # ...або не рідше ніж раз на стільки секунд
+# Дедуплікація авторів: "hash" - множина 8-байтних відбитків імен (точна), "bloom" - фільтр Блума
+# фіксованого розміру для дуже великих обходів (частка AUTHORS_BLOOM_ERROR_RATE нових авторів буде втрачена)
+AUTHORS_DEDUPE = "hash"
+AUTHORS_BLOOM_CAPACITY = 1_000_000
+AUTHORS_BLOOM_ERROR_RATE = 0.001
+
+# Інкрементальний обхід (run_scraper.py --incremental): стан між запусками - URL зібраних авторів,
+# ETag / Last-Modified / хеш вмісту кожної сторінки та відбитки вже відданих цитат
+INCREMENTAL_STATE_PATH = "data/crawl_state.json"
+INCREMENTAL_SKIP_KNOWN_AUTHORS = True  # Не завантажувати сторінки авторів, які вже є в MongoDB
+
+# Профілі обходу (run_scraper.py --profile NAME): набори налаштувань, що перекривають значення вище.
+# "polite" - поведінка за замовчуванням (1 запит до домену, секунда між запитами).
+# "adaptive" / "fast" - AutoThrottle: затримка підлаштовується під латентність сервера так, щоб паралельно
+# виконувалося в середньому AUTOTHROTTLE_TARGET_CONCURRENCY запитів; CONCURRENT_REQUESTS* - стеля,
+# AUTOTHROTTLE_MAX_DELAY - найбільша затримка при повільному сервері.
+CRAWL_PROFILES = {
+    "polite": {
+        "AUTOTHROTTLE_ENABLED": False,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+        "DOWNLOAD_DELAY": 1,
+    },
+    "adaptive": {
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": 0.5,
+        "AUTOTHROTTLE_MAX_DELAY": 10.0,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 4.0,
+        "CONCURRENT_REQUESTS": 16,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 8,
+        "DOWNLOAD_DELAY": 0,  # Нижня межа затримки AutoThrottle
+    },
+    "fast": {
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": 0.1,
+        "AUTOTHROTTLE_MAX_DELAY": 5.0,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 16.0,
+        "CONCURRENT_REQUESTS": 64,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 32,
+        "DOWNLOAD_DELAY": 0,
+    },
+}
+
+# Відступ на 429 / 5xx (middlewares.BackoffMiddleware): затримка домену множиться на BACKOFF_FACTOR,
+# від BACKOFF_START_DELAY до BACKOFF_MAX_DELAY секунд (або на Retry-After). Повтор запиту - RetryMiddleware.
+DOWNLOADER_MIDDLEWARES = {
+    "scraper.scraper.middlewares.BackoffMiddleware": 560,
+}
+BACKOFF_HTTP_CODES = [429, 500, 502, 503, 504]
+BACKOFF_FACTOR = 2.0
+BACKOFF_START_DELAY = 1.0
+BACKOFF_MAX_DELAY = 30.0
+
+# Розподілений обхід (run_scraper.py --distributed / --workers N): черга запитів і відбитки бачених запитів
+# спільні для всіх процесів через Redis (scraper/scraper/redis_frontier.py)
+DISTRIBUTED_CRAWL = False  # Вмикається з командного рядка разом з RedisScheduler
+REDIS_FRONTIER_URL = "redis://localhost:6379/0"
+REDIS_FRONTIER_PREFIX = "frontier"  # Ключі <prefix>:<павук>:queue / seen / seq / inflight
+SCHEDULER_PERSIST = True  # Лишати чергу після зупинки, щоб наступний запуск продовжив обхід
+REDIS_FRONTIER_IDLE_TIMEOUT = 30.0  # Скільки чекати нових запитів від інших воркерів при порожній черзі, с
+REDIS_FRONTIER_INFLIGHT_TIMEOUT = 300.0  # Через скільки секунд запит аварійно зупиненого воркера повертається в чергу
+REDIS_FRONTIER_MAX_ATTEMPTS = 3  # Після стількох невдалих спроб запит паркується в <prefix>:failed, а не в черзі
+
+# Режим прямого запису в MongoDB (run_scraper.py --mongo): замість ScraperPipeline і FEEDS
+# використовується scraper.scraper.mongo_pipeline.MongoPipeline
+MONGO_PIPELINE_BATCH_SIZE = 500  # Скидати буфер, щойно в ньому стільки авторів + цитат
+MONGO_PIPELINE_FLUSH_INTERVAL = 2.0  # ...або щонайменше раз на стільки секунд
+MONGO_PIPELINE_ORPHAN_WAIT = 10.0  # Розподілений обхід: скільки чекати авторів від інших воркерів перед завершенням
+
 # Налаштування експорту зібраних даних у JSON файли
 # Використовуємо FEEDS для експорту QuoteItem в quotes.json
 # AuthorItem будуть збережені Pipeline
@@ -54,8 +128,6 @@ FEEDS = {
 # Усі інші опції залишені за замовчуванням або вимкнені:
 # COOKIES_ENABLED = False
 # TELNETCONSOLE_ENABLED = False
-# AUTOTHROTTLE_ENABLED = True
 # HTTPCACHE_ENABLED = True
 # SPIDER_MIDDLEWARES = {}
-# DOWNLOADER_MIDDLEWARES = {}
 # EXTENSIONS = {}
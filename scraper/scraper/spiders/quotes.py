@@ -1,7 +1,11 @@
 import scrapy
 import logging  # Імпортуємо модуль логування
+from typing import Optional, Set
+from urllib.parse import urlparse
 from scrapy.item import Item, Field  # Для визначення структури даних
 
+from scraper.scraper.crawl_state import CrawlState, body_hash
+
 # Налаштування логування для павука
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -27,25 +31,87 @@ class AuthorItem(Item):
     description = Field()
 
 
+def load_known_authors() -> Set[str]:
+    """
+    Імена авторів, які вже є в MongoDB: їхні сторінки в інкрементальному режимі не завантажуються.
+    Імпорт моделей відкладено, щоб звичайний обхід у файли не залежав від MongoDB.
+    """
+    try:
+        from connect import connect_db
+        from models import Author
+        connect_db()
+        return set(Author.objects.distinct('fullname'))
+    except Exception as e:
+        logging.warning(f"Попередження: Не вдалося отримати авторів з MongoDB ({e}), "
+                        f"покладаємося лише на стан обходу.")
+        return set()
+    except SystemExit:
+        # connect_db() завершує процес через exit(1), якщо config.ini неповний або MongoDB недоступна
+        # (причину він уже записав у лог) - інкрементальний обхід продовжується без MongoDB
+        logging.warning("Попередження: MongoDB недоступна, покладаємося лише на стан обходу.")
+        return set()
+
+
 class QuotesSpider(scrapy.Spider):
     """
     Павук Scrapy для збору цитат та інформації про авторів з quotes.toscrape.com.
     Обробляє пагінацію та збирає деталі про авторів з їхніх сторінок 'About'.
+
+    Інкрементальний режим (-a incremental=1 або run_scraper.py --incremental) зберігає стан між запусками
+    (INCREMENTAL_STATE_PATH): сторінки запитуються умовно (If-None-Match / If-Modified-Since),
+    незмінені сторінки (304 або той самий хеш вмісту) не розбираються, сторінки вже відомих авторів
+    не завантажуються, а віддаються лише нові або змінені цитати.
     """
     name = 'quotes'  # Ім'я павука
     allowed_domains = ['quotes.toscrape.com']  # Дозволені домени для скрапінгу
     start_urls = ['http://quotes.toscrape.com/']  # Починаємо з першої сторінки
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, incremental=False, start_url=None, domains=None, *args, **kwargs):
         """
         Ініціалізація павука.
         Використовує set для зберігання унікальних посилань на сторінки авторів,
         щоб уникнути повторного скрапінгу та дублікатів.
+        start_url (-a start_url=http://localhost:8030/) дозволяє обходити копію сайту, наприклад fixture_site.py;
+        дозволені домени тоді беруться з нього, якщо не задані явно (-a domains=a.com,b.com).
         """
         super().__init__(*args, **kwargs)
+        if start_url:
+            self.start_urls = [start_url]
+            self.allowed_domains = [urlparse(start_url).hostname]
+        if domains:
+            self.allowed_domains = [domain.strip() for domain in domains.split(',') if domain.strip()]
         self.authors_scraped = set()  # Використовуємо set для зберігання вже скраплених URL авторів
+        # Аргументи з командного рядка (-a incremental=1) Scrapy передає рядками
+        self.incremental = str(incremental).lower() in ('1', 'true', 'yes')
+        self.state: Optional[CrawlState] = None  # Стан між запусками (лише в інкрементальному режимі)
+        self.known_authors: Set[str] = set()  # Автори, що вже є в MongoDB
         logging.info("Павук QuotesSpider ініціалізовано.")
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.incremental:
+            spider.state = CrawlState.load(crawler.settings.get('INCREMENTAL_STATE_PATH', 'data/crawl_state.json'))
+            if crawler.settings.getbool('INCREMENTAL_SKIP_KNOWN_AUTHORS', True):
+                spider.known_authors = load_known_authors()
+                logging.info(f"Інкрементальний обхід: {len(spider.known_authors)} авторів уже в MongoDB")
+        return spider
+
+    async def start(self):
+        # У розподіленому обході (спільний frontier у Redis) стартові запити проходять через dupefilter,
+        # інакше кожен воркер заново обходив би першу сторінку
+        dont_filter = not self.settings.getbool('DISTRIBUTED_CRAWL')
+        for url in self.start_urls:
+            if self.state is None:
+                yield scrapy.Request(url, callback=self.parse, dont_filter=dont_filter)
+            else:
+                yield self.conditional_request(url, dont_filter=dont_filter)
+
+    def conditional_request(self, url: str, dont_filter: bool = False) -> scrapy.Request:
+        """Запит сторінки цитат з валідаторами попереднього запуску; відповідь 304 передається в parse."""
+        return scrapy.Request(url, callback=self.parse, headers=self.state.conditional_headers(url),
+                              meta={'handle_httpstatus_list': [304]}, dont_filter=dont_filter)
+
     def parse(self, response):
         """
         Парсить головну сторінку з цитатами.
@@ -53,6 +119,30 @@ class QuotesSpider(scrapy.Spider):
         """
         logging.info(f"Парсинг сторінки: {response.url}")
 
+        if self.state is not None:
+            if response.status == 304:
+                # Сторінка не змінилася: тіла немає, наступну сторінку беремо зі стану
+                self.state.unchanged_pages += 1
+                next_page_link = self.state.next_link(response.url)
+                if next_page_link:
+                    yield self.conditional_request(response.urljoin(next_page_link))
+                return
+
+            next_page_link = response.css('li.next a::attr(href)').get()
+            changed = self.state.page_changed(
+                response.url,
+                response.headers.get('ETag', b'').decode('latin-1') or None,
+                response.headers.get('Last-Modified', b'').decode('latin-1') or None,
+                body_hash(response.body),
+                next_page_link,
+            )
+            if not changed:
+                # Сервер не підтримує валідатори, але вміст той самий - цитати вже віддані раніше
+                self.state.unchanged_pages += 1
+                if next_page_link:
+                    yield self.conditional_request(response.urljoin(next_page_link))
+                return
+
         # Збираємо дані для кожної цитати на поточній сторінці
         for quote_block in response.css('div.quote'):  # Використовуємо CSS-селектори
             quote_item = QuoteItem()
@@ -64,7 +154,9 @@ class QuotesSpider(scrapy.Spider):
 
             # Витягуємо теги (список)
             quote_item['tags'] = quote_block.css('div.tags a.tag::text').getall()
-            yield quote_item  # Повертаємо зібрану цитату
+            # В інкрементальному режимі віддаємо лише нові або змінені цитати
+            if self.state is None or self.state.add_quote(author_name, quote_item['quote']):
+                yield quote_item  # Повертаємо зібрану цитату
 
             # Знаходимо посилання на сторінку "About" автора
             author_about_link = quote_block.css('a[href*="/author/"]::attr(href)').get()
@@ -72,19 +164,27 @@ class QuotesSpider(scrapy.Spider):
             # Якщо посилання на автора знайдено І посилання на сторінку автора ще не було скраплено
             if author_about_link and author_about_link not in self.authors_scraped:  # Покращення логіки дедуплікації
                 self.authors_scraped.add(author_about_link)  # Додаємо УНІКАЛЬНЕ посилання автора до set
+                author_url = response.urljoin(author_about_link)
+                if self.state is not None and (author_url in self.state.authors or author_name in self.known_authors):
+                    logging.debug(f"Автор '{author_name}' вже відомий, сторінку не завантажуємо.")
+                    continue
                 logging.info(f"Знайдено посилання на сторінку автора '{author_name}': {author_about_link}")
                 # Генеруємо новий запит для переходу на сторінку автора
-                yield response.follow(author_about_link, callback=self.parse_author_details)
+                yield response.follow(author_about_link, callback=self.parse_author_details,
+                                      cb_kwargs={'author_url': author_url})
 
         # Логіка пагінації: знаходимо посилання на наступну сторінку
         next_page_link = response.css('li.next a::attr(href)').get()
         if next_page_link:
             logging.info(f"Знайдено посилання на наступну сторінку: {next_page_link}")
             # Генеруємо новий запит для переходу на наступну сторінку
-            yield response.follow(next_page_link,
-                                  callback=self.parse)  # Обробляємо наступну сторінку тим же методом parse
+            if self.state is not None:
+                yield self.conditional_request(response.urljoin(next_page_link))
+            else:
+                yield response.follow(next_page_link,
+                                      callback=self.parse)  # Обробляємо наступну сторінку тим же методом parse
 
-    def parse_author_details(self, response):
+    def parse_author_details(self, response, author_url: Optional[str] = None):
         """
         Парсить сторінку 'About' автора.
         Збирає повне ім'я, дату народження, місце народження та опис автора.
@@ -101,4 +201,16 @@ class QuotesSpider(scrapy.Spider):
         # Опис автора
         author_item['description'] = response.css('.author-description::text').get().strip()
 
+        if self.state is not None and author_url:
+            # Запам'ятовуємо лише успішно зібраних авторів: невдалі спроби повторяться наступного запуску
+            self.state.authors.add(author_url)
         yield author_item  # Повертаємо зібрані дані про автора
+
+    def closed(self, reason: str) -> None:
+        if self.state is None:
+            return
+        if reason == 'finished':
+            self.state.save()
+        else:
+            # Віддані цитати могли не дійти до файлів/БД - не позначаємо їх як відомі
+            logging.warning(f"Попередження: Обхід перервано ({reason}), стан обходу не збережено.")
@@ -0,0 +1,151 @@
+import json
+import queue
+import threading
+import time
+import configparser # Імпортуємо модуль для роботи з конфігураційними файлами
+import logging # Імпортуємо модуль logging
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set # Імпортуємо типи для анотацій
+
+import redis
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Читаємо конфігурацію з config.ini (секція [EVENTS] необов'язкова)
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+REDIS_HOST: str = config.get('EVENTS', 'redis_host', fallback='localhost')
+REDIS_PORT: int = config.getint('EVENTS', 'redis_port', fallback=6379)
+# Redis pub/sub канал подій зміни статусу контактів
+EVENTS_CHANNEL: str = config.get('EVENTS', 'channel', fallback='contacts:status')
+# Скільки непрочитаних подій тримати для одного клієнта, перш ніж попросити його перезавантажити сторінку
+CLIENT_QUEUE_SIZE: int = config.getint('EVENTS', 'client_queue_size', fallback=256)
+HEARTBEAT_INTERVAL: float = 15.0 # Коментар-"пінг", щоб проксі не закривали неактивне SSE-з'єднання
+RECONNECT_DELAY: float = 2.0
+
+# Подія "контакти надіслано": {"type": "sent", "channel": "email", "ids": ["...", ...]}.
+# Consumer публікує одну подію на пакет (на канал), а не на кожен контакт.
+# Pub/sub не гарантує доставки: подія, опублікована, коли ніхто не слухає, губиться.
+# Тому події - лише підказка для живого оновлення, а джерело правди - MongoDB.
+
+_publisher: Optional[redis.Redis] = None
+
+
+def _get_publisher() -> redis.Redis:
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    return _publisher
+
+
+def publish_sent(contacts: Iterable[Mapping[str, Any]]) -> None:
+    """
+    Публікує події про надіслані контакти (документи з _id і preferred_channel), по одній на канал.
+    Недоступний Redis не зупиняє consumer'а: помилка лише логується (статуси вже записані в MongoDB).
+    """
+    ids_by_channel: Dict[str, List[str]] = {}
+    for contact in contacts:
+        ids_by_channel.setdefault(contact.get('preferred_channel') or 'email', []).append(str(contact['_id']))
+    if not ids_by_channel:
+        return
+    try:
+        publisher = _get_publisher().pipeline(transaction=False)
+        for channel, ids in ids_by_channel.items():
+            publisher.publish(EVENTS_CHANNEL, json.dumps({'type': 'sent', 'channel': channel, 'ids': ids}))
+        publisher.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Попередження: Не вдалося опублікувати подію статусу в Redis: {e}")
+
+
+class Subscription:
+    """Черга подій одного SSE-клієнта. overflowed - клієнт відстав і має перечитати сторінку."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class EventBroadcaster:
+    """
+    Розсилка подій статусу всім SSE-клієнтам процесу через ОДНУ підписку на Redis.
+    Фоновий потік читає pub/sub і кладе кожну подію в черги підключених клієнтів;
+    кожен клієнт читає лише свою чергу. Потік стартує з першим клієнтом.
+    """
+
+    def __init__(self, channel: str = EVENTS_CHANNEL, client_queue_size: int = CLIENT_QUEUE_SIZE) -> None:
+        self.channel = channel
+        self.client_queue_size = client_queue_size
+        self._clients: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.client_queue_size)
+        with self._lock:
+            self._clients.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='status-events', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._clients.discard(subscription)
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def events(self, subscription: Subscription) -> Iterator[Dict[str, Any]]:
+        """
+        Події для одного клієнта; None раз на HEARTBEAT_INTERVAL, якщо подій немає.
+        Завершується подією resync, якщо клієнт відстав.
+        """
+        while True:
+            if subscription.overflowed:
+                yield {'type': 'resync'}
+                return
+            try:
+                yield subscription.queue.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield None
+
+    def _broadcast(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            clients = list(self._clients)
+        for subscription in clients:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # Клієнт не встигає читати: від'єднуємо його і просимо перечитати сторінку
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+    def _listen(self) -> None:
+        while True:
+            pubsub = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0,
+                                 decode_responses=True).pubsub(ignore_subscribe_messages=True)
+            subscribed = False
+            try:
+                pubsub.subscribe(self.channel)
+                subscribed = True
+                logging.info(f"✅ Підписано на події статусу Redis '{self.channel}'")
+                for message in pubsub.listen():
+                    try:
+                        self._broadcast(json.loads(message['data']))
+                    except (TypeError, ValueError):
+                        logging.warning(f"Попередження: Некоректна подія статусу пропущена: {message.get('data')}")
+            except redis.RedisError as e:
+                logging.error(f"❌ Підписку на події статусу втрачено: {e}. Повтор через {RECONNECT_DELAY} с.")
+                if subscribed:
+                    # Події за час розриву буде втрачено - клієнти мають перечитати сторінку
+                    self._broadcast({'type': 'resync'})
+            finally:
+                pubsub.close()
+            time.sleep(RECONNECT_DELAY)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Кадр server-sent events: ім'я події - поле 'type', дані - JSON."""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import logging # Імпортуємо модуль логування
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Set # Імпортуємо типи для анотацій
+
+import pika
+
+from consumer_base import ContactChannel, config, rabbit_host, run_consumer
+from consumer_email import EmailChannel
+from consumer_sms import SmsChannel
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Параметри супервізора (секція [SUPERVISOR] необов'язкова)
+MIN_WORKERS: int = config.getint('SUPERVISOR', 'min_workers', fallback=1)
+MAX_WORKERS: int = config.getint('SUPERVISOR', 'max_workers', fallback=os.cpu_count() or 4)
+MESSAGES_PER_WORKER: int = config.getint('SUPERVISOR', 'messages_per_worker', fallback=5000) # Глибина черги на одного worker'а
+POLL_INTERVAL: float = config.getfloat('SUPERVISOR', 'poll_interval', fallback=5.0)
+DRAIN_TIMEOUT: float = config.getfloat('SUPERVISOR', 'drain_timeout', fallback=30.0) # Скільки чекати на коректне завершення
+RESTART_BACKOFF: float = config.getfloat('SUPERVISOR', 'restart_backoff', fallback=1.0) # Пауза перед першим перезапуском, с
+RESTART_BACKOFF_MAX: float = config.getfloat('SUPERVISOR', 'restart_backoff_max', fallback=60.0) # Найдовша пауза, с
+MAX_RESTARTS: int = config.getint('SUPERVISOR', 'max_restarts', fallback=5) # Падінь за restart_window, після яких канал зупиняється
+RESTART_WINDOW: float = config.getfloat('SUPERVISOR', 'restart_window', fallback=300.0)
+
+CHANNELS: Dict[str, type] = {"email": EmailChannel, "sms": SmsChannel}
+
+# fork: дочірній процес стартує швидко. Підключення до MongoDB/RabbitMQ створюються вже ПІСЛЯ fork
+# (у BatchingConsumer.run / AsyncConsumer.run), а з'єднання супервізора для опитування черг закривається
+# перед кожним fork і відкривається знову лише в батьківському процесі - спільних сокетів між процесами немає.
+mp = multiprocessing.get_context('fork')
+
+
+def run_worker(channel_key: str, mode: str) -> None:
+    """Точка входу worker-процесу: створює канал і запускає consumer обраного режиму."""
+    channel: ContactChannel = CHANNELS[channel_key]()
+    if mode == 'async':
+        from consumer_async import AsyncConsumer
+        asyncio.run(AsyncConsumer(channel).run())
+    else:
+        run_consumer(channel)
+
+
+class ConsumerSupervisor:
+    """
+    Запускає N worker-процесів на кожну чергу і:
+    - опитує глибину черг (пасивний queue_declare) та масштабує worker'ів між min і max;
+    - перезапускає worker'ів, що впали, з експоненційною паузою (RESTART_BACKOFF .. RESTART_BACKOFF_MAX);
+      якщо канал падає частіше за MAX_RESTARTS разів за RESTART_WINDOW секунд, його worker'и більше не запускаються;
+    - на SIGTERM/SIGINT надсилає worker'ам SIGTERM і чекає, поки вони допрацюють поточні пакети.
+    """
+
+    def __init__(self, channel_keys: List[str], mode: str = 'batch', min_workers: int = MIN_WORKERS,
+                 max_workers: int = MAX_WORKERS, messages_per_worker: int = MESSAGES_PER_WORKER,
+                 poll_interval: float = POLL_INTERVAL) -> None:
+        self.channel_keys = channel_keys
+        self.mode = mode
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers, min_workers)
+        self.messages_per_worker = messages_per_worker
+        self.poll_interval = poll_interval
+        self.workers: Dict[str, List[multiprocessing.Process]] = {key: [] for key in channel_keys}
+        self.draining: List[multiprocessing.Process] = [] # Worker'и, яким надіслано SIGTERM при зменшенні
+        self.crashes: Dict[str, Deque[float]] = {key: deque() for key in channel_keys} # Час падінь у межах вікна
+        self.restart_at: Dict[str, float] = {key: 0.0 for key in channel_keys} # Не запускати worker'ів раніше
+        self.given_up: Set[str] = set() # Канали, зупинені через постійні падіння
+        self._stopping = False
+        self._connection = None
+        self._amqp_channel = None
+
+    def stop(self, *_args) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for key in self.channel_keys:
+            self._start_workers(key, self.min_workers)
+
+        try:
+            while not self._stopping:
+                for key in self.channel_keys:
+                    self._reap(key)
+                    self._scale(key, self._queue_depth(key))
+                self._reap_draining()
+                if self.given_up == set(self.channel_keys):
+                    logging.error("❌ Усі канали зупинено через постійні падіння worker'ів, супервізор завершується.")
+                    break
+                self._sleep(self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def _start_workers(self, key: str, count: int) -> None:
+        if count <= 0:
+            return
+        self._close_connection() # Дочірні процеси не повинні успадкувати сокет з'єднання супервізора
+        for _ in range(count):
+            process = mp.Process(target=run_worker, args=(key, self.mode), name=f"consumer-{key}", daemon=False)
+            process.start()
+            self.workers[key].append(process)
+            logging.info(f"▶️ Запущено {key.upper()} worker (pid {process.pid}), всього {len(self.workers[key])}")
+
+    def _reap(self, key: str) -> None:
+        """Прибирає завершені процеси; ті, що впали, перезапускаються після паузи на кроці масштабування."""
+        alive = []
+        for process in self.workers[key]:
+            if process.is_alive():
+                alive.append(process)
+            else:
+                process.join()
+                self._record_crash(key, process)
+        self.workers[key] = alive
+
+    def _record_crash(self, key: str, process: multiprocessing.Process) -> None:
+        """Рахує падіння у вікні RESTART_WINDOW і призначає паузу перед перезапуском (1, 2, 4, ... с)."""
+        now = time.monotonic()
+        crashes = self.crashes[key]
+        crashes.append(now)
+        while crashes and now - crashes[0] > RESTART_WINDOW:
+            crashes.popleft()
+        if len(crashes) > MAX_RESTARTS:
+            if key not in self.given_up:
+                logging.error(f"❌ {key.upper()} worker'и впали {len(crashes)} разів за {RESTART_WINDOW:.0f} с "
+                              f"(останній pid {process.pid}, код {process.exitcode}) - канал більше не перезапускається.")
+            self.given_up.add(key)
+            return
+        delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** (len(crashes) - 1))
+        self.restart_at[key] = max(self.restart_at[key], now + delay)
+        logging.warning(f"⚠️ {key.upper()} worker (pid {process.pid}) завершився з кодом {process.exitcode}, "
+                        f"буде перезапущений через {delay:.0f} с.")
+
+    def _reap_draining(self) -> None:
+        still_draining = []
+        for process in self.draining:
+            if process.is_alive():
+                still_draining.append(process)
+            else:
+                process.join()
+        self.draining = still_draining
+
+    def _queue_depth(self, key: str) -> int:
+        """Кількість готових повідомлень у черзі через пасивний queue_declare (черга не створюється)."""
+        queue_name = CHANNELS[key]().queue_name
+        try:
+            if self._connection is None or self._connection.is_closed:
+                self._connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host))
+            if self._amqp_channel is None or self._amqp_channel.is_closed:
+                self._amqp_channel = self._connection.channel()
+            return self._amqp_channel.queue_declare(queue=queue_name, passive=True).method.message_count
+        except pika.exceptions.ChannelClosedByBroker:
+            return 0 # Черги ще не існує (брокер закриває канал з кодом 404)
+        except pika.exceptions.AMQPError as e:
+            logging.error(f"❌ Не вдалося отримати глибину черги '{queue_name}': {e}")
+            self._connection = None
+            return 0
+
+    def _scale(self, key: str, depth: int) -> None:
+        desired = min(self.max_workers, max(self.min_workers, math.ceil(depth / self.messages_per_worker)))
+        current = len(self.workers[key])
+        if desired > current and (key in self.given_up or time.monotonic() < self.restart_at[key]):
+            return # Канал зупинено або ще триває пауза після падіння
+        if desired > current:
+            logging.info(f"📈 {key.upper()}: у черзі {depth} повідомлень, масштабуємо {current} -> {desired}")
+            self._start_workers(key, desired - current)
+        elif desired < current:
+            # Зменшуємо поступово, по одному worker'у за опитування, щоб не "смикати" пул
+            process = self.workers[key].pop()
+            logging.info(f"📉 {key.upper()}: у черзі {depth} повідомлень, зупиняємо worker (pid {process.pid}), "
+                         f"залишається {len(self.workers[key])}")
+            process.terminate() # SIGTERM: worker допрацює поточний пакет і підтвердить його
+            self.draining.append(process)
+
+    def _sleep(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while not self._stopping and time.monotonic() < deadline:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.sleep(0.2) # Обслуговує heartbeat'и з'єднання з RabbitMQ
+            else:
+                time.sleep(0.2)
+
+    def _shutdown(self) -> None:
+        processes = [p for workers in self.workers.values() for p in workers] + self.draining
+        logging.info(f"Зупинка супервізора: надсилаємо SIGTERM {len(processes)} worker'ам...")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.warning(f"Worker (pid {process.pid}) не завершився за {DRAIN_TIMEOUT} с, примусова зупинка.")
+                process.kill()
+                process.join()
+
+        self._close_connection()
+        logging.info("Супервізор зупинено.")
+
+    def _close_connection(self) -> None:
+        """Закриває з'єднання опитування черг; _queue_depth відкриє нове при наступному опитуванні."""
+        if self._connection is not None and self._connection.is_open:
+            try:
+                self._connection.close()
+            except pika.exceptions.AMQPError as e:
+                logging.error(f"❌ Помилка закриття з'єднання супервізора: {e}")
+        self._connection = None
+        self._amqp_channel = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Супервізор consumer'ів з автомасштабуванням за глибиною черги.")
+    parser.add_argument("channels", nargs="*", default=sorted(CHANNELS),
+                        help=f"Канали для обслуговування: {', '.join(sorted(CHANNELS))} (за замовчуванням усі)")
+    parser.add_argument("--mode", choices=("batch", "async"), default="batch", help="Режим worker'ів")
+    parser.add_argument("--min-workers", type=int, default=MIN_WORKERS)
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--messages-per-worker", type=int, default=MESSAGES_PER_WORKER)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    unknown = set(args.channels) - set(CHANNELS)
+    if unknown:
+        logging.error(f"❌ Невідомі канали: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    if args.min_workers < 0 or args.max_workers < 1:
+        logging.error("❌ Некоректні межі кількості worker'ів.")
+        sys.exit(1)
+
+    supervisor = ConsumerSupervisor(args.channels, args.mode, args.min_workers, args.max_workers,
+                                    args.messages_per_worker, args.poll_interval)
+    supervisor.run()
+    sys.exit(1 if supervisor.given_up else 0)
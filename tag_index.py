@@ -0,0 +1,171 @@
+import json
+import logging # Імпортуємо модуль logging
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional # Імпортуємо типи для анотацій
+
+from cache import r # Використовуємо спільний Redis клієнт з cache.py
+from models import Author, Quote
+
+# Налаштування логування для цього модуля
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Схема ключів інвертованого індексу в Redis:
+#   tagidx:tag:<тег>  - SET з ID цитат, що мають цей тег
+#   tagidx:quotes     - HASH: ID цитати -> JSON {"quote", "author", "tags"}
+#   tagidx:tags       - SET усіх відомих тегів (потрібен для повного перебудування)
+#   tagidx:ready      - маркер того, що індекс побудований і ним можна користуватися
+#   tagidx:build:<id>:... - тимчасові копії ключів, поки rebuild_tag_index будує новий індекс
+TAG_KEY_PREFIX: str = "tagidx:tag:"
+QUOTES_HASH_KEY: str = "tagidx:quotes"
+ALL_TAGS_KEY: str = "tagidx:tags"
+READY_KEY: str = "tagidx:ready"
+REBUILD_CHUNK_SIZE: int = 1000  # Цитат на один pipeline під час повного перебудування
+
+
+def _tag_key(tag: str) -> str:
+    """Повертає ключ множини для конкретного тегу."""
+    return f"{TAG_KEY_PREFIX}{tag}"
+
+
+def _add_to_pipeline(pipe, quote: Dict[str, Any], staging: str = "") -> None:
+    """
+    Додає в pipeline команди індексації однієї цитати (payload + множини тегів).
+    staging - префікс тимчасових ключів, у які пише rebuild_tag_index.
+    """
+    quote_id = str(quote['id'])
+    payload = {"quote": quote['quote'], "author": quote['author'], "tags": list(quote['tags'])}
+    pipe.hset(f"{staging}{QUOTES_HASH_KEY}", quote_id, json.dumps(payload, ensure_ascii=False))
+    for tag in payload['tags']:
+        pipe.sadd(f"{staging}{_tag_key(tag)}", quote_id)
+        pipe.sadd(f"{staging}{ALL_TAGS_KEY}", tag)
+
+
+def load_quotes_for_index() -> Iterator[Dict[str, Any]]:
+    """
+    Потоково зчитує цитати з MongoDB (курсором, пакетами по REBUILD_CHUNK_SIZE) у форматі,
+    придатному для індексації. Автори підтягуються одним пакетним запитом.
+    """
+    authors_by_id = {a['_id']: a['fullname'] for a in Author.objects().only('fullname').as_pymongo()}
+    cursor = Quote._get_collection().find({}, {'quote': 1, 'tags': 1, 'author': 1}, batch_size=REBUILD_CHUNK_SIZE)
+    for q in cursor:
+        yield {
+            "id": q['_id'],
+            "quote": q['quote'],
+            "author": authors_by_id.get(q.get('author'), "Невідомий автор"),
+            "tags": q.get('tags', []),
+        }
+
+
+def rebuild_tag_index(quotes: Optional[Iterable[Dict[str, Any]]] = None) -> int:
+    """
+    Повністю перебудовує інвертований індекс тегів.
+    Цитати пишуться пакетами по REBUILD_CHUNK_SIZE у тимчасові ключі (tagidx:build:<id>:...), тож ні
+    список цитат, ні одна величезна транзакція не тримаються в пам'яті. Потім в одній транзакції MULTI/EXEC
+    тимчасові ключі перейменовуються (RENAME) на робочі, а теги, яких більше немає, видаляються -
+    читачі бачать або старий, або новий індекс, але ніколи напівпорожній.
+    Повертає кількість проіндексованих цитат.
+    """
+    if quotes is None:
+        quotes = load_quotes_for_index()
+
+    staging = f"tagidx:build:{uuid.uuid4().hex}:"
+    count = 0
+    try:
+        pipe = r.pipeline(transaction=False)
+        for quote in quotes:
+            _add_to_pipeline(pipe, quote, staging)
+            count += 1
+            if count % REBUILD_CHUNK_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+
+        new_tags = r.smembers(f"{staging}{ALL_TAGS_KEY}")
+        old_tags = r.smembers(ALL_TAGS_KEY)
+        pipe = r.pipeline(transaction=True)
+        for tag in old_tags - new_tags:
+            pipe.delete(_tag_key(tag))
+        for tag in new_tags:
+            pipe.rename(f"{staging}{_tag_key(tag)}", _tag_key(tag))
+        if count:
+            pipe.rename(f"{staging}{QUOTES_HASH_KEY}", QUOTES_HASH_KEY)
+        else:
+            pipe.delete(QUOTES_HASH_KEY)
+        if new_tags:
+            pipe.rename(f"{staging}{ALL_TAGS_KEY}", ALL_TAGS_KEY)
+        else:
+            pipe.delete(ALL_TAGS_KEY)
+        pipe.set(READY_KEY, 1)
+        pipe.execute()
+    except Exception:
+        # Незавершена перебудова не повинна лишати тимчасових ключів; робочий індекс не змінено
+        leftovers = list(r.scan_iter(match=f"{staging}*", count=1000))
+        if leftovers:
+            r.delete(*leftovers)
+        raise
+
+    logging.info(f"Індекс тегів у Redis перебудовано: {count} цитат.")
+    return count
+
+
+def index_quotes(quotes: Iterable[Dict[str, Any]]) -> None:
+    """
+    Інкрементально додає або оновлює цитати в індексі.
+    Викликається шляхами запису (завантажувачі, pipeline), щоб індекс не відставав від MongoDB.
+    Якщо в цитати змінився набір тегів, її ID прибирається зі старих множин.
+    """
+    quotes = list(quotes)
+    if not quotes:
+        return
+
+    old_payloads = r.hmget(QUOTES_HASH_KEY, [str(q['id']) for q in quotes])
+    pipe = r.pipeline(transaction=True)
+    for quote, old_payload in zip(quotes, old_payloads):
+        if old_payload:
+            removed_tags = set(json.loads(old_payload)['tags']) - set(quote['tags'])
+            for tag in removed_tags:
+                pipe.srem(_tag_key(tag), str(quote['id']))
+        _add_to_pipeline(pipe, quote)
+    pipe.execute()
+
+
+def remove_quotes(quote_ids: Iterable[Any]) -> None:
+    """Видаляє цитати з індексу (наприклад, після видалення з MongoDB)."""
+    quote_ids = [str(quote_id) for quote_id in quote_ids]
+    if not quote_ids:
+        return
+
+    old_payloads = r.hmget(QUOTES_HASH_KEY, quote_ids)
+    pipe = r.pipeline(transaction=True)
+    for quote_id, old_payload in zip(quote_ids, old_payloads):
+        if old_payload:
+            for tag in json.loads(old_payload)['tags']:
+                pipe.srem(_tag_key(tag), quote_id)
+    pipe.hdel(QUOTES_HASH_KEY, *quote_ids)
+    pipe.execute()
+
+
+def search_tags(tags: List[str], match_all: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Шукає цитати за кількома тегами без звернення до MongoDB.
+    match_all=False - логічне АБО (SUNION), match_all=True - логічне І (SINTER).
+    Повертає None, якщо індекс ще не побудований (тоді викликач має звернутися до MongoDB).
+    """
+    keys = [_tag_key(tag) for tag in tags if tag]
+    if not keys:
+        return []
+
+    pipe = r.pipeline(transaction=False)
+    pipe.exists(READY_KEY)
+    if match_all:
+        pipe.sinter(keys)
+    else:
+        pipe.sunion(keys)
+    ready, quote_ids = pipe.execute()
+
+    if not ready:
+        return None
+    if not quote_ids:
+        return []
+
+    payloads = r.hmget(QUOTES_HASH_KEY, sorted(quote_ids))
+    return [json.loads(payload) for payload in payloads if payload]